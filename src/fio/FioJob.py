@@ -5,32 +5,23 @@ import subprocess
 import logging
 import re
 import json
+import os
+import tempfile
 from lxml import etree
 
+from fio.FioResult import parseJson
+from fio.FioResult import parseTerse
+from fio.FioStream import FioStream
+
 class FioJob(object):
     '''
     A class configuring the fio job.
     '''
-    ## Position of read IOPS in the fio terse output.
-    terseIOPSReadPos = 7
-
-    ## Position of write IOPS in the fio terse output.
-    terseIOPSWritePos = 48
-
-    ## Position of write total IO in the fio terse output
-    terseTotIOWritePos = 46
-
-    ## Start Position of write latencies in fio terse output
-    terseLatStartWritePos = 78
+    ## First fio version supporting the json output format.
+    jsonVersion = (2,1)
 
-    ## Start Position of read latencies in fio terse output
-    terseLatStartReadPos = 37
-
-    ## Postion of total read throughput.
-    terseTPReadPos = 6
-
-    ## Postion of total write throughput.
-    terseTPWritePos = 47
+    ## First fio version used with the json+ output format including latency bins.
+    jsonPlusVersion = (3,0)
 
     def __init__(self):
         ''' The constructor '''
@@ -42,6 +33,10 @@ class FioJob(object):
         self.__fioKVArgs = {}
         ## Single arguments e.g. group_reporting
         self.__fioSglArgs = []
+        ## Sections of a job file, each is [name,{key:value},[single args]]
+        self.__fioSections = []
+        ## Output format of fio, json+, json or minimal (terse) for old versions
+        self.__outputFormat = 'minimal'
 
     def __str__(self):
         ''' Return a string representation of the fio executable. '''   
@@ -59,11 +54,34 @@ class FioJob(object):
         self.__fioPath = stdout.rstrip("\n");
         fio = subprocess.Popen(['fio','--version'],stdout=subprocess.PIPE,universal_newlines=True)
         self.__fioVersion = fio.communicate()[0]
+        if self.getVersionTuple() >= FioJob.jsonPlusVersion:
+            self.__outputFormat = 'json+'
+        elif self.getVersionTuple() >= FioJob.jsonVersion:
+            self.__outputFormat = 'json'
+        else:
+            logging.info("# Fio does not support json output, using terse output")
+            self.__outputFormat = 'minimal'
 
     def getFioVersion(self):
         ''' Return the current Fio version string. '''
         return self.__fioVersion
 
+    def getOutputFormat(self):
+        ''' Return the output format used for fio, json+, json or minimal. '''
+        return self.__outputFormat
+
+    def getVersionTuple(self):
+        '''
+        Return the fio version as tuple of integers, e.g. (2,1,13).
+        @return The version tuple, (0,) if the version is unknown.
+        '''
+        if self.__fioVersion == None:
+            return (0,)
+        match = re.search(r'\d+(\.\d+)*',self.__fioVersion)
+        if match == None:
+            return (0,)
+        return tuple(int(v) for v in match.group().split('.'))
+
     def setFioVersion(self,fioStr):
         ''' Set the used Fio version (useful if loading from xml). '''
         self.__fioVersion = fioStr
@@ -113,6 +131,10 @@ class FioJob(object):
     def getSglArgs(self):
         ''' Return the current configured Fio single key arguments. '''
         return self.__fioSglArgs
+
+    def getSections(self):
+        ''' Return the current configured job file sections. '''
+        return self.__fioSections
     
     def addKVArg(self,key,value):
         ''' Add a key value pair as an argument to fio.
@@ -120,6 +142,12 @@ class FioJob(object):
         @param value Value for the given Fio option.
         '''
         self.__fioKVArgs[key] = value
+
+    def removeKVArg(self,key):
+        ''' Remove a key value argument if it is set.
+        @param key Name of the option for Fio.
+        '''
+        self.__fioKVArgs.pop(key,None)
         
     def addSglArg(self,key):
         ''' Add a single value option to fio argument list.
@@ -127,6 +155,22 @@ class FioJob(object):
         ''' 
         self.__fioSglArgs.append(key)
         
+    def addSection(self,name,kvArgs,sglArgs=None):
+        ''' Add a job section to the job file used by startJobFile.
+        The key value and single arguments of the section override the
+        global arguments of the job.
+        @param name Name of the section, e.g. the workload and block size.
+        @param kvArgs Dictionary of key value options for this section.
+        @param sglArgs List of single value options for this section.
+        '''
+        if sglArgs == None:
+            sglArgs = []
+        self.__fioSections.append([name,dict(kvArgs),list(sglArgs)])
+
+    def clearSections(self):
+        ''' Remove all job file sections. '''
+        self.__fioSections = []
+
     def prepKVArgs(self):
         ''' Generate an argument list out of the dictionary suited for fio. '''
         argList = [self.__fioPath]
@@ -139,122 +183,112 @@ class FioJob(object):
         for k in self.__fioSglArgs:
             argList.append('--' + k)
         return argList
-        
-    def start(self):
-        ''' Start a Fio job with its argument list.
-        The argument list defines the parameters given to Fio.
-        @return [True,standard output] of the Fio test or [False,0] on error.
-        '''
-        args = self.prepKVArgs()
-        args = self.prepSglArgs(args)
-        logging.info('%s',args)
-        if len(args) == 0:
-            logging.error("Error: Fio argument list is empty.")
-            exit(1)
-        out = subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("Fio encountered an error: " + stderr)
-            return [False,'']
-        else:
-            return [True,stdout]
-        
-    def getIOPS(self,fioOut):
-        '''
-        Parses the average IOPS out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return Sum of read IOPS and write IOPS.
-        '''
-        #index 7 iops read
-        #index 48 iops write
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseIOPSReadPos]) + int(fioTerse[FioJob.terseIOPSWritePos])
-       
-    def getIOPSRead(self,fioOut):
-        '''
-        Parses the average read IOPS out of the fio result output.
-        @param fioOut The output of the fio performance test.
-        @return Read IOPS
-        '''
-        #index 7 iops read
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseIOPSReadPos])
-    
-    def getIOPSWrite(self,fioOut):
-        '''
-        Parses the average write IOPS out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return Write IOPS
-        '''
-        #index 48 iops write
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseIOPSWritePos])
-       
-    def getTotIOWrite(self,fioOut):
-        '''
-        Parses the write total IO out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return Write total IO in KB.
-        '''
-        #index 46 write total IO
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseTotIOWritePos])
-    
-    def getWriteLats(self,fioOut):
-        '''
-        Parses the write total latencies out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return [min,max,mean] total write latencies in microseconds.
-        '''
-        #index 78 write total latency
-        fioTerse = fioOut.split(';')
-        return [float(fioTerse[FioJob.terseLatStartWritePos]),
-                float(fioTerse[FioJob.terseLatStartWritePos + 1]),
-                float(fioTerse[FioJob.terseLatStartWritePos + 2])]
-        
-    def getReadLats(self,fioOut):
+
+    def prepOutputArg(self):
+        ''' Return the command line argument selecting the fio output format. '''
+        if self.__outputFormat == 'minimal':
+            return '--minimal'
+        return '--output-format=' + self.__outputFormat
+
+    def parseOutput(self,stdout):
         '''
-        Parses the read total latencies out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return [min,max,mean] total read latencies in microseconds.
+        Parse the fio output in the configured output format.
+        @param stdout The standard output of fio.
+        @return A list of FioResult objects, one per job or reporting group.
+        @exception ValueError if the json output cannot be decoded
         '''
-        #index 78 write total latency
-        fioTerse = fioOut.split(';')
-        return [float(fioTerse[FioJob.terseLatStartReadPos]),
-                float(fioTerse[FioJob.terseLatStartReadPos + 1]),
-                float(fioTerse[FioJob.terseLatStartReadPos + 2])]
+        if self.__outputFormat.startswith('json'):
+            return parseJson(stdout)
+        return parseTerse(stdout)
         
-    def getTotLats(self,fioOut):
+    def prepJobFile(self):
         '''
-        Parses the read+write total latencies out of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return [min,max,mean] total latencies in microseconds.
+        Generate the content of a fio job file. The key value and single
+        arguments are written to the global section, every added section
+        becomes its own job.
+        @return The job file as string.
         '''
-        #index 78 write total latency
-        fioTerse = fioOut.split(';')
-        return [float(fioTerse[FioJob.terseLatStartReadPos]) + 
-                      float(fioTerse[FioJob.terseLatStartWritePos]),
-                float(fioTerse[FioJob.terseLatStartReadPos + 1]) + 
-                      float(fioTerse[FioJob.terseLatStartWritePos + 1]),
-                float(fioTerse[FioJob.terseLatStartReadPos + 2]) + 
-                      float(fioTerse[FioJob.terseLatStartWritePos + 2])]
+        lines = ['[global]']
+        for k,v in self.__fioKVArgs.items():
+            # The job name is given by the section header
+            if k == 'name':
+                continue
+            lines.append(k + '=' + v)
+        for k in self.__fioSglArgs:
+            lines.append(k)
+        for name,kvArgs,sglArgs in self.__fioSections:
+            lines.append('')
+            lines.append('[' + name + ']')
+            for k,v in kvArgs.items():
+                lines.append(k + '=' + v)
+            for k in sglArgs:
+                lines.append(k)
+        return '\n'.join(lines) + '\n'
 
-    def getTPRead(self,fioOut):
+    def startStream(self,statusInterval=None,jobFile=False):
         '''
-        Parses the read bandwidth of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return Read total bandwidth.
+        Prepare a fio run whose output is read incrementally. The run is
+        started when iterating over the returned stream. With json output
+        fio prints status snapshots every statusInterval seconds.
+        @param statusInterval Seconds between two status snapshots, None
+        for no snapshots.
+        @param jobFile If True run all sections as a job file, else run
+        the key value and single arguments on the command line.
+        @return A FioStream object.
         '''
-        #index 6 write total IO
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseTPReadPos])
-        
-    def getTPWrite(self,fioOut):
+        tmpFiles = []
+        if jobFile == True:
+            jobFileStr = self.prepJobFile()
+            args = [self.__fioPath,self.prepOutputArg()]
+            fd,path = tempfile.mkstemp(prefix='tkperf-',suffix='.fio')
+            with os.fdopen(fd,'w') as f:
+                f.write(jobFileStr)
+            logging.info(jobFileStr)
+            tmpFiles.append(path)
+        else:
+            args = self.prepKVArgs()
+            args = self.prepSglArgs(args)
+            args.append(self.prepOutputArg())
+        if statusInterval != None:
+            #the terse output cannot be parsed incrementally
+            if self.__outputFormat.startswith('json'):
+                args.append('--status-interval=' + str(statusInterval))
+            else:
+                logging.info("# Fio status snapshots need json output, not using them")
+        if jobFile == True:
+            args.append(tmpFiles[0])
+        return FioStream(args,self.__outputFormat,tmpFiles)
+
+    def startJobFile(self):
+        ''' Start one Fio process running all sections of a job file.
+        The sections should use stonewall to run one after another, each
+        section then reports its own result.
+        @return [True,list of FioResult objects per section] or [False,[]] on error.
         '''
-        Parses the write bandwidth of the Fio result output.
-        @param fioOut The output of the Fio performance test.
-        @return Write total bandwidth.
+        if len(self.__fioSections) == 0:
+            logging.error("Error: Fio job file has no sections.")
+            return [False,[]]
+        stream = self.startStream(None,True)
+        if stream.run() == False:
+            logging.error("Fio job file failed: " + stream.getError())
+            return [False,[]]
+        outs = stream.getResults()
+        if len(outs) != len(self.__fioSections):
+            logging.error("Fio returned " + str(len(outs)) + " results for " +
+                          str(len(self.__fioSections)) + " sections.")
+            return [False,[]]
+        return [True,outs]
+
+    def start(self):
+        ''' Start a Fio job with its argument list.
+        The argument list defines the parameters given to Fio.
+        @return [True,FioResult] of the Fio test or [False,None] on error.
         '''
-        #index 47 write total IO
-        fioTerse = fioOut.split(';')
-        return int(fioTerse[FioJob.terseTPWritePos])
\ No newline at end of file
+        if self.__fioPath == None:
+            logging.error("Error: Fio is not initialized.")
+            exit(1)
+        stream = self.startStream()
+        if stream.run() == False:
+            logging.error("Fio job failed: " + stream.getError())
+            return [False,None]
+        return [True,stream.getResults()[0]]
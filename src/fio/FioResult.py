@@ -0,0 +1,248 @@
+''' @package FioResult
+A module holding the parsed results of a fio job run.
+'''
+import json
+import logging
+import re
+
+from fio.LatHistogram import LatHistogram
+
+class FioResult(object):
+    '''
+    The parsed result of one fio job or reporting group. The result is built
+    once from the fio output, either from the json output or from the terse
+    output of older fio versions.
+    Bandwidths are given in KB/s, total IO in KB and latencies in microseconds.
+    '''
+    ## Directions of IO reported by fio.
+    ddirs = ['read','write']
+
+    ## Position of the job name in the fio terse output.
+    terseNamePos = 2
+
+    ## Position of the error code in the fio terse output.
+    terseErrorPos = 4
+
+    ## Start positions of read and write values in the fio terse output.
+    terseStartPos = {'read':5,'write':46}
+
+    ## Offsets of the values from the start position of a direction.
+    terseTotIOOff = 0
+    terseTPOff = 1
+    terseIOPSOff = 2
+    terseRuntimeOff = 3
+    terseSlatOff = 4
+    terseClatOff = 8
+    tersePctOff = 12
+    terseLatOff = 32
+
+    ## Number of completion latency percentiles in the fio terse output.
+    tersePctNum = 20
+
+    def __init__(self, output=None):
+        '''
+        Constructor
+        @param output The fio output the result has been parsed from.
+        '''
+        ## The raw fio output
+        self.__output = output
+        ## The name of the fio job
+        self.__name = None
+        ## Error code of the fio job
+        self.__error = 0
+        ## Seconds the job has been running, only known from the json output
+        self.__elapsed = 0
+        ## Per direction statistics, cf. FioResult.emptyStats
+        self.__stats = {}
+        for ddir in FioResult.ddirs:
+            self.__stats[ddir] = FioResult.emptyStats()
+
+    def __str__(self):
+        ''' Return a short summary of the result. '''
+        res = str(self.__name) + ":"
+        for ddir in FioResult.ddirs:
+            st = self.__stats[ddir]
+            res += " " + ddir + " iops=" + str(st['iops']) + ", bw=" + str(st['bw'])
+            res += "KB/s, lat(min,max,mean)=" + str(st['lat']) + ";"
+        return res
+
+    @staticmethod
+    def emptyStats():
+        '''
+        Return empty statistics for one direction of IO.
+        @return A dictionary with total IO, number of IOs, bandwidth, IOPS,
+        runtime, [min,max,mean] of slat, clat and lat, the clat percentiles
+        and the clat histogram (None if fio did not report the latency bins).
+        '''
+        return {'io':0,'ios':0,'bw':0,'iops':0,'runtime':0,
+                'slat':[0.0,0.0,0.0],'clat':[0.0,0.0,0.0],'lat':[0.0,0.0,0.0],
+                'clatpct':{},'hist':None}
+
+    def getOutput(self): return self.__output
+    def getName(self): return self.__name
+    def getError(self): return self.__error
+    def getElapsed(self): return self.__elapsed
+    def getStats(self,ddir): return self.__stats[ddir]
+
+    def getIOPS(self):
+        ''' @return Sum of read IOPS and write IOPS. '''
+        return self.__stats['read']['iops'] + self.__stats['write']['iops']
+
+    def getIOPSRead(self): return self.__stats['read']['iops']
+    def getIOPSWrite(self): return self.__stats['write']['iops']
+    def getRuntime(self):
+        ''' @return The runtime of the job in milliseconds. '''
+        return max(self.__stats['read']['runtime'],self.__stats['write']['runtime'])
+
+    def getTotIOs(self):
+        ''' @return Number of read and write IOs carried out. '''
+        return self.__stats['read']['ios'] + self.__stats['write']['ios']
+
+    def getTotIORead(self): return self.__stats['read']['io']
+    def getTotIOWrite(self): return self.__stats['write']['io']
+    def getTPRead(self): return self.__stats['read']['bw']
+    def getTPWrite(self): return self.__stats['write']['bw']
+
+    def getReadLats(self):
+        ''' @return [min,max,mean] total read latencies in microseconds. '''
+        return list(self.__stats['read']['lat'])
+
+    def getWriteLats(self):
+        ''' @return [min,max,mean] total write latencies in microseconds. '''
+        return list(self.__stats['write']['lat'])
+
+    def getTotLats(self):
+        ''' @return [min,max,mean] read+write total latencies in microseconds. '''
+        r = self.__stats['read']['lat']
+        w = self.__stats['write']['lat']
+        return [r[0] + w[0], r[1] + w[1], r[2] + w[2]]
+
+    def getReadPercentiles(self):
+        ''' @return Dictionary of read completion latency percentiles {percentile: usec}. '''
+        return dict(self.__stats['read']['clatpct'])
+
+    def getWritePercentiles(self):
+        ''' @return Dictionary of write completion latency percentiles {percentile: usec}. '''
+        return dict(self.__stats['write']['clatpct'])
+
+    def getReadHistogram(self):
+        ''' @return The read clat LatHistogram, None if not available. '''
+        return self.__stats['read']['hist']
+
+    def getWriteHistogram(self):
+        ''' @return The write clat LatHistogram, None if not available. '''
+        return self.__stats['write']['hist']
+
+    def fromTerse(self,line):
+        '''
+        Set the result from one line of the fio terse output.
+        @param line A terse output line of fio.
+        '''
+        terse = line.split(';')
+        self.__name = terse[FioResult.terseNamePos]
+        self.__error = int(terse[FioResult.terseErrorPos])
+        for ddir in FioResult.ddirs:
+            pos = FioResult.terseStartPos[ddir]
+            st = self.__stats[ddir]
+            st['io'] = int(terse[pos + FioResult.terseTotIOOff])
+            st['bw'] = int(terse[pos + FioResult.terseTPOff])
+            st['iops'] = int(terse[pos + FioResult.terseIOPSOff])
+            st['runtime'] = int(terse[pos + FioResult.terseRuntimeOff])
+            #the terse output does not contain the number of IOs
+            st['ios'] = int(st['iops'] * st['runtime'] / 1000)
+            for key,off in [('slat',FioResult.terseSlatOff),('clat',FioResult.terseClatOff),
+                            ('lat',FioResult.terseLatOff)]:
+                st[key] = [float(terse[pos + off]),float(terse[pos + off + 1]),
+                           float(terse[pos + off + 2])]
+            for i in range(FioResult.tersePctNum):
+                #percentiles are given as e.g. 99.900000%=1234
+                match = re.search(r'^([\d\.]+)%=(\d+)$',terse[pos + FioResult.tersePctOff + i])
+                if match != None:
+                    st['clatpct'][float(match.group(1))] = float(match.group(2))
+
+    def fromJson(self,job):
+        '''
+        Set the result from one job of the fio json output.
+        Newer fio versions report latencies in nanoseconds, older ones
+        in microseconds. Both are converted to microseconds. The clat
+        histogram is only available from the json+ output.
+        @param job The decoded json object of a fio job.
+        '''
+        self.__name = job.get('jobname')
+        self.__error = int(job.get('error',0))
+        self.__elapsed = int(job.get('elapsed',0))
+        for ddir in FioResult.ddirs:
+            st = self.__stats[ddir]
+            if ddir not in job:
+                continue
+            d = job[ddir]
+            if 'io_kbytes' in d:
+                st['io'] = int(d['io_kbytes'])
+            else:
+                st['io'] = int(d.get('io_bytes',0))
+            st['bw'] = int(d.get('bw',0))
+            st['iops'] = int(round(d.get('iops',0)))
+            st['runtime'] = int(d.get('runtime',0))
+            st['ios'] = int(d.get('total_ios',round(st['iops'] * st['runtime'] / 1000.0)))
+            for key in ['slat','clat','lat']:
+                if key + '_ns' in d:
+                    lat = d[key + '_ns']
+                    div = 1000.0
+                elif key in d:
+                    lat = d[key]
+                    div = 1.0
+                else:
+                    continue
+                st[key] = [lat.get('min',0) / div,lat.get('max',0) / div,lat.get('mean',0) / div]
+                if key == 'clat' and 'percentile' in lat:
+                    for p,v in lat['percentile'].items():
+                        st['clatpct'][float(p)] = v / div
+                #the json+ output contains the latency bins in ns
+                if key == 'clat' and 'bins' in lat and div == 1000.0:
+                    st['hist'] = LatHistogram()
+                    st['hist'].addFioBins(lat['bins'])
+
+def parseJson(output):
+    '''
+    Parse the json output of a fio run.
+    @param output The standard output of fio.
+    @return A list of FioResult objects, one per job or reporting group.
+    @exception ValueError if the output cannot be decoded
+    '''
+    #fio can print informational lines before the json object
+    start = output.find('{')
+    if start == -1:
+        raise ValueError("no json object in fio output")
+    decoded = json.loads(output[start:])
+    return resultsFromJson(decoded,output)
+
+def resultsFromJson(decoded,output=None):
+    '''
+    Create the results of a decoded fio json object.
+    @param decoded The decoded json object of fio, e.g. a status snapshot.
+    @param output The fio output the object has been decoded from.
+    @return A list of FioResult objects, one per job or reporting group.
+    '''
+    results = []
+    for job in decoded.get('jobs',[]):
+        res = FioResult(output)
+        res.fromJson(job)
+        results.append(res)
+    return results
+
+def parseTerse(output):
+    '''
+    Parse the terse output of a fio run.
+    @param output The standard output of fio.
+    @return A list of FioResult objects, one per job or reporting group.
+    '''
+    results = []
+    for line in output.split('\n'):
+        if line.count(';') < FioResult.terseStartPos['write']:
+            if line != '':
+                logging.info("# Skipping fio output line: " + line)
+            continue
+        res = FioResult(line)
+        res.fromTerse(line)
+        results.append(res)
+    return results
@@ -0,0 +1,211 @@
+''' @package FioStream
+A module reading the output of a running fio process incrementally.
+'''
+import codecs
+import json
+import logging
+import os
+import selectors
+import signal
+import subprocess
+
+from fio.FioResult import parseTerse
+from fio.FioResult import resultsFromJson
+
+class FioStream(object):
+    '''
+    A running fio process. Iterating over the stream yields the status
+    snapshots fio prints with --status-interval in the json output format,
+    each as a list of FioResult objects. After the iteration the final
+    results, the warnings and a possible error are available.
+    A non zero exit code of fio is an error, messages on standard error of
+    a successful run are only warnings.
+    '''
+    ## Seconds after which a run without any IO is aborted.
+    zeroIOAbortSec = 10
+
+    def __init__(self, args, outputFormat, tmpFiles=None):
+        '''
+        Constructor
+        @param args The fio command line.
+        @param outputFormat The output format fio is called with (json+|json|minimal).
+        @param tmpFiles Files to remove after fio has finished, e.g. job files.
+        '''
+        ## The fio command line
+        self.__args = args
+        ## The fio output format
+        self.__outputFormat = outputFormat
+        ## Temporary files used by the fio run
+        self.__tmpFiles = tmpFiles if tmpFiles != None else []
+        ## The fio process
+        self.__proc = None
+        ## Standard output of fio
+        self.__stdout = ''
+        ## Standard error of fio
+        self.__stderr = ''
+        ## Json output not decoded yet
+        self.__buf = ''
+        ## The latest results, after finishing the final ones
+        self.__results = []
+        ## Error message, None if fio finished correctly
+        self.__error = None
+        ## True if fio has been stopped by abort
+        self.__aborted = False
+
+    def getArgs(self): return self.__args
+    def getStdout(self): return self.__stdout
+    def getResults(self): return self.__results
+    def getError(self): return self.__error
+    def isAborted(self): return self.__aborted
+    def isOk(self): return self.__error == None
+
+    def getWarnings(self):
+        ''' @return Messages of fio on standard error. '''
+        return self.__stderr
+
+    def getReturnCode(self):
+        ''' @return The exit code of fio, None if it is still running. '''
+        if self.__proc == None:
+            return None
+        return self.__proc.poll()
+
+    def __iter__(self):
+        return self.snapshots()
+
+    def abort(self,error=None):
+        '''
+        Stop fio gracefully, fio then prints the results up to now.
+        @param error An error message if the run is aborted as it failed.
+        '''
+        if error != None and self.__error == None:
+            self.__error = error
+        if self.__proc != None and self.__proc.poll() == None:
+            logging.info("# Stopping fio")
+            self.__aborted = True
+            self.__proc.send_signal(signal.SIGINT)
+
+    def run(self):
+        '''
+        Run fio until it has finished, without looking at the snapshots.
+        @return True if fio finished correctly, False on error.
+        '''
+        for snapshot in self.snapshots():
+            pass
+        return self.isOk()
+
+    def checkZeroIO(self,results):
+        '''
+        Abort the run if no IO has been carried out for zeroIOAbortSec.
+        @param results The results of a status snapshot.
+        '''
+        if self.__aborted:
+            return
+        elapsed = max([r.getElapsed() for r in results] + [0])
+        if elapsed >= FioStream.zeroIOAbortSec and sum(r.getTotIOs() for r in results) == 0:
+            logging.error("# Fio did not carry out any IO after " + str(elapsed) + " seconds")
+            self.abort("no IO after " + str(elapsed) + " seconds")
+
+    @staticmethod
+    def getIntervalIOPS(prev,cur):
+        '''
+        Calculate the IOPS between two status snapshots of a job.
+        @param prev The FioResult of the previous snapshot, None for the start.
+        @param cur The FioResult of the current snapshot.
+        @return The IOPS of the interval, None if no time has elapsed.
+        '''
+        ios = cur.getTotIOs()
+        elapsed = cur.getElapsed()
+        if prev != None:
+            ios -= prev.getTotIOs()
+            elapsed -= prev.getElapsed()
+        if elapsed <= 0:
+            return None
+        return ios / float(elapsed)
+
+    def decodeSnapshots(self,text):
+        '''
+        Add json output of fio and decode every complete json object.
+        @param text The new output.
+        @return A list of status snapshots, lists of FioResult objects.
+        '''
+        decoder = json.JSONDecoder()
+        self.__buf += text
+        snapshots = []
+        while True:
+            start = self.__buf.find('{')
+            if start == -1:
+                self.__buf = ''
+                break
+            try:
+                obj,end = decoder.raw_decode(self.__buf,start)
+            except ValueError:
+                self.__buf = self.__buf[start:]
+                break
+            results = resultsFromJson(obj,self.__buf[start:end])
+            self.__buf = self.__buf[end:]
+            self.__results = results
+            snapshots.append(results)
+        return snapshots
+
+    def snapshots(self):
+        '''
+        Start fio and read its output incrementally.
+        @return A generator of status snapshots, lists of FioResult objects.
+        '''
+        logging.info('%s',self.__args)
+        self.__proc = subprocess.Popen(self.__args,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        sel = selectors.DefaultSelector()
+        sel.register(self.__proc.stdout,selectors.EVENT_READ,codecs.getincrementaldecoder('utf-8')('replace'))
+        sel.register(self.__proc.stderr,selectors.EVENT_READ,codecs.getincrementaldecoder('utf-8')('replace'))
+        isJson = self.__outputFormat.startswith('json')
+        try:
+            while len(sel.get_map()) > 0:
+                for key,mask in sel.select():
+                    data = os.read(key.fd,65536)
+                    if data == b'':
+                        sel.unregister(key.fileobj)
+                        continue
+                    text = key.data.decode(data)
+                    if key.fileobj is self.__proc.stderr:
+                        self.__stderr += text
+                        continue
+                    self.__stdout += text
+                    if not isJson:
+                        continue
+                    for results in self.decodeSnapshots(text):
+                        self.checkZeroIO(results)
+                        yield results
+            self.__proc.wait()
+        finally:
+            sel.close()
+            #the consumer stopped early, stop fio and read its final output
+            if self.__proc.poll() == None:
+                self.abort()
+                out,err = self.__proc.communicate()
+                self.__stderr += err.decode('utf-8','replace')
+                self.__stdout += out.decode('utf-8','replace')
+                if isJson:
+                    self.decodeSnapshots(out.decode('utf-8','replace'))
+            self.__proc.stdout.close()
+            self.__proc.stderr.close()
+            for path in self.__tmpFiles:
+                if os.path.isfile(path):
+                    os.remove(path)
+            self.finish()
+
+    def finish(self):
+        ''' Check the exit code and set the final results of the fio run. '''
+        code = self.__proc.returncode
+        if self.__stderr != '':
+            if code != 0:
+                logging.error("Fio encountered an error: " + self.__stderr)
+            else:
+                logging.warning("Fio reported warnings: " + self.__stderr)
+        #fio can exit with an error code if stopped by a signal
+        if code != 0 and not self.__aborted and self.__error == None:
+            self.__error = "fio exited with code " + str(code) + ": " + self.__stderr
+        if not self.__outputFormat.startswith('json'):
+            self.__results = parseTerse(self.__stdout)
+        if len(self.__results) == 0 and self.__error == None:
+            logging.error("Fio output could not be parsed: " + self.__stdout)
+            self.__error = "no fio result"
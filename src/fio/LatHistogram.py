@@ -0,0 +1,159 @@
+''' @package LatHistogram
+A module realizing a compact latency histogram.
+'''
+import base64
+import math
+import sys
+from array import array
+
+class LatHistogram(object):
+    '''
+    A log-linear histogram of latencies in microseconds. Every power of two
+    is divided into subBuckets linear buckets, the first bucket holds all
+    latencies below 1us, the last one all latencies above the largest group.
+    Histograms of the same layout can be merged by adding their counts.
+    '''
+    ## Number of linear buckets per power of two.
+    subBuckets = 8
+
+    ## Number of powers of two, the largest bucket starts at 2^groups us.
+    groups = 25
+
+    ## Total number of buckets.
+    numBuckets = 1 + (groups * subBuckets) + 1
+
+    def __init__(self, counts=None):
+        '''
+        Constructor
+        @param counts An optional list of bucket counts.
+        '''
+        ## IO counts of the buckets
+        self.__counts = array('Q',[0] * LatHistogram.numBuckets)
+        if counts != None:
+            for i,c in enumerate(counts):
+                self.__counts[i] = c
+
+    def getCounts(self): return self.__counts
+    def getTotal(self): return sum(self.__counts)
+
+    @staticmethod
+    def bucketIndex(usec):
+        '''
+        Get the bucket index of a latency.
+        @param usec The latency in microseconds.
+        @return The index of the bucket the latency belongs to.
+        '''
+        if usec < 1:
+            return 0
+        e = int(math.floor(math.log(usec,2)))
+        if e >= LatHistogram.groups:
+            return LatHistogram.numBuckets - 1
+        sub = int(((usec / (2.0 ** e)) - 1) * LatHistogram.subBuckets)
+        sub = min(sub,LatHistogram.subBuckets - 1)
+        return 1 + (e * LatHistogram.subBuckets) + sub
+
+    @staticmethod
+    def bucketBounds(idx):
+        '''
+        Get the lower and upper latency bound of a bucket.
+        @param idx The index of the bucket.
+        @return [lower,upper] bound in microseconds.
+        '''
+        if idx == 0:
+            return [0.0,1.0]
+        if idx == LatHistogram.numBuckets - 1:
+            low = 2.0 ** LatHistogram.groups
+            return [low,low]
+        e,sub = divmod(idx - 1,LatHistogram.subBuckets)
+        width = (2.0 ** e) / LatHistogram.subBuckets
+        low = (2.0 ** e) + (sub * width)
+        return [low,low + width]
+
+    def add(self,usec,count=1):
+        '''
+        Add IOs with a given latency to the histogram.
+        @param usec The latency in microseconds.
+        @param count The number of IOs.
+        '''
+        self.__counts[LatHistogram.bucketIndex(usec)] += int(count)
+
+    def addFioBins(self,bins):
+        '''
+        Add the latency bins of the fio json+ output.
+        @param bins Dictionary {latency in ns: IO count} of fio.
+        '''
+        for ns,count in bins.items():
+            self.add(float(ns) / 1000,count)
+
+    def merge(self,other):
+        '''
+        Add the counts of another histogram to this histogram.
+        @param other The LatHistogram to merge.
+        @return This histogram.
+        '''
+        for i,c in enumerate(other.getCounts()):
+            self.__counts[i] += c
+        return self
+
+    def getPercentile(self,pct):
+        '''
+        Calculate a percentile of the latencies. The latency is interpolated
+        linearly inside the bucket containing the percentile.
+        @param pct The percentile, e.g. 99.9
+        @return The latency in microseconds, 0 if the histogram is empty.
+        '''
+        total = self.getTotal()
+        if total == 0:
+            return 0.0
+        target = total * (pct / 100.0)
+        cum = 0
+        for i,c in enumerate(self.__counts):
+            if c == 0:
+                continue
+            if cum + c >= target:
+                low,high = LatHistogram.bucketBounds(i)
+                return low + ((high - low) * ((target - cum) / c))
+            cum += c
+        return LatHistogram.bucketBounds(LatHistogram.numBuckets - 1)[0]
+
+    def toString(self):
+        '''
+        Encode the histogram compactly. Trailing empty buckets are
+        omitted, the counts are stored as little endian 64 bit integers.
+        @return A base64 string.
+        '''
+        last = len(self.__counts)
+        while last > 0 and self.__counts[last - 1] == 0:
+            last -= 1
+        counts = array('Q',self.__counts[:last])
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        return base64.b64encode(counts.tobytes()).decode('ascii')
+
+    @staticmethod
+    def fromString(data):
+        '''
+        Decode a histogram encoded with toString.
+        @param data The base64 string.
+        @return A LatHistogram, None if data is empty.
+        '''
+        if data == None or data == '':
+            return None
+        counts = array('Q')
+        counts.frombytes(base64.b64decode(data))
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        return LatHistogram(counts)
+
+def mergeHistograms(hists):
+    '''
+    Merge a list of histograms into a new histogram.
+    @param hists A list of LatHistogram objects.
+    @return The merged LatHistogram, None if a histogram is missing.
+    '''
+    if len(hists) == 0 or None in hists:
+        return None
+    merged = LatHistogram()
+    for h in hists:
+        merged.merge(h)
+    return merged
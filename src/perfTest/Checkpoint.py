@@ -0,0 +1,146 @@
+''' @package Checkpoint
+A module checkpointing the rounds of a running performance test.
+'''
+import json
+import logging
+import os
+
+class Checkpoint(object):
+    '''
+    An append only checkpoint file of a performance test. After every test
+    round its results are appended as one json line, this allows to resume
+    a test run that has been interrupted.
+    '''
+
+    def __init__(self, testname, resume=False):
+        '''
+        Constructor
+        @param testname Name of the performance test, the file is testname.ckpt
+        @param resume If True load an existing checkpoint file, else start a
+        new, empty one.
+        '''
+        ## Path of the checkpoint file
+        self.__path = testname + '.ckpt'
+        ## Loaded records per test key: {'options':..,'rounds':{}}
+        self.__records = {}
+        ## Schedule of the tests in the checkpointed run, cf. Scheduler.plan
+        self.__schedule = None
+        if resume == True:
+            self.load()
+        else:
+            open(self.__path,'w').close()
+
+    def getPath(self): return self.__path
+    def getSchedule(self): return self.__schedule
+
+    @staticmethod
+    def roundKey(rnd):
+        '''
+        Get the key of a round, rounds can be identified by several indices.
+        @param rnd A list of indices, e.g. [round] or [block size,round]
+        @return A string usable as dictionary key.
+        '''
+        return json.dumps(list(rnd))
+
+    def load(self):
+        '''
+        Load the records of the checkpoint file. A partially written last
+        line, e.g. from a crash while writing it, is ignored.
+        '''
+        if not os.path.isfile(self.__path):
+            logging.info("# No checkpoint file " + self.__path + " found, starting from scratch")
+            return
+        with open(self.__path,'r') as f:
+            lines = f.read()
+        #terminate an incomplete last line, new records start on a new line
+        if lines != '' and not lines.endswith('\n'):
+            self.append(None)
+        for line in lines.splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                logging.warning("# Ignoring incomplete checkpoint record")
+                continue
+            if rec == None:
+                continue
+            if rec['type'] == 'schedule':
+                self.__schedule = rec['schedule']
+                continue
+            test = self.__records.setdefault(rec['test'],{'options':None,'rounds':{}})
+            if rec['type'] == 'prepared':
+                test['options'] = rec['options']
+            if rec['type'] == 'round':
+                test['rounds'][Checkpoint.roundKey(rec['rnd'])] = rec['data']
+        for k,v in self.__records.items():
+            logging.info("# Checkpoint of test " + k + " has " + str(len(v['rounds'])) + " rounds")
+
+    def append(self,rec):
+        '''
+        Append a record to the checkpoint file and sync it to disk.
+        @param rec A json serializable dictionary, None to only terminate
+        the last line.
+        '''
+        with open(self.__path,'a') as f:
+            if rec != None:
+                f.write(json.dumps(rec))
+            f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def isPrepared(self,test,options):
+        '''
+        Check if a test has already been prepared, i.e. the device has been
+        erased and preconditioned, in the resumed run.
+        @param test The key of the test.
+        @param options The options of the current test.
+        @return True if the test has been prepared, False if not.
+        @exception RuntimeError if the test was run with different options
+        '''
+        if test not in self.__records or self.__records[test]['options'] == None:
+            return False
+        if self.__records[test]['options'] != options:
+            raise RuntimeError("checkpoint of test " + test + " was written with different options: "
+                               + str(self.__records[test]['options']))
+        return True
+
+    def addPrepared(self,test,options):
+        '''
+        Record that a test has been prepared.
+        @param test The key of the test.
+        @param options The options of the current test.
+        '''
+        self.append({'test':test,'type':'prepared','options':options})
+
+    def addSchedule(self,schedule):
+        '''
+        Record the schedule of the tests, a resumed run uses the same
+        schedule.
+        @param schedule The json serializable schedule.
+        '''
+        self.__schedule = schedule
+        self.append({'type':'schedule','schedule':schedule})
+
+    def getRound(self,test,rnd):
+        '''
+        Get the recorded results of a round.
+        @param test The key of the test.
+        @param rnd A list of indices identifying the round.
+        @return The round results, None if the round has not been recorded.
+        '''
+        if test not in self.__records:
+            return None
+        return self.__records[test]['rounds'].get(Checkpoint.roundKey(rnd))
+
+    def addRound(self,test,rnd,data):
+        '''
+        Record the results of a round.
+        @param test The key of the test.
+        @param rnd A list of indices identifying the round.
+        @param data The json serializable results of the round.
+        '''
+        self.append({'test':test,'type':'round','rnd':list(rnd),'data':data})
+
+    def remove(self):
+        ''' Remove the checkpoint file, e.g. if all results are written to xml. '''
+        if os.path.isfile(self.__path):
+            os.remove(self.__path)
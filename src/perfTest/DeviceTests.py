@@ -10,14 +10,64 @@ from collections import deque
 from lxml import etree
 import json
 
+import numpy as np
+
 from perfTest.StdyState import StdyState
 from perfTest.Options import Options
 from fio.FioJob import FioJob
+from fio.FioStream import FioStream
+from fio.LatHistogram import LatHistogram
+from fio.LatHistogram import mergeHistograms
+from reports.NpzReport import NpzReport
+
+def encodeHistMatrices(hists):
+    '''
+    Encode nested lists of histograms for the xml representation.
+    @param hists Nested lists of LatHistogram objects or None.
+    @return The same nesting with encoded strings, '' for missing histograms.
+    '''
+    if isinstance(hists,list):
+        return [encodeHistMatrices(h) for h in hists]
+    if hists == None:
+        return ''
+    return hists.toString()
+
+def countHistMatrices(hists):
+    '''
+    Get the bucket counts of nested lists of histograms, e.g. to store them
+    as integer array in a npz report.
+    @param hists Nested lists of LatHistogram objects or None.
+    @return The same nesting with lists of numBuckets counts, the counts of
+    missing histograms are -1.
+    '''
+    if isinstance(hists,list):
+        return [countHistMatrices(h) for h in hists]
+    if hists == None:
+        return [-1] * LatHistogram.numBuckets
+    return list(hists.getCounts())
+
+def decodeHistMatrices(data):
+    '''
+    Decode nested lists of histograms encoded with encodeHistMatrices or
+    arrays of bucket counts created with countHistMatrices.
+    @param data Nested lists of encoded strings or an array of counts.
+    @return The same nesting with LatHistogram objects or None.
+    '''
+    if isinstance(data,np.ndarray):
+        if data.ndim == 1 and len(data) == LatHistogram.numBuckets:
+            return None if data[0] < 0 else LatHistogram(data.tolist())
+        return [decodeHistMatrices(d) for d in data]
+    if isinstance(data,list):
+        return [decodeHistMatrices(d) for d in data]
+    return LatHistogram.fromString(data)
 
 class DeviceTest(object, metaclass=ABCMeta):
     '''
     Representing a performance test, run on a device.
     '''
+    ##Block size of the dependent variable of the steady state, it is never
+    ##removed from the block sizes, None if the test has no steady state.
+    stdyBs = None
 
     def __init__(self,testname,device,options=None):
         '''
@@ -37,6 +87,28 @@ class DeviceTest(object, metaclass=ABCMeta):
         self.__figures = []
         ## Measurement overview tables, from which plots are generated
         self.__tables = []
+        ## Checkpoint to record the results of each round, None if not used
+        self.__checkpoint = None
+        ## Key of the test in the checkpoint
+        self.__checkpointKey = None
+        ## Binary store for the result matrices, None stores them as json in xml
+        self.__npzReport = None
+        ## Xml elements of result matrices that are loaded on first access, tag: element
+        self.__deferred = {}
+        ## Deferred matrices copied out of the npz report, tag: matrix
+        self.__detached = {}
+        ## Erases of the device carried out for the test, cf. Device.getLastErase
+        self.__erases = []
+        ## Preconditionings of the device carried out for the test, cf. Device.getLastPrecondition
+        self.__preconditions = []
+        ## Key of the test whose device state the test started from, None if it prepared the device itself
+        self.__sharedFrom = None
+        ## True if the last round of the test ran on the device in this run
+        self.__leftState = False
+        ## True if rounds of the test have been restored from the checkpoint
+        self.__resumed = False
+        ## Maximum number of rounds, e.g. to meet a time budget, None for the default of the test
+        self.__rndLimit = None
 
     def getTestname(self): return self.__testname
     def getDevice(self): return self.__device
@@ -44,6 +116,153 @@ class DeviceTest(object, metaclass=ABCMeta):
     def getFioJob(self): return self.__fioJob
     def getFigures(self): return self.__figures
     def getTables(self): return self.__tables
+    def getCheckpoint(self): return self.__checkpoint
+    def getNpzReport(self): return self.__npzReport
+    def getErases(self): return self.__erases
+    def getPreconditions(self): return self.__preconditions
+    def getSharedFrom(self): return self.__sharedFrom
+    def hasLeftState(self): return self.__leftState
+    def isResumed(self): return self.__resumed
+    def setNpzReport(self,npz): self.__npzReport = npz
+    def setSharedFrom(self,key): self.__sharedFrom = key
+    def setRndLimit(self,rnds): self.__rndLimit = rnds
+
+    def getRndLimit(self,default):
+        '''
+        Get the maximum number of rounds of the test.
+        @param default The maximum number of rounds of the test type.
+        @return The default, or the limit if it is lower.
+        '''
+        if self.__rndLimit == None:
+            return default
+        return min(default,self.__rndLimit)
+
+    def setCheckpoint(self,ckpt,key):
+        '''
+        Set the checkpoint the results of each round are recorded in.
+        @param ckpt A Checkpoint object.
+        @param key The key of the test in the checkpoint.
+        '''
+        self.__checkpoint = ckpt
+        self.__checkpointKey = key
+
+    def getCheckpointOptions(self):
+        '''
+        Get the options that must not change if a test is resumed.
+        @return A json serializable dictionary of the options.
+        '''
+        if self.__options == None:
+            return None
+        return {'nj':self.__options.getNj(),'iod':self.__options.getIod(),
+                'runtime':self.__options.getRuntime(),'xargs':self.__options.getXargs(),
+                'targetci':self.__options.getTargetCI()}
+
+    def eraseDevice(self):
+        '''
+        Secure erase the device and record the used erase method and its
+        duration for the report.
+        @return True if the device was erased, False if not.
+        @exception RuntimeError if the erase failed.
+        '''
+        self.getDevice().setLastErase(None)
+        erased = self.getDevice().secureErase()
+        if self.getDevice().getLastErase() != None:
+            self.__erases.append(self.getDevice().getLastErase())
+        return erased
+
+    def preconditionDevice(self,nj=1,iod=1):
+        '''
+        Carry out the workload independent preconditioning of the device and
+        record the bandwidth of its rounds for the report.
+        @param nj Number of fio jobs.
+        @param iod IO depth of every job.
+        @exception RuntimeError if the preconditioning failed.
+        '''
+        self.getDevice().setLastPrecondition(None)
+        self.getDevice().precondition(nj,iod)
+        if self.getDevice().getLastPrecondition() != None:
+            self.__preconditions.append(self.getDevice().getLastPrecondition())
+
+    def appendPreparation(self,root):
+        '''
+        Append the erases and preconditionings of the test to its xml element.
+        @param root The xml element of the test.
+        '''
+        if len(self.__erases) > 0:
+            e = etree.SubElement(root,'erases')
+            e.text = json.dumps(self.__erases)
+        if len(self.__preconditions) > 0:
+            e = etree.SubElement(root,'preconditions')
+            e.text = json.dumps(self.__preconditions)
+        if self.__sharedFrom != None:
+            e = etree.SubElement(root,'sharedfrom')
+            e.text = json.dumps(self.__sharedFrom)
+
+    def loadPreparation(self,root):
+        '''
+        Load the erases and preconditionings of the test from its xml element,
+        older xml files do not contain them.
+        @param root The xml element of the test.
+        '''
+        if root.findtext('erases'):
+            self.__erases = json.loads(root.findtext('erases'))
+        if root.findtext('preconditions'):
+            self.__preconditions = json.loads(root.findtext('preconditions'))
+        if root.findtext('sharedfrom'):
+            self.__sharedFrom = json.loads(root.findtext('sharedfrom'))
+
+    def isShareable(self):
+        '''
+        Check if the device is in a state a following test can start from
+        instead of erasing and preconditioning it, cf. Scheduler.
+        @return True if the state can be shared, False if not.
+        '''
+        return False
+
+    def isPrepared(self):
+        '''
+        Check if the device has already been prepared for the test, i.e.
+        secure erase and preconditioning has been carried out in the run
+        that is resumed.
+        @return True if the device has been prepared, False if not.
+        '''
+        if self.__checkpoint == None:
+            return False
+        if self.__checkpoint.isPrepared(self.__checkpointKey,self.getCheckpointOptions()):
+            logging.info("# Resuming test " + self.__checkpointKey + ", skipping device preparation")
+            return True
+        return False
+
+    def setPrepared(self):
+        ''' Record in the checkpoint that the device has been prepared. '''
+        if self.__checkpoint != None:
+            self.__checkpoint.addPrepared(self.__checkpointKey,self.getCheckpointOptions())
+
+    def resumeRound(self,*rnd):
+        '''
+        Get the results of a round from the checkpoint.
+        @param rnd The indices identifying the round.
+        @return The recorded results, None if the round has to be run.
+        '''
+        if self.__checkpoint == None:
+            return None
+        data = self.__checkpoint.getRound(self.__checkpointKey,rnd)
+        if data != None:
+            logging.info("# Round " + str(list(rnd)) + " restored from checkpoint")
+            #the device may have been changed after the round has run
+            self.__leftState = False
+            self.__resumed = True
+        return data
+
+    def checkpointRound(self,data,*rnd):
+        '''
+        Record the results of a round in the checkpoint.
+        @param data The json serializable results of the round.
+        @param rnd The indices identifying the round.
+        '''
+        self.__leftState = True
+        if self.__checkpoint != None:
+            self.__checkpoint.addRound(self.__checkpointKey,rnd,data)
 
     def setFigures(self,fig):
         '''
@@ -64,6 +283,97 @@ class DeviceTest(object, metaclass=ABCMeta):
         '''
         self.__tables.append(tb)
 
+    def appendMatrix(self,r,tag,data):
+        '''
+        Append a result matrix to the xml representation of the test. If a
+        npz report is set the matrix is stored in it and the xml element only
+        references it, else the matrix is stored as json.
+        @param r The xml root element of the test.
+        @param tag The tag of the new element, e.g. roundmat.
+        @param data The matrix, nested lists of numbers.
+        '''
+        e = etree.SubElement(r,tag)
+        key = r.tag + '.' + tag
+        if self.__npzReport != None and self.__npzReport.addData(key,data):
+            e.set('npz',self.__npzReport.getFilename())
+            e.set('key',key)
+        else:
+            e.text = json.dumps(NpzReport.toList(data))
+
+    def appendHistMatrix(self,r,tag,hists):
+        '''
+        Append nested lists of clat histograms to the xml representation of
+        the test. If a npz report is set the bucket counts are stored in it
+        as integer array and the xml element only references it, else the
+        histograms are stored as json list of encoded strings.
+        @param r The xml root element of the test.
+        @param tag The tag of the new element, e.g. histmat.
+        @param hists Nested lists of LatHistogram objects or None.
+        '''
+        if self.__npzReport != None:
+            self.appendMatrix(r,tag,countHistMatrices(hists))
+        else:
+            e = etree.SubElement(r,tag)
+            e.text = json.dumps(encodeHistMatrices(hists))
+
+    def loadMatrix(self,root,tag):
+        '''
+        Load a result matrix from the xml representation of the test.
+        Matrices stored in a npz report are memory mapped.
+        @param root The xml root element of the test.
+        @param tag The tag of the element.
+        @return The matrix, None if it is not in the xml.
+        @exception RuntimeError if the referenced npz report is not available.
+        '''
+        e = root.find(tag)
+        if e is None:
+            return None
+        if e.get('npz') != None:
+            if self.__npzReport == None or not self.__npzReport.hasData(e.get('key')):
+                raise RuntimeError("results " + e.get('key') + " are stored in missing file " + e.get('npz'))
+            return self.__npzReport.getData(e.get('key'))
+        if not e.text:
+            return None
+        return json.loads(e.text)
+
+    def deferMatrix(self,root,tag):
+        '''
+        Defer loading a result matrix from xml until it is accessed, e.g.
+        comparisons often only need some of the matrices.
+        @param root The xml root element of the test.
+        @param tag The tag of the element.
+        '''
+        self.__deferred[tag] = root
+
+    def detachNpz(self):
+        '''
+        Copy the deferred matrices stored in the npz report into memory, e.g.
+        before the npz file is written again. Loading them later would map
+        the new file with the offsets of the old one. Matrices that are
+        already loaded stay mapped to the replaced file.
+        '''
+        for tag in list(self.__deferred.keys()):
+            e = self.__deferred[tag].find(tag)
+            if e is not None and e.get('npz') != None:
+                self.__detached[tag] = NpzReport.copy(self.loadMatrix(self.__deferred.pop(tag),tag))
+
+    def loadDeferred(self,tag,default):
+        '''
+        Load a result matrix whose loading has been deferred.
+        @param tag The tag of the element.
+        @param default The value if the matrix is not in the xml, e.g. for
+        xml files of older versions.
+        @return The loaded matrix or default.
+        '''
+        root = self.__deferred.pop(tag,None)
+        data = self.__detached.pop(tag,None)
+        if root is not None:
+            logging.debug("# Loading " + tag + " of " + root.tag + " test")
+            data = self.loadMatrix(root,tag)
+        if data is None:
+            return default
+        return data
+
     def initialize(self):
         ''' Initialize Device and FioJob to setup params. '''
         self.getDevice().initialize()
@@ -83,7 +393,6 @@ class DeviceTest(object, metaclass=ABCMeta):
         self.__fioJob.addKVArg("filename",self.__device.getDevPath())
         self.__fioJob.addKVArg("name",self.__testname)
         self.__fioJob.addKVArg("direct","1")
-        self.__fioJob.addSglArg("minimal")
         self.__fioJob.addKVArg("ioengine","libaio")
         self.__fioJob.addSglArg("time_based")
         if self.__options == None:
@@ -102,6 +411,119 @@ class DeviceTest(object, metaclass=ABCMeta):
                     self.__fioJob.addSglArg(arg)
         self.__fioJob.addSglArg("group_reporting")
 
+    def startRoundJob(self,mixWlds,stdyCell=None,onSample=None):
+        '''
+        Run all workload and block size combinations of a round with one
+        fio process. Every combination is a stonewalled job file section.
+        The combination used for steady state detection runs as its own fio
+        process in between, the IOPS of every second are taken from its fio
+        status snapshots.
+        @param mixWlds The percentages of reads in the mixed workloads.
+        @param stdyCell Optional combination (workload,block size) whose
+        IOPS of every second are passed to onSample.
+        @param onSample Called with the IOPS of every second of stdyCell,
+        if it returns True the combination is stopped early.
+        @return A list of fio outputs, ordered by workload and block size.
+        '''
+        cells = [(i,j) for i in mixWlds for j in self.getBsLabels()]
+        if self.isAdaptive():
+            jobOuts = []
+            for cell in cells:
+                kvArgs = {"rwmixread":str(cell[0]),"bs":cell[1]}
+                jobOuts.append(self.startCellJob(kvArgs,onSample if cell == stdyCell else None))
+            return jobOuts
+        jobOuts = []
+        sections = []
+        for cell in cells + [None]:
+            if cell != None and (cell != stdyCell or onSample == None):
+                sections.append(cell)
+                continue
+            if len(sections) > 0:
+                jobOuts.extend(self.startSections(sections))
+                sections = []
+            if cell != None:
+                kvArgs = {"rwmixread":str(cell[0]),"bs":cell[1]}
+                jobOuts.append(self.startCellJob(kvArgs,onSample))
+        return jobOuts
+
+    def startSections(self,cells):
+        '''
+        Run workload and block size combinations as stonewalled sections of
+        one fio job file.
+        @param cells The combinations, a list of (workload,block size).
+        @return A list of fio outputs in the order of the combinations.
+        '''
+        self.__fioJob.clearSections()
+        for i,j in cells:
+            self.__fioJob.addSection(self.__testname + '-' + str(i) + '-' + j,
+                                     {"rwmixread":str(i),"bs":j},["stonewall"])
+        call,jobOuts = self.__fioJob.startJobFile()
+        self.__fioJob.clearSections()
+        if call == False:
+            exit(1)
+        return jobOuts
+
+    def isAdaptive(self):
+        '''
+        Check if the runtime of the combinations is chosen adaptively. This
+        needs the status snapshots of the fio json output.
+        @return True if the combinations run until their IOPS converge.
+        '''
+        if self.__options == None or not self.__options.isAdaptive():
+            return False
+        if not self.__fioJob.getOutputFormat().startswith('json'):
+            logging.info("# Adaptive runtime needs json output of fio, using fixed runtime")
+            return False
+        return True
+
+    def startCellJob(self,kvArgs,onSample=None):
+        '''
+        Run one workload and block size combination, the IOPS of every
+        second are taken from fio status snapshots. With adaptive runtime
+        the combination runs until the confidence interval of its IOPS is
+        within the target of the options, at least the minimum and at most
+        the maximum runtime.
+        @param kvArgs Key value arguments of the combination.
+        @param onSample Optionally called with the IOPS of every second, if
+        it returns True the combination is stopped early.
+        @return The fio output of the combination.
+        '''
+        opts = self.__options
+        adaptive = self.isAdaptive()
+        for k,v in kvArgs.items():
+            self.__fioJob.addKVArg(k,v)
+        runtime = self.__fioJob.getKVArgs().get("runtime")
+        if adaptive:
+            self.__fioJob.addKVArg("runtime",str(opts.getMaxRuntime()))
+        stream = self.__fioJob.startStream(1)
+        prev = None
+        samples = []
+        for snapshot in stream:
+            cur = snapshot[0]
+            iops = FioStream.getIntervalIOPS(prev,cur)
+            if iops == None:
+                continue
+            prev = cur
+            samples.append(iops)
+            if stream.isAborted():
+                continue
+            if onSample != None and onSample(iops) == True:
+                logging.info("# Stopping combination after " + str(cur.getElapsed()) + "s")
+                stream.abort()
+            elif adaptive and cur.getElapsed() >= opts.getMinRuntime():
+                ci = StdyState.calcRelCI(samples)
+                if ci != None and ci <= opts.getTargetCI():
+                    logging.info("# IOPS converged after " + str(cur.getElapsed()) + "s, relative CI " + str(ci))
+                    stream.abort()
+        for k in kvArgs.keys():
+            self.__fioJob.removeKVArg(k)
+        if runtime != None:
+            self.__fioJob.addKVArg("runtime",runtime)
+        if not stream.isOk():
+            logging.error("# Fio failed: " + stream.getError())
+            exit(1)
+        return stream.getResults()[0]
+
     @abstractmethod
     def testRound(self):
         ''' A test round for a specific device performance test. '''
@@ -121,8 +543,12 @@ class DeviceTest(object, metaclass=ABCMeta):
     def fromXml(self):
         ''' Load a test from a Xml representation. '''
     @abstractmethod
-    def genPlots(self):
-        ''' Generate plots for a test. '''
+    def genPlots(self,jobs=None):
+        '''
+        Generate plots for a test.
+        @param jobs A list to queue the rendering of the figures in, None
+        to render them immediately.
+        '''
 
 class SsdIopsTest(DeviceTest):
     '''
@@ -130,6 +556,8 @@ class SsdIopsTest(DeviceTest):
     '''
     ##Percentages of mixed workloads
     mixWlds = [100,95,65,50,35,5,0]
+    ##Block size of the dependent variable of the steady state.
+    stdyBs = "4k"
 
     def __init__(self,testname,device,options=None):
         '''
@@ -140,6 +568,8 @@ class SsdIopsTest(DeviceTest):
         self.__bsLabels = ["1024k","128k","64k","32k","16k","8k","4k","512"]
         ## A list of matrices with the collected fio measurement values of each round.
         self.__roundMatrices = []
+        ## A list of matrices with the runtime in seconds of every combination of each round.
+        self.__rtMatrices = []
         self.__stdyState = StdyState()
         self.getFioJob().addKVArg("rw","randrw")
 
@@ -154,7 +584,14 @@ class SsdIopsTest(DeviceTest):
             if bsToRemove in self.getBsLabels():
                 self.getBsLabels().remove(bsToRemove)
 
-    def getRndMatrices(self): return self.__roundMatrices
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
+    def getRtMatrices(self):
+        if self.__rtMatrices is None:
+            self.__rtMatrices = self.loadDeferred('rtmat',[])
+        return self.__rtMatrices
     def getStdyState(self): return self.__stdyState
     def getBsLabels(self): return self.__bsLabels
 
@@ -164,34 +601,51 @@ class SsdIopsTest(DeviceTest):
         has been reached.
         '''
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
+        logging.info("Runtime matrices: ")
+        logging.info(self.getRtMatrices())
         self.getStdyState().toLog()
 
-    def testRound(self):
+    def testRound(self,xs=None):
         '''
         Carry out one IOPS test round.
         The round consists of two inner loops: one iterating over the
         percentage of random reads/writes in the mixed workload, the other
         over different block sizes.
-        @return A matrix containing the sum of average IOPS.
-        '''
-        jobOut = '' #Fio job output
+        All combinations are run as sections of one fio job file. The IOPS
+        of every second of the combination used for steady state detection
+        are added to the steady state while it runs.
+        @param xs The rounds of the measurement window including this
+        round, if given the steady state is checked on the samples while
+        the combination runs and reaching it stops the combination.
+        @return [matrix containing the sum of average IOPS, IOPS samples
+        of the steady state combination, matrix containing the runtimes]
+        '''
+        stdyCell = (SsdIopsTest.mixWlds[-1],SsdIopsTest.stdyBs)
+        stdyState = self.getStdyState()
+        stdyState.startRound()
+        def onSample(iops):
+            stdyState.addSample(iops)
+            return xs != None and stdyState.checkRoundSamples(xs)
+        jobOuts = self.startRoundJob(SsdIopsTest.mixWlds,stdyCell,onSample)
+        samples = stdyState.getSamples()[-1]
+        logging.info("# IOPS samples of steady state cell: " + str(samples))
         rndMatrix = []
+        rtMatrix = []
         for i in SsdIopsTest.mixWlds:
             rwRow = []
+            rtRow = []
             for j in self.getBsLabels():
-                self.getFioJob().addKVArg("rwmixread",str(i))
-                self.getFioJob().addKVArg("bs",j)
-                call,jobOut = self.getFioJob().start()
-                if call == False:
-                    exit(1)
+                jobOut = jobOuts.pop(0)
                 logging.info("mixLoad: " +str(i))
                 logging.info("bs: "+j)
                 logging.info(jobOut)
                 logging.info("######")
-                rwRow.append(self.getFioJob().getIOPS(jobOut))
+                rwRow.append(jobOut.getIOPS())
+                rtRow.append(jobOut.getRuntime() / 1000.0)
             rndMatrix.append(rwRow)
-        return rndMatrix
+            rtMatrix.append(rtRow)
+        return [rndMatrix,samples,rtMatrix]
 
     def runRounds(self):
         '''
@@ -204,49 +658,79 @@ class SsdIopsTest(DeviceTest):
         rndMatrix = []
         steadyValues = deque([])#List of 4k random writes IOPS
         xranges = deque([])#Rounds of current measurement window
+        #every second of the steady state combination gives a sample
+        rndSamples = 0
+        if self.getFioJob().getOutputFormat().startswith('json'):
+            rndSamples = 60
+            if self.getOptions() != None and self.getOptions().getRuntime() != None:
+                rndSamples = self.getOptions().getRuntime()
+            if self.isAdaptive():
+                rndSamples = self.getOptions().getMaxRuntime()
+        self.getStdyState().setLooks(self.getRndLimit(StdyState.testRnds),rndSamples)
         
-        for i in range(StdyState.testRnds):
+        for i in range(self.getRndLimit(StdyState.testRnds)):
             logging.info("#################")
             logging.info("Round nr. "+str(i))
-            rndMatrix = self.testRound()
+            data = self.resumeRound(i)
+            if data == None:
+                window = None
+                if i >= self.getStdyState().getMinRnds() - 1:
+                    window = (list(xranges) + [i])[-5:]
+                data = self.testRound(window)
+                self.checkpointRound(data,i)
+            else:
+                self.getStdyState().addSamples(data[1])
+            rndMatrix,samples,rtMatrix = data
             self.getRndMatrices().append(rndMatrix)
-            # Use the last row and its next to last value
+            self.getRtMatrices().append(rtMatrix)
+            # Use the last row and the 4k column
             #-> 0/100% r/w and 4k for steady state detection
-            steadyValues.append(rndMatrix[-1][-2])
+            steadyValues.append(rndMatrix[-1][self.getBsLabels().index(SsdIopsTest.stdyBs)])
             xranges.append(i)
             if i > 4:
                 xranges.popleft()
                 steadyValues.popleft()
             #check if the steady state has been reached in the last 5 rounds
-            if i >= 4:
+            if i >= self.getStdyState().getMinRnds() - 1:
                 steadyState = self.getStdyState().checkSteadyState(xranges,steadyValues,i)
                 if steadyState == True:
                     break
         #Return current steady state
         return self.getStdyState().isSteady()
 
+    def isShareable(self):
+        '''
+        The device is in the steady state of random mixed workloads if the
+        test has reached it in this run.
+        '''
+        return self.hasLeftState() and self.getStdyState().isSteady()
+
     def run(self):
         '''
         Start the rounds, log the steady state infos.
         @return True if all tests were run
         '''
-        try: 
-            self.getDevice().secureErase()
-        except RuntimeError:
-            logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
-            raise
-        try:
-            if self.getOptions() == None:
-                self.getDevice().precondition(1,1)
-            else:
-                if self.getOptions().getNj() != None:
-                    nj = self.getOptions().getNj()
-                if self.getOptions().getIod() != None:
-                    iod = self.getOptions().getIod()
-                self.getDevice().precondition(nj,iod)
-        except RuntimeError:
-            logging.error("# Could not carry out preconditioning for "+self.getDevice().getDevPath())
-            raise
+        #a shared device state has been prepared by the previous test, cf. Scheduler
+        if not self.isPrepared():
+            if self.getSharedFrom() == None:
+                try: 
+                    self.eraseDevice()
+                except RuntimeError:
+                    logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
+                    raise
+                try:
+                    if self.getOptions() == None:
+                        self.preconditionDevice(1,1)
+                    else:
+                        if self.getOptions().getNj() != None:
+                            nj = self.getOptions().getNj()
+                        if self.getOptions().getIod() != None:
+                            iod = self.getOptions().getIod()
+                        self.preconditionDevice(nj,iod)
+                except RuntimeError:
+                    logging.error("# Could not carry out preconditioning for "+self.getDevice().getDevPath())
+                    raise
+            self.setPrepared()
         logging.info("########### Starting IOPS Test ###########")
         steadyState = self.runRounds()
         if steadyState == False:
@@ -265,10 +749,10 @@ class SsdIopsTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
-        e.text = data
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
+        self.appendMatrix(r,'rtmat',self.getRtMatrices())
         self.getStdyState().appendXml(r)
+        self.appendPreparation(r)
         return r
 
     def fromXml(self,root):
@@ -277,23 +761,30 @@ class SsdIopsTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading IOPS test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
+        #Runtimes are not available in xml files of older versions
+        self.deferMatrix(root,'rtmat')
+        self.__rtMatrices = None
         self.__stdyState.fromXml(root)
+        self.loadPreparation(root)
         #If the current device is 4K native, remove 512 from performance test block sizes
         if self.getDevice().getLogicalSectorSize() == 4096:
             logging.info("# Removing 512 from block sizes as device has 4096 logical sector size")
             self.prepareBsLabels(None, "512")
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for IOPS. '''
         import plots.genPlots as pgp
-        pgp.stdyStConvPlt(self,"IOPS")
-        pgp.stdyStVerPlt(self,"IOPS")
-        pgp.mes2DPlt(self,"IOPS")
-        pgp.mes3DPlt(self,"IOPS")
+        pgp.stdyStConvPlt(self,"IOPS",jobs)
+        pgp.stdyStVerPlt(self,"IOPS",jobs)
+        pgp.mes2DPlt(self,"IOPS",jobs)
+        pgp.mes3DPlt(self,"IOPS",jobs)
 
 class SsdLatencyTest(DeviceTest):
     '''
@@ -301,6 +792,12 @@ class SsdLatencyTest(DeviceTest):
     '''
     ##Percentages of mixed workloads.
     mixWlds = [100,65,0]
+    ##Block size of the dependent variable of the steady state.
+    stdyBs = "4k"
+    ##Completion latency percentiles recorded for every workload and block size.
+    percentiles = [50,90,99,99.9,99.99]
+    ##Percentile used for the measurement tables and plots.
+    reportPct = 99.9
 
     def __init__(self,testname,device,options=None):
         '''
@@ -316,13 +813,24 @@ class SsdLatencyTest(DeviceTest):
                 wsoptions.setRuntime(options.getRuntime())
             if options.getXargs() != None:
                 wsoptions.setXargs(options.getXargs())
+            # Keep the adaptive runtime parameters
+            wsoptions.setTargetCI(options.getTargetCI())
+            wsoptions.setMinRuntime(options.getMinRuntime())
+            wsoptions.setMaxRuntime(options.getMaxRuntime())
         super(SsdLatencyTest,self).__init__(testname,device,wsoptions)
         ## Labels of block sizes to run tests with
         self.__bsLabels = ["8k","4k","512"]
         ## A list of matrices with the collected fio measurement values of each round.
         self.__roundMatrices = []
+        ## A list of matrices with [read,write] clat percentiles of each round.
+        self.__pctMatrices = []
+        ## A list of matrices with [read,write] clat histograms of each round.
+        self.__histMatrices = []
+        ## A list of matrices with the runtime in seconds of every combination of each round.
+        self.__rtMatrices = []
         self.__stdyState = StdyState()
         self.getFioJob().addKVArg("rw","randrw")
+        self.getFioJob().addKVArg("percentile_list",':'.join(str(p) for p in SsdLatencyTest.percentiles))
 
     def prepareBsLabels(self, bsToAdd, bsToRemove):
         '''
@@ -335,7 +843,22 @@ class SsdLatencyTest(DeviceTest):
             if bsToRemove in self.getBsLabels():
                 self.getBsLabels().remove(bsToRemove)
 
-    def getRndMatrices(self): return self.__roundMatrices
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
+    def getPctMatrices(self):
+        if self.__pctMatrices is None:
+            self.__pctMatrices = self.loadDeferred('pctmat',[])
+        return self.__pctMatrices
+    def getHistMatrices(self):
+        if self.__histMatrices is None:
+            self.__histMatrices = decodeHistMatrices(self.loadDeferred('histmat',[]))
+        return self.__histMatrices
+    def getRtMatrices(self):
+        if self.__rtMatrices is None:
+            self.__rtMatrices = self.loadDeferred('rtmat',[])
+        return self.__rtMatrices
     def getStdyState(self): return self.__stdyState
     def getBsLabels(self): return self.__bsLabels
 
@@ -345,45 +868,105 @@ class SsdLatencyTest(DeviceTest):
         has been reached.
         '''
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
+        logging.info("Percentile matrices: ")
+        logging.info(self.getPctMatrices())
+        logging.info("Runtime matrices: ")
+        logging.info(self.getRtMatrices())
         self.getStdyState().toLog()
 
+    @staticmethod
+    def calcMixLats(jobOut):
+        '''
+        Calculate the [min,max,mean] latencies of a possibly mixed workload.
+        The mean is weighted by the number of read and write IOs.
+        @param jobOut The FioResult of a workload.
+        @return [min,max,mean] latencies in microseconds.
+        '''
+        lats = []
+        weights = []
+        if jobOut.getIOPSRead() > 0:
+            lats.append(jobOut.getReadLats())
+            weights.append(jobOut.getIOPSRead())
+        if jobOut.getIOPSWrite() > 0:
+            lats.append(jobOut.getWriteLats())
+            weights.append(jobOut.getIOPSWrite())
+        if len(lats) == 0:
+            return jobOut.getTotLats()
+        mean = sum(l[2] * w for l,w in zip(lats,weights)) / sum(weights)
+        return [min(l[0] for l in lats),max(l[1] for l in lats),mean]
+
+    def getWindowHistograms(self):
+        '''
+        Merge the clat histograms of the rounds in the steady state
+        measurement window.
+        @return A matrix with [read,write] merged LatHistogram objects per
+        workload and block size, None if histograms are not available.
+        '''
+        mesWin = self.getStdyState().getStdyRnds()
+        if len(self.getHistMatrices()) == 0 or len(mesWin) == 0:
+            return None
+        merged = []
+        for i in range(len(SsdLatencyTest.mixWlds)):
+            row = []
+            for j in range(len(self.getBsLabels())):
+                cell = []
+                for d in range(2):
+                    h = mergeHistograms([self.getHistMatrices()[r][i][j][d] for r in mesWin])
+                    if h == None:
+                        return None
+                    cell.append(h)
+                row.append(cell)
+            merged.append(row)
+        return merged
+
+    @staticmethod
+    def getPctList(pcts):
+        '''
+        Order a dictionary of percentiles by the recorded percentiles.
+        @param pcts Dictionary {percentile: latency} from a FioResult.
+        @return List of latencies for SsdLatencyTest.percentiles, 0 if missing.
+        '''
+        return [pcts.get(float(p),0) for p in SsdLatencyTest.percentiles]
+
     def testRound(self):
         '''
         Carry out one latency test round.
         The round consists of two inner loops: one iterating over the
         percentage of random reads/writes in the mixed workload, the other
         over different block sizes.
-        @return A matrix containing [min,max,mean] latencies of the round.
+        All combinations are run as sections of one fio job file.
+        @return [matrix containing [min,max,mean] latencies of the round,
+        matrix containing [read,write] clat percentiles of the round,
+        matrix containing [read,write] clat histograms of the round,
+        matrix containing the runtimes of the round]
         '''
-        jobOut = ''
-        rndMatrix = []        
+        jobOuts = self.startRoundJob(SsdLatencyTest.mixWlds)
+        rndMatrix = []
+        pctMatrix = []
+        histMatrix = []
+        rtMatrix = []
         for i in SsdLatencyTest.mixWlds:
             rwRow = []
+            pctRow = []
+            histRow = []
+            rtRow = []
             for j in self.getBsLabels():
-                self.getFioJob().addKVArg("rwmixread",str(i))
-                self.getFioJob().addKVArg("bs",j)
-                call,jobOut = self.getFioJob().start()
-                if call == False:
-                    exit(1)
+                jobOut = jobOuts.pop(0)
                 logging.info("mixLoad: " +str(i))
                 logging.info("bs: "+j)
                 logging.info(jobOut)
                 logging.info("######")
-                if i == 65:
-                    #if we have a mixed workload weight the latencies
-                    l = [0,0,0]
-                    r = self.getFioJob().getReadLats(jobOut)
-                    w = self.getFioJob().getWriteLats(jobOut)
-                    #FIXME Is this also correct for Min and Max?
-                    l[0] = (0.65 * r[0]) + (0.35 * w[0])
-                    l[1] = (0.65 * r[1]) + (0.35 * w[1])
-                    l[2] = (0.65 * r[2]) + (0.35 * w[2])
-                else:
-                    l = self.getFioJob().getTotLats(jobOut)
-                rwRow.append(l)
+                rwRow.append(SsdLatencyTest.calcMixLats(jobOut))
+                pctRow.append([SsdLatencyTest.getPctList(jobOut.getReadPercentiles()),
+                               SsdLatencyTest.getPctList(jobOut.getWritePercentiles())])
+                histRow.append([jobOut.getReadHistogram(),jobOut.getWriteHistogram()])
+                rtRow.append(jobOut.getRuntime() / 1000.0)
             rndMatrix.append(rwRow)
-        return rndMatrix
+            pctMatrix.append(pctRow)
+            histMatrix.append(histRow)
+            rtMatrix.append(rtRow)
+        return [rndMatrix,pctMatrix,histMatrix,rtMatrix]
 
     def runRounds(self):
         '''
@@ -396,21 +979,31 @@ class SsdLatencyTest(DeviceTest):
         rndMatrix = []
         steadyValues = deque([])
         xranges = deque([])#Rounds of current measurement window
+        self.getStdyState().setLooks(self.getRndLimit(StdyState.testRnds),0)
         
-        for i in range(StdyState.testRnds):
+        for i in range(self.getRndLimit(StdyState.testRnds)):
             logging.info("#################")
             logging.info("Round nr. "+str(i))
-            rndMatrix = self.testRound()
+            data = self.resumeRound(i)
+            if data == None:
+                rndMatrix,pctMatrix,histMatrix,rtMatrix = self.testRound()
+                self.checkpointRound([rndMatrix,pctMatrix,encodeHistMatrices(histMatrix),rtMatrix],i)
+            else:
+                rndMatrix,pctMatrix,histMatrix,rtMatrix = data
+                histMatrix = decodeHistMatrices(histMatrix)
             self.getRndMatrices().append(rndMatrix)
+            self.getRtMatrices().append(rtMatrix)
+            self.getPctMatrices().append(pctMatrix)
+            self.getHistMatrices().append(histMatrix)
             #Latencies always consist of [min,max,mean] latency
             #Take mean/average for steady state detection
-            steadyValues.append(rndMatrix[-1][-2][2])
+            steadyValues.append(rndMatrix[-1][self.getBsLabels().index(SsdLatencyTest.stdyBs)][2])
             xranges.append(i)
             if i > 4:
                 xranges.popleft()
                 steadyValues.popleft()
             #check if the steady state has been reached in the last 5 rounds
-            if i >= 4:
+            if i >= self.getStdyState().getMinRnds() - 1:
                 steadyState = self.getStdyState().checkSteadyState(xranges,steadyValues,i)
                 if steadyState == True:
                     break
@@ -422,23 +1015,27 @@ class SsdLatencyTest(DeviceTest):
         Start the rounds, log the steady state infos.
         @return True if all tests were run
         '''
-        try: 
-            self.getDevice().secureErase()
-        except RuntimeError:
-            logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
-            raise
-        try:
-            if self.__userOptions == None:
-                self.getDevice().precondition(1,1)
-            else:
-                if self.__userOptions.getNj() != None:
-                    nj = self.__userOptions.getNj()
-                if self.__userOptions.getIod() != None:
-                    iod = self.__userOptions.getIod()
-                self.getDevice().precondition(nj,iod)
-        except RuntimeError:
-            logging.error("# Could not carry out preconditioning for "+self.getDevice().getDevPath())
-            raise
+        #a shared device state has been prepared by the previous test, cf. Scheduler
+        if not self.isPrepared():
+            if self.getSharedFrom() == None:
+                try: 
+                    self.eraseDevice()
+                except RuntimeError:
+                    logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
+                    raise
+                try:
+                    if self.__userOptions == None:
+                        self.preconditionDevice(1,1)
+                    else:
+                        if self.__userOptions.getNj() != None:
+                            nj = self.__userOptions.getNj()
+                        if self.__userOptions.getIod() != None:
+                            iod = self.__userOptions.getIod()
+                        self.preconditionDevice(nj,iod)
+                except RuntimeError:
+                    logging.error("# Could not carry out preconditioning for "+self.getDevice().getDevPath())
+                    raise
+            self.setPrepared()
         logging.info("########### Starting Latency Test ###########")
         steadyState = self.runRounds()
         if steadyState == False:
@@ -457,10 +1054,15 @@ class SsdLatencyTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
+        data = json.dumps(SsdLatencyTest.percentiles)
+        e = etree.SubElement(r,'percentiles')
         e.text = data
+        self.appendMatrix(r,'pctmat',self.getPctMatrices())
+        self.appendHistMatrix(r,'histmat',self.getHistMatrices())
+        self.appendMatrix(r,'rtmat',self.getRtMatrices())
         self.getStdyState().appendXml(r)
+        self.appendPreparation(r)
         return r
 
     def fromXml(self,root):
@@ -469,29 +1071,45 @@ class SsdLatencyTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading latency test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
+        #Percentiles are not available in xml files of older versions
+        self.deferMatrix(root,'pctmat')
+        self.__pctMatrices = None
+        self.deferMatrix(root,'histmat')
+        self.__histMatrices = None
+        self.deferMatrix(root,'rtmat')
+        self.__rtMatrices = None
         self.__stdyState.fromXml(root)
+        self.loadPreparation(root)
         #If the current device is 4K native, remove 512 from performance test block sizes
         if self.getDevice().getLogicalSectorSize() == 4096:
             logging.info("# Removing 512 from block sizes as device has 4096 logical sector size")
             self.prepareBsLabels(None, "512")
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for latency. '''
         import plots.genPlots as pgp
-        pgp.stdyStConvPlt(self,"LAT")
-        pgp.stdyStVerPlt(self,"LAT")
-        pgp.mes2DPlt(self,"avg-LAT")
-        pgp.mes2DPlt(self,"max-LAT")
-        pgp.latMes3DPlt(self)
+        pgp.stdyStConvPlt(self,"LAT",jobs)
+        pgp.stdyStVerPlt(self,"LAT",jobs)
+        pgp.mes2DPlt(self,"avg-LAT",jobs)
+        pgp.mes2DPlt(self,"max-LAT",jobs)
+        if len(self.getPctMatrices()) != 0:
+            pgp.calcMsmtTable(self,"p" + str(SsdLatencyTest.reportPct) + "-LAT")
+        pgp.latMes3DPlt(self,jobs)
 
 class SsdTPTest(DeviceTest):
     '''
     A class to carry out the Throughput test.
     '''
+    ##Block size of the dependent variable of the steady state.
+    stdyBs = "1024k"
+
     def __init__(self,testname,device,options):
         '''
         Constructor.
@@ -514,7 +1132,10 @@ class SsdTPTest(DeviceTest):
             if bsToRemove in self.getBsLabels():
                 self.getBsLabels().remove(bsToRemove)
 
-    def getRndMatrices(self): return self.__roundMatrices
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
     def getStdyState(self): return self.__stdyState
     def getBsLabels(self): return self.__bsLabels
 
@@ -524,7 +1145,7 @@ class SsdTPTest(DeviceTest):
         has been reached.
         '''
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
         self.getStdyState().toLog()
 
     def testRound(self,bs):
@@ -535,7 +1156,7 @@ class SsdTPTest(DeviceTest):
         @return Read and Write bandwidths [tpRead,tpWrite]
         '''
         self.getFioJob().addKVArg("bs",bs)
-        jobOut = ''
+        jobOut = None
         tpRead = 0 #read bandwidth
         tpWrite = 0#write bandwidth
 
@@ -547,7 +1168,7 @@ class SsdTPTest(DeviceTest):
         logging.info("Read TP test:")
         logging.info(jobOut)
         logging.info("######")
-        tpRead = self.getFioJob().getTPRead(jobOut)
+        tpRead = jobOut.getTPRead()
         
         #start write tests
         self.getFioJob().addKVArg("rw","write")
@@ -557,7 +1178,7 @@ class SsdTPTest(DeviceTest):
         logging.info("Write TP test:")
         logging.info(jobOut)
         logging.info("######")
-        tpWrite = self.getFioJob().getTPWrite(jobOut)
+        tpWrite = jobOut.getTPWrite()
         return [tpRead,tpWrite]
     
     def runRounds(self):
@@ -567,24 +1188,31 @@ class SsdTPTest(DeviceTest):
         '''
         stdyValsWrite = deque([])#List of 1M sequential write IOPS
         xrangesWrite = deque([])#Rounds of current measurement window
+        self.getStdyState().setLooks(self.getRndLimit(StdyState.testRnds),0)
         
         #rounds are the same for IOPS and throughput
         for j in self.getBsLabels():
-            try: 
-                self.getDevice().secureErase()
-            except RuntimeError:
-                logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
-                raise
+            #a resumed block size has already been erased
+            if self.resumeRound(j,0) == None:
+                try: 
+                    self.eraseDevice()
+                except RuntimeError:
+                    logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
+                    raise
 
             tpRead_l = []
             tpWrite_l = []
             logging.info("#################")
             logging.info("Current block size. "+str(j))
             
-            for i in range(StdyState.testRnds):
+            for i in range(self.getRndLimit(StdyState.testRnds)):
                 logging.info("######")
                 logging.info("Round nr. "+str(i))
-                tpRead,tpWrite = self.testRound(j)
+                data = self.resumeRound(j,i)
+                if data == None:
+                    data = self.testRound(j)
+                    self.checkpointRound(data,j,i)
+                tpRead,tpWrite = data
                 tpRead_l.append(tpRead)
                 tpWrite_l.append(tpWrite)
                 
@@ -596,24 +1224,24 @@ class SsdTPTest(DeviceTest):
                     break
                 
                 # Use 1M block sizes sequential write for steady state detection
-                if j == "1024k":
+                if j == SsdTPTest.stdyBs:
                     stdyValsWrite.append(tpWrite)
                     xrangesWrite.append(i)
                     if i > 4:
                         xrangesWrite.popleft()
                         stdyValsWrite.popleft()
                         #check if the steady state has been reached in the last 5 rounds
-                    if i >= 4:
+                    if i >= self.getStdyState().getMinRnds() - 1:
                         steadyState = self.getStdyState().checkSteadyState(xrangesWrite,stdyValsWrite,i)
                         #reached a steady state
                         if steadyState == True:
                             logging.info("Reached steady state at round %d",i)
                         #running from 0 to 24
-                        if i == ((StdyState.testRnds) - 1):
+                        if i == (self.getRndLimit(StdyState.testRnds) - 1):
                             self.getStdyState().setReachStdyState(False)
                             logging.warn("#Did not reach steady state for bs %s",j)
                         #In both cases we are done with steady state checking
-                        if steadyState == True or i == ((StdyState.testRnds) - 1):
+                        if steadyState == True or i == (self.getRndLimit(StdyState.testRnds) - 1):
                             self.getRndMatrices().append([tpRead_l,tpWrite_l])
                             #Done with 1M block size
                             break
@@ -625,6 +1253,9 @@ class SsdTPTest(DeviceTest):
         Start the rounds, log the steady state infos.
         @return True if all tests were run
         '''
+        #the device is erased for every block size, cf. runRounds
+        if not self.isPrepared():
+            self.setPrepared()
         logging.info("########### Starting Throughput Test ###########")
         steadyState = self.runRounds()
         if steadyState == False:
@@ -643,10 +1274,9 @@ class SsdTPTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
-        e.text = data
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
         self.getStdyState().appendXml(r)
+        self.appendPreparation(r)
         return r
 
     def fromXml(self,root):
@@ -655,27 +1285,34 @@ class SsdTPTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading TP test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
         self.__stdyState.fromXml(root)
+        self.loadPreparation(root)
         #If the current device is 4K native, remove 512 from performance test block sizes
         if self.getDevice().getLogicalSectorSize() == 4096:
             logging.info("# Removing 512 from block sizes as device has 4096 logical sector size")
             self.prepareBsLabels(None, "512")
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for throughput. '''
         import plots.genPlots as pgp
-        pgp.tpRWStdyStConvPlt(self)
-        pgp.stdyStVerPlt(self,"TP")
-        pgp.tpMes2DPlt(self)
+        pgp.tpRWStdyStConvPlt(self,jobs)
+        pgp.stdyStVerPlt(self,"TP",jobs)
+        pgp.tpMes2DPlt(self,jobs)
 
 class SsdWriteSatTest(DeviceTest):
     '''
     A class to carry out the Write Saturation test.
     '''
+    ## Maximum number of rounds, with the default runtime of 1 minute 24h
+    maxRnds = 60*24
+
     def __init__(self,testname,device,options=None):
         '''
         Constructor.
@@ -683,8 +1320,12 @@ class SsdWriteSatTest(DeviceTest):
         super(SsdWriteSatTest,self).__init__(testname,device,options)
         ## Number of rounds until write saturation test ended
         self.__rounds = 0
+        ## True if 4 times the device size has been written
+        self.__saturated = False
         ## Write saturation results: [iops_l,lats_l]
         self.__roundMatrices = []
+        ## Write clat histograms of each round
+        self.__histograms = []
         self.getFioJob().addKVArg("rw","randwrite")
         self.getFioJob().addKVArg("bs","4k")   
 
@@ -696,7 +1337,23 @@ class SsdWriteSatTest(DeviceTest):
         pass
 
     def getRnds(self): return self.__rounds
-    def getRndMatrices(self): return self.__roundMatrices
+    def isSaturated(self): return self.__saturated
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
+    def getHistograms(self):
+        if self.__histograms is None:
+            self.__histograms = decodeHistMatrices(self.loadDeferred('hists',[]))
+        return self.__histograms
+
+    def getWindowHistogram(self):
+        '''
+        Merge the write clat histograms of the last rounds. The window has
+        the same size as the steady state measurement window of other tests.
+        @return The merged LatHistogram, None if histograms are not available.
+        '''
+        return mergeHistograms(self.getHistograms()[-(StdyState.testMesWindow + 1):])
 
     def toLog(self):
         '''
@@ -705,28 +1362,28 @@ class SsdWriteSatTest(DeviceTest):
         logging.info("Write Sat rounds: ")
         logging.info(self.__rounds)
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
 
     def testRound(self):
         '''
         Carry out one test round of the write saturation test.
         The round consists of random writing with 4k bs for one minute
-        @return [TotWriteIO,IOPS,[min,max,mean lats]]
+        @return [TotWriteIO,IOPS,[min,max,mean lats],write clat histogram]
         '''
         (call,jobOut) = self.getFioJob().start()
         if call == False:
             exit(1)
         
-        writeIO = self.getFioJob().getTotIOWrite(jobOut)
-        iops = self.getFioJob().getIOPS(jobOut)
-        lats = self.getFioJob().getWriteLats(jobOut)
+        writeIO = jobOut.getTotIOWrite()
+        iops = jobOut.getIOPS()
+        lats = jobOut.getWriteLats()
         
         logging.info(jobOut)
         logging.info("#IOPS: " + str(iops))
         logging.info("#Tot Write IO: " + str(writeIO))
         logging.info("#Latencies: " + str(lats))
         logging.info("######")
-        return [writeIO,iops,lats]
+        return [writeIO,iops,lats,jobOut.getWriteHistogram()]
     
     def runRounds(self):
         '''
@@ -736,7 +1393,7 @@ class SsdWriteSatTest(DeviceTest):
         logging.info("#Device size in Byte: " + str(devSzB))
         totWriteIO = 0 #total written IO in KB, must be greater than 4xDevice 
         #carry out the test for a maximum of 24h, one round runs for 1 minute
-        maxRounds = 60*24
+        maxRounds = self.getRndLimit(SsdWriteSatTest.maxRnds)
         writeIO = 0
         iops_l = [] #overall list of iops
         iops = 0 #IOPS per round
@@ -749,9 +1406,16 @@ class SsdWriteSatTest(DeviceTest):
         for i in range(maxRounds):
             logging.info("#################")
             logging.info("Round nr. "+str(i))
-            writeIO,iops,lats = self.testRound()
+            data = self.resumeRound(i)
+            if data == None:
+                writeIO,iops,lats,hist = self.testRound()
+                self.checkpointRound([writeIO,iops,lats,encodeHistMatrices(hist)],i)
+            else:
+                writeIO,iops,lats,hist = data
+                hist = decodeHistMatrices(hist)
             iops_l.append(iops)
             lats_l.append(lats)
+            self.getHistograms().append(hist)
             totWriteIO += writeIO
             if i == 0:
                 logging.info("#If write IO stays steady, it will take "
@@ -759,21 +1423,31 @@ class SsdWriteSatTest(DeviceTest):
             #Check if 4 times the device size has been reached
             if (totWriteIO * 1024) >= (devSzB * 4):
                 self.__rounds = i
+                self.__saturated = True
                 break
-        self.__roundMatrices.append(iops_l)
-        self.__roundMatrices.append(lats_l)
+        self.getRndMatrices().append(iops_l)
+        self.getRndMatrices().append(lats_l)
         logging.info("#Write saturation has written " + str(totWriteIO) + "KB")
 
+    def isShareable(self):
+        '''
+        The device is saturated with random writes if the test has written
+        4 times the device size in this run.
+        '''
+        return self.hasLeftState() and self.__saturated
+
     def run(self):
         '''
         Start the rounds, log number of rounds until 4 times device size was written.
         @return True if all tests were run
         '''
-        try: 
-            self.getDevice().secureErase()
-        except RuntimeError:
-            logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
-            raise
+        if not self.isPrepared():
+            try: 
+                self.eraseDevice()
+            except RuntimeError:
+                logging.error("# Could not carry out secure erase for "+self.getDevice().getDevPath())
+                raise
+            self.setPrepared()
         logging.info("########### Starting Write Saturation Test ###########")
         self.runRounds()
         self.toLog()
@@ -791,12 +1465,12 @@ class SsdWriteSatTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
-        e.text = data
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
         data = json.dumps(self.__rounds)
         e = etree.SubElement(r,'rndnr')
         e.text = data
+        self.appendHistMatrix(r,'hists',self.getHistograms())
+        self.appendPreparation(r)
         return r
 
     def fromXml(self,root):
@@ -805,17 +1479,23 @@ class SsdWriteSatTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading write saturation test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
         self.__rounds = json.loads(root.findtext('rndnr'))
+        self.deferMatrix(root,'hists')
+        self.__histograms = None
+        self.loadPreparation(root)
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for write saturation. '''
         import plots.genPlots as pgp
-        pgp.writeSatIOPSPlt(self)
-        pgp.writeSatLatPlt(self)
+        pgp.writeSatIOPSPlt(self,jobs)
+        pgp.writeSatLatPlt(self,jobs)
 
 class HddIopsTest(DeviceTest):
     '''
@@ -847,7 +1527,10 @@ class HddIopsTest(DeviceTest):
             if bsToRemove in self.getBsLabels():
                 self.getBsLabels().remove(bsToRemove)
 
-    def getRndMatrices(self): return self.__roundMatrices
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
     def getBsLabels(self): return self.__bsLabels
 
     def toLog(self):
@@ -857,7 +1540,7 @@ class HddIopsTest(DeviceTest):
         logging.info("IOPS rounds: ")
         logging.info(HddIopsTest.maxRnds)
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
 
     def toXml(self,root):
         '''
@@ -871,9 +1554,7 @@ class HddIopsTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
-        e.text = data
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
         data = json.dumps(HddIopsTest.maxRnds)
         e = etree.SubElement(r,'rndnr')
         e.text = data
@@ -885,10 +1566,13 @@ class HddIopsTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading IOPS test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
     def testRound(self,offset,size):
         '''
@@ -903,7 +1587,7 @@ class HddIopsTest(DeviceTest):
         self.getFioJob().addKVArg("size", str(size))
         #Iterate over mixed rand read and write and vary block size
         #save the output of fio for parsing and retreiving IOPS
-        jobOut = ''
+        jobOut = None
         rndMatrix = []
         for i in HddIopsTest.mixWlds:
             rwRow = []
@@ -917,7 +1601,7 @@ class HddIopsTest(DeviceTest):
                 logging.info("bs: "+j)
                 logging.info(jobOut)
                 logging.info("######")
-                rwRow.append(self.getFioJob().getIOPS(jobOut))
+                rwRow.append(jobOut.getIOPS())
             rndMatrix.append(rwRow)
         return rndMatrix
 
@@ -942,7 +1626,10 @@ class HddIopsTest(DeviceTest):
             logging.info("Round nr. "+str(i))
             logging.info("Offset "+str(offset))
             #we read and write increment starting at the offset
-            rndMatrix = self.testRound(offset,increment)
+            rndMatrix = self.resumeRound(i)
+            if rndMatrix == None:
+                rndMatrix = self.testRound(offset,increment)
+                self.checkpointRound(rndMatrix,i)
             self.getRndMatrices().append(rndMatrix)
             offset += increment
         return
@@ -952,15 +1639,18 @@ class HddIopsTest(DeviceTest):
         Start the rounds of the HDD IOPS test.
         @return True if all tests were run
         '''
+        #nothing to prepare, only record the options
+        if not self.isPrepared():
+            self.setPrepared()
         logging.info("########### Starting HDD IOPS Test ###########")
         self.runRounds()
         self.toLog()
         return True
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for IOPS. '''
         import plots.genPlots as pgp
-        pgp.IOPSplot(self)
+        pgp.IOPSplot(self,jobs)
 
 class HddTPTest(DeviceTest):
     '''
@@ -990,7 +1680,10 @@ class HddTPTest(DeviceTest):
             if bsToRemove in self.getBsLabels():
                 self.getBsLabels().remove(bsToRemove)
 
-    def getRndMatrices(self): return self.__roundMatrices
+    def getRndMatrices(self):
+        if self.__roundMatrices is None:
+            self.__roundMatrices = self.loadDeferred('roundmat',[])
+        return self.__roundMatrices
     def getBsLabels(self): return self.__bsLabels
 
     def toLog(self):
@@ -1000,7 +1693,7 @@ class HddTPTest(DeviceTest):
         logging.info("TP rounds: ")
         logging.info(HddTPTest.maxRnds)
         logging.info("Round matrices: ")
-        logging.info(self.__roundMatrices)
+        logging.info(self.getRndMatrices())
 
     def toXml(self,root):
         '''
@@ -1014,9 +1707,7 @@ class HddTPTest(DeviceTest):
         self.getFioJob().appendXml(r)
         # Add the options to xml
         self.getOptions().appendXml(r)
-        data = json.dumps(self.__roundMatrices)
-        e = etree.SubElement(r,'roundmat')
-        e.text = data
+        self.appendMatrix(r,'roundmat',self.getRndMatrices())
         return r
 
     def fromXml(self,root):
@@ -1025,10 +1716,13 @@ class HddTPTest(DeviceTest):
         @param root Name of root element from which to load values
         '''
         logging.info("########### Loading TP test from "+self.getTestname()+".xml ###########")
-        self.__roundMatrices = json.loads(root.findtext('roundmat'))
+        self.deferMatrix(root,'roundmat')
+        self.__roundMatrices = None
         self.getFioJob().fromXml(root)
         self.getOptions().fromXml(root)
-        self.toLog()
+        #logging the results loads all matrices, only do this for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.toLog()
 
     def testRound(self,bs,offset,size):
         '''
@@ -1042,7 +1736,7 @@ class HddTPTest(DeviceTest):
         self.getFioJob().addKVArg("offset", str(offset))
         self.getFioJob().addKVArg("size", str(size))
         self.getFioJob().addKVArg("bs",bs)
-        jobOut = ''
+        jobOut = None
         tpRead = 0 #read bandwidth
         tpWrite = 0#write bandwidth
 
@@ -1054,7 +1748,7 @@ class HddTPTest(DeviceTest):
         logging.info("Read TP test:")
         logging.info(jobOut)
         logging.info("######")
-        tpRead = self.getFioJob().getTPRead(jobOut)
+        tpRead = jobOut.getTPRead()
     
         #start write tests
         self.getFioJob().addKVArg("rw","write")
@@ -1064,7 +1758,7 @@ class HddTPTest(DeviceTest):
         logging.info("Write TP test:")
         logging.info(jobOut)
         logging.info("######")
-        tpWrite = self.getFioJob().getTPWrite(jobOut)
+        tpWrite = jobOut.getTPWrite()
         return [tpRead,tpWrite]
 
     def runRounds(self):
@@ -1096,7 +1790,11 @@ class HddTPTest(DeviceTest):
                 logging.info("Round nr. "+str(i))
                 logging.info("Offset "+str(offset))
                 #we read and write increment starting at the offset
-                tpRead,tpWrite = self.testRound(j,offset,increment)
+                data = self.resumeRound(j,i)
+                if data == None:
+                    data = self.testRound(j,offset,increment)
+                    self.checkpointRound(data,j,i)
+                tpRead,tpWrite = data
                 tpRead_l.append(tpRead)
                 tpWrite_l.append(tpWrite)
                 offset += increment
@@ -1108,13 +1806,16 @@ class HddTPTest(DeviceTest):
         Start the rounds of the HDD TP test.
         @return True if all tests were run
         '''
+        #nothing to prepare, only record the options
+        if not self.isPrepared():
+            self.setPrepared()
         logging.info("########### Starting HDD TP Test ###########")
         self.runRounds()
         self.toLog()
         return True
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         ''' Generate plots for TP. '''
         import plots.genPlots as pgp
-        pgp.TPplot(self)
-        pgp.TPBoxPlot(self)
+        pgp.TPplot(self,jobs)
+        pgp.TPBoxPlot(self,jobs)
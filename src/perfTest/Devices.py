@@ -9,18 +9,32 @@ import logging
 import subprocess
 import json
 import re
+import time
 from lxml import etree
-from time import sleep
 
 from fio.FioJob import FioJob
 from system.OS import Storcli
 from system.OS import Mdadm
+from system.OpEngine import OpEngine
+from system.Erase import EraseRegistry
+from system.Probe import DeviceProbe
+from system.ProbeCache import ProbeCache
+from system.Readiness import Readiness
 
 
 class Device(object, metaclass=ABCMeta):
     '''
     Representing the tested device.
     '''
+    ## Patterns to read the identity of a device from its device info, the
+    ## first matching pattern is used. The info is written by hdparm,
+    ## udevadm, sginfo or nvme id-ctrl.
+    identityPatterns = {'model':[r'^\s*Model Number:\s*(.+)$',r'^\s*ID_MODEL=(.+)$',
+                                 r'^\s*Product:\s*(.+)$',r'^\s*mn\s*:\s*(.+)$'],
+                        'serial':[r'^\s*Serial Number:\s*(.+)$',r'^\s*ID_SERIAL_SHORT=(.+)$',
+                                  r'^\s*ID_SERIAL=(.+)$',r'^\s*sn\s*:\s*(.+)$'],
+                        'firmware':[r'^\s*Firmware Revision:\s*(.+)$',r'^\s*Revision Level:\s*(.+)$',
+                                    r'^\s*fr\s*:\s*(.+)$']}
 
     def __init__(self, devtype, path, devname, vendor=None, intfce=None):
         '''
@@ -57,6 +71,10 @@ class Device(object, metaclass=ABCMeta):
         self.__devismounted = None
         ## Check if a valid partition is used
         self.__devisavailable = None
+        ## The method, start and duration of the last erase, None if not erased
+        self.__lastErase = None
+        ## The mode and the bandwidth of every round of the last preconditioning
+        self.__lastPrecondition = None
 
     def getDevType(self): return self.__devtype
     def getDevPath(self): return self.__path
@@ -69,6 +87,8 @@ class Device(object, metaclass=ABCMeta):
     def getFeatureMatrix(self): return self.__featureMatrix
     def getPhysicalSectorSize(self): return self.__devphysectorsizeb
     def getLogicalSectorSize(self): return self.__devlogsectorsizeb
+    def getLastErase(self): return self.__lastErase
+    def getLastPrecondition(self): return self.__lastPrecondition
 
     def setDevInfo(self,dInfo):
         self.__devinfo = dInfo
@@ -88,6 +108,10 @@ class Device(object, metaclass=ABCMeta):
         self.__devphysectorsizeb = psize
     def setLogicalSectorSize(self,lsize):
         self.__devlogsectorsizeb = lsize
+    def setLastErase(self,erase):
+        self.__lastErase = erase
+    def setLastPrecondition(self,prec):
+        self.__lastPrecondition = prec
 
     def initialize(self):
         '''
@@ -115,136 +139,98 @@ class Device(object, metaclass=ABCMeta):
         else:
             return False
 
+    def getIdentity(self):
+        '''
+        Get the model, serial number and firmware of the device from the
+        device info, e.g. to compare results of the same model.
+        @return A dictionary with the keys model, serial and firmware, a
+        value is None if it is not in the device info.
+        '''
+        identity = {}
+        for key,patterns in Device.identityPatterns.items():
+            identity[key] = None
+            for pattern in patterns:
+                match = None
+                if self.__devinfo != None:
+                    match = re.search(pattern,self.__devinfo,re.MULTILINE)
+                if match != None:
+                    identity[key] = match.group(1).strip()
+                    break
+        return identity
+
     def isMounted(self): return self.__devismounted
     def isAvailable(self): return self.__devisavailable
 
     def calcDevSizeKB(self):
         '''
         Get the device size in KByte.
-        The function calls 'blockdev' to determine device sector size
-        and sector count.
+        The size and the logical sector size are read with ioctls or from
+        sysfs, see DeviceProbe.
         @return Size on success
-        @exception RuntimeError if blockdev fails
+        @exception RuntimeError if the size cannot be read
         '''
-        out = subprocess.Popen(['blockdev','--getss',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("blockdev --getss encountered an error: " + stderr)
-            raise RuntimeError("blockdev error")
-        else:
-            sectorSize = int(stdout)
-            out = subprocess.Popen(['blockdev','--getsz',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-            (stdout,stderr) = out.communicate()
-            if stderr != '':
-                logging.error("blockdev --getsz encountered an error: " + stderr)
-                raise RuntimeError("blockdev error")
-            else:
-                sectorCount = int(stdout)
-                if ((sectorCount * sectorSize) % 1024) != 0:
-                        logging.error("blockdev sector count cannot be divided by 1024")
-                        raise RuntimeError("blockdev error")
-                devSzKB = (sectorCount * sectorSize) / 1024
-                logging.info("#Device" + self.__path + " sector count: " + str(sectorCount))
-                logging.info("#Device" + self.__path + " sector size: " + str(sectorSize))
-                logging.info("#Device" + self.__path + " size in KB: " + str(devSzKB))
-                return devSzKB
+        probe = DeviceProbe.get(self.__path)
+        sectorSize = probe.getLogicalSectorSizeB()
+        byteSize = probe.getSizeB()
+        sectorCount = byteSize // sectorSize
+        if (byteSize % 1024) != 0:
+                logging.error("device size cannot be divided by 1024")
+                raise RuntimeError("device size error")
+        devSzKB = byteSize / 1024
+        logging.info("#Device" + self.__path + " sector count: " + str(sectorCount))
+        logging.info("#Device" + self.__path + " sector size: " + str(sectorSize))
+        logging.info("#Device" + self.__path + " size in KB: " + str(devSzKB))
+        return devSzKB
 
     def calcDevSizeB(self):
         '''
         Get the device size in Byte.
-        The function calls 'blockdev' to determine device sector size
-        and sector count.
+        The size is read with the BLKGETSIZE64 ioctl or from sysfs.
         @return Size on success
-        @exception RuntimeError if blockdev fails
+        @exception RuntimeError if the size cannot be read or is 0
         '''
-        out = subprocess.Popen(['blockdev','--getsize64',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("blockdev --getsize64 encountered an error: " + stderr)
-            raise RuntimeError("blockdev error")
-        else:
-            byteSize = int(stdout)
-            if byteSize == 0:
-                logging.error("blockdev --getsize64 returned zero.")
-                raise RuntimeError("blockdev error")
-            return byteSize
+        return DeviceProbe.get(self.__path).getSizeB()
 
     def calcDevPhysicalSectorSizeB(self):
         '''
         Get the physical sector size in Bytes.
-        The function calls 'blockdev' to determine the pyhsical sector size
+        The size is read with the BLKPBSZGET ioctl or from sysfs.
         @return Size on success
-        @exception RuntimeError if blockdev fails or size is 0
+        @exception RuntimeError if the size cannot be read or is 0
         '''
-        out = subprocess.Popen(['blockdev','--getpbsz',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("blockdev --getpbsz encountered an error: " + stderr)
-            raise RuntimeError("blockdev error")
-        else:
-            phySectorSize = int(stdout)
-            if phySectorSize == 0:
-                logging.error("blockdev --getpbsz returned zero.")
-                raise RuntimeError("blockdev error")
-            logging.info("#Device" + self.__path + " physical sector size: " + str(phySectorSize))
-            return phySectorSize
+        phySectorSize = DeviceProbe.get(self.__path).getPhysicalSectorSizeB()
+        logging.info("#Device" + self.__path + " physical sector size: " + str(phySectorSize))
+        return phySectorSize
 
     def calcDevLogicalSectorSizeB(self):
         '''
         Get the logical sector size in Bytes.
-        The function calls 'blockdev' to determine the logical sector size
+        The size is read with the BLKSSZGET ioctl or from sysfs.
         @return Size on success
-        @exception RuntimeError if blockdev fails or size is 0
+        @exception RuntimeError if the size cannot be read or is 0
         '''
-        out = subprocess.Popen(['blockdev','--getss',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("blockdev --getss encountered an error: " + stderr)
-            raise RuntimeError("blockdev error")
-        else:
-            logSectorSize = int(stdout)
-            if logSectorSize == 0:
-                logging.error("blockdev --getss returned zero.")
-                raise RuntimeError("blockdev error")
-            logging.info("#Device" + self.__path + " logical sector size: " + str(logSectorSize))
-            return logSectorSize
+        logSectorSize = DeviceProbe.get(self.__path).getLogicalSectorSizeB()
+        logging.info("#Device" + self.__path + " logical sector size: " + str(logSectorSize))
+        return logSectorSize
 
     def checkDevIsMounted(self):
         '''
         Check if the given device is mounted. As we work as
         super user it is slightly dangerous to overwrite
-        a mounted partition.
+        a mounted partition. The device and its partitions are
+        looked up in /proc/self/mountinfo.
         @return True if device is mounted, False if not
-        @exception RuntimeError if mount command fails
+        @exception RuntimeError if the mount information cannot be read
         '''
-        out = subprocess.Popen(['mount','-l'],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("mount -l encountered an error: " + stderr)
-            raise RuntimeError("mount command error")
-        else:
-            for line in stdout.split('\n'):
-                if line.find(self.__path) > -1:
-                    logging.info("#"+line)
-                    return True
-            return False
+        return DeviceProbe.get(self.__path).isMounted()
 
     def checkDevIsAvbl(self):
         '''
         Check if the given device is a valid partition.
         @return True if yes, False if not.
+        @exception RuntimeError if /proc/partitions cannot be read
         '''
-        out = subprocess.Popen(['cat','/proc/partitions'],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("cat /proc/partitions encountered an error: " + stderr)
-            raise RuntimeError("cat /proc/partitions command error")
-        else:
-            for line in stdout.split('\n'):
-                if line.find(self.__path[5:]) > -1:
-                    logging.info("#"+line)
-                    return True
-            return False
+        return DeviceProbe.get(self.__path).isAvailable()
 
     def readDevInfoFile(self,fd):
         '''
@@ -276,32 +262,17 @@ class Device(object, metaclass=ABCMeta):
 
     def devInfoHdparm(self):
         logging.info("# Trying to get device info with hdparm")
-        out = subprocess.Popen(['hdparm','-I',self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("hdparm -I encountered an error: " + stderr)
+        try:
+            probe = ProbeCache.getHdparm(self.__path)
+        except RuntimeError:
+            logging.error("Please use a description file to set device information!")
+            return False
+        if not probe['valid']:
+            logging.error("hdparm sense data may be incorrect!")
             logging.error("Please use a description file to set device information!")
             return False
         else:
-            self.__devinfo = ""
-            for line in stdout.split('\n'):
-                if line.find("questionable sense data") > -1 or line.find("bad/missing sense data") > -1:
-                    logging.error("hdparm sense data may be incorrect!")
-                    logging.error("Please use a description file to set device information!")
-                    return False
-                if self.hasNonASCII(line): continue
-                if line.find("Model Number") > -1:
-                    self.__devinfo += line + '\n'
-                if line.find("Serial Number") > -1:
-                    self.__devinfo += line +'\n'
-                if line.find("Firmware Revision") > -1:
-                    self.__devinfo += line + '\n'
-                if line.find("Media Serial Num") > -1:
-                    self.__devinfo += line + '\n'
-                if line.find("Media Manufacturer") > -1:
-                    self.__devinfo += line + '\n'
-                if line.find("device size with M = 1000*1000") > -1:
-                    self.__devinfo += line + '\n'
+            self.__devinfo = probe['info']
             #Check for write caching state
             stdout = ''
             stderr = ''
@@ -335,13 +306,10 @@ class Device(object, metaclass=ABCMeta):
                     self.__devinfo += line + '\n'
                 if line.find("ID_SERIAL") > -1:
                     self.__devinfo += line + '\n'
-            out = subprocess.Popen(['blockdev', '--getsize64' ,self.__path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-            (stdout,stderr) = out.communicate()
-            if out.returncode != 0:
-                logging.error("blockdev --getsize64 encountered an error: " + stderr)
+            try:
+                self.__devinfo += "Device Size (bytes): " + str(DeviceProbe.get(self.__path).getSizeB()) + '\n'
+            except RuntimeError:
                 return False
-            else:
-                self.__devinfo += "Device Size (bytes): " + stdout
             return True
 
     def hasNonASCII(self, line):
@@ -363,9 +331,9 @@ class Device(object, metaclass=ABCMeta):
             return True
         # If no interface is specified or compactflash/sdcard is used, try to call hdparm
         if self.getIntfce() == None or self.getIntfce() == 'compactflash' or self.getIntfce() == 'sdcard':
-            # If hdparm has bad data, try to use udevadm and blockdev
+            # If hdparm has bad data, try to use udevadm and sysfs
             if not self.devInfoHdparm():
-                # If udevadm or blockdev returns an error users have to use a dsc file
+                # If udevadm or sysfs returns an error users have to use a dsc file
                 if not self.devInfoUdevadm():
                     logging.error("# Error: hdparm and udevadm encountered errors.")
                     logging.error("Please use a description file to set device information!")
@@ -423,7 +391,7 @@ class Device(object, metaclass=ABCMeta):
                         self.__devinfo += line + '\n'
                     if line.find("tnvmcap") > -1:
                         self.__devinfo += line + '\n'
-        # For usb devices use udevadm and blockdev
+        # For usb devices use udevadm and sysfs
         elif self.getIntfce() == 'usb':
             if not self.devInfoUdevadm():
                 return False
@@ -478,6 +446,19 @@ class SSD(Device):
     '''
     ## Number of rounds to carry out workload independent preconditioning.
     wlIndPrecRnds = 2
+    ## Seconds between two progress reports of fio while preconditioning.
+    precStatusInterval = 10
+    ## Preconditioning modes, job: every fio job writes the whole device,
+    ## region: every fio job writes its own region of the device.
+    precModes = ['job','region']
+    ## The preconditioning mode.
+    precMode = 'job'
+    ## Seconds every IO depth is tried in region mode, 0 to not tune the IO depth.
+    precTuneSec = 5
+    ## Maximum IO depth tried in region mode.
+    precMaxIod = 256
+    ## Minimum relative bandwidth gain to try the next IO depth.
+    precTuneGain = 0.05
 
     def readDevInfo(self):
         super(SSD, self).readDevInfo()
@@ -485,155 +466,127 @@ class SSD(Device):
     def secureEraseSupported(self):
         '''
         Checks if hdparm returns the string "supported: enhanced erase". This
-        indicates that the device supports an ATA secure erase.
+        indicates that the device supports an ATA secure erase. The capability
+        is taken from the probe cache if the device is already known.
         @return True if supported, False if not
         '''
         logging.info("# Checking for Enhanced Secure Erase with hdparm")
-        command = 'hdparm -I ' + self.getDevPath() + ' | grep -q "supported: enhanced erase"'
-        logging.info("# Running command: " + command)
-        rc = None
         try:
-            rc = subprocess.check_call(command, shell=True)
-        except:
+            supported = ProbeCache.getHdparm(self.getDevPath())['erase']['enhanced']
+        except RuntimeError:
+            supported = False
+        if not supported:
             logging.warn("# Enhanced Secure Erase NOT supported by device " + self.getDevPath())
             return False
-        if rc == 0:
-            logging.info("# Enhanced Secure Erase supported by device " + self.getDevPath())
-            return True
+        logging.info("# Enhanced Secure Erase supported by device " + self.getDevPath())
+        return True
 
     def secureEraseHdparm(self):
         '''
         Runs an enhanced erase (secure erase) if supported by hdparm. If the device
-        is frozen or locked tries to resolve this states.
+        is frozen or locked tries to resolve this states. The security state is
+        taken from the probe cache if hdparm has already read it in this run.
         @return True if secure erase was carried out
         '''
-        frozen = True #as default we assume that the device is frozen, locked and secured
-        locked = True
-        secured = True
+        #grab the state for frozen, locked and secured, as default we assume
+        #that the device is frozen, locked and secured
+        security = ProbeCache.getHdparm(self.getDevPath(),current=True)['security']
+        frozen = security['frozen'] != False
+        locked = security['locked'] != False
+        secured = security['enabled'] != False
         securitySet = False
-        #start hdparm to grab the state for frozen, locked and secured
-        out = subprocess.Popen(['hdparm','-I',self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout,stderr) = out.communicate()
-        if stderr != '':
-            logging.error("hdparm -I encountered an error: " + stderr)
-            raise RuntimeError("hdparm command error")
-        else:
-            skipSetSecurity = False
-            for line in stdout.split('\n'):
-                if line.find("frozen") > -1:
-                    if line.find("not") > -1:
-                        frozen = False
-                        logging.info("# Not in frozen state")
-                if line.find("locked") > -1:
-                    if line.find("not") > -1:
-                        locked = False
-                        logging.info("# Not in locked state")
-                if line.find("enabled") > -1:
-                    if line.find("not") > -1:
-                        secured = False
-                        logging.info("# Security not enabled")
-            if frozen or locked or secured:
-                if frozen:
-                    logging.error("# Device still in frozen state")
-                    raise RuntimeError("frozen state error (for details see log)")
-                if locked:
-                    logging.error("# Device still in locked state, therefore skipping the password set step")
-                    #try a secure erase with password "pwd", if this is OK return OK, if this fails raise a RunTimeError
-                    #all this is controlled by setting skipSetSecurity to True
-                    skipSetSecurity = True
-                if secured:
-                    logging.error("# Device security already set, therefore skipping the password set step")
-                    skipSetSecurity = True
-            if not frozen:
-                #the frozen state can only be cured by a power cycle and this is not feasible only by software, so we need to check for "not frozen" here
-                if not skipSetSecurity:
-                    #the secured state (or locked) was not detected in previous steps so we start to set the security password here
-                    out = subprocess.Popen(['hdparm', '--user-master','u',
-                                            '--security-set-pass','pwd',self.getDevPath()],
-                                            stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                    stdout,stderr = out.communicate()
-                    if out.returncode != 0:
-                        logging.error("# Error: command 'hdparm --user-master u --security-set-pass pwd returned an error code.")
-                        logging.error(stderr)
-                        raise RuntimeError("hdparm command error on setting the security")
-                #at this point the password is set, either by the above command or it has been left over from a previous run
-                #the next step is to check with hdparm if this states that the master password has been set successfully
-                out = subprocess.Popen(['hdparm','-I',self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                (stdout,stderr) = out.communicate()
-                if stderr != '':
-                    logging.error("hdparm -I encountered an error: " + stderr)
+        skipSetSecurity = False
+        if not frozen:
+            logging.info("# Not in frozen state")
+        if not locked:
+            logging.info("# Not in locked state")
+        if not secured:
+            logging.info("# Security not enabled")
+        if frozen or locked or secured:
+            if frozen:
+                logging.error("# Device still in frozen state")
+                raise RuntimeError("frozen state error (for details see log)")
+            if locked:
+                logging.error("# Device still in locked state, therefore skipping the password set step")
+                #try a secure erase with password "pwd", if this is OK return OK, if this fails raise a RunTimeError
+                #all this is controlled by setting skipSetSecurity to True
+                skipSetSecurity = True
+            if secured:
+                logging.error("# Device security already set, therefore skipping the password set step")
+                skipSetSecurity = True
+        if not frozen:
+            #the frozen state can only be cured by a power cycle and this is not feasible only by software, so we need to check for "not frozen" here
+            if not skipSetSecurity:
+                #the secured state (or locked) was not detected in previous steps so we start to set the security password here
+                out = subprocess.Popen(['hdparm', '--user-master','u',
+                                        '--security-set-pass','pwd',self.getDevPath()],
+                                        stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                stdout,stderr = out.communicate()
+                if out.returncode != 0:
+                    logging.error("# Error: command 'hdparm --user-master u --security-set-pass pwd returned an error code.")
+                    logging.error(stderr)
+                    raise RuntimeError("hdparm command error on setting the security")
+            #at this point the password is set, either by the above command or it has been left over from a previous run
+            #the next step is to check with hdparm if this states that the master password has been set successfully
+            security = ProbeCache.getHdparm(self.getDevPath(),refresh=True)['security']
+            logging.info("hdparm -I ran successfully, now checking if it states that the password has been set or not")
+            if security['masterPassword']:
+                logging.info("'Master password' found in hdparm output")
+                if security['enabled'] == True:
+                    securitySet = True
+                    logging.info("# Successfully enabled security for hdparm")
+                else:
+                    logging.info("# Security NOT enabled for hdparm")
+                    raise RuntimeError("hdparm command error")
+            else:
+                logging.info("'Master password' has not been found in hdparm output, continuing anyway (as it is assumed that it is set nethertheless)")
+                securitySet = True
+            if securitySet:
+                logging.info("Security flag is set")
+                #Note that is doesn't seem to be advised to use blkdiscard instead of hdparm's secure erase here
+                #(as suggested in https://github.com/thomas-krenn/TKperf/issues/3). blkdiscard always throw errors
+                #in our setup when e.g. called manually from the command line.
+                logging.info("Starting secure erase via hdparm")
+                out = subprocess.Popen(['hdparm', '--user-master','u',
+                                        '--security-erase','pwd',self.getDevPath()],
+                                        stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                stdout,stderr = out.communicate()
+                logging.info("Secure erase done, checking its output")
+                if out.returncode != 0:
+                    logging.error("# Error: command 'hdparm --user-master u --security-erase pwd returned an error code.")
+                    logging.error(stderr)
                     raise RuntimeError("hdparm command error")
                 else:
-                    logging.info("hdparm -I ran successfully, now checking if it states that the password has been set or not")
-                    lines = stdout.split('\n')
-                    masterPasswordFound = False
-                    for i,line in enumerate(lines):
-                        if line.find("Master password") > -1:
-                            masterPasswordFound = True
-                            logging.info("'Master password' found in hdparm output")
-                            if lines[i+2].find("not") == -1 and lines[i+2].find("enabled") > -1:
-                                securitySet = True
-                                logging.info("# Successfully enabled security for hdparm")
-                                break
-                            else:
-                                logging.info("# Security NOT enabled for hdparm")
-                                raise RuntimeError("hdparm command error")
-                    if not masterPasswordFound:
-                        logging.info("'Master password' has not been found in hdparm output, continuing anyway (as it is assumed that it is set nethertheless)")
-                        securitySet = True
-                    if securitySet:
-                        logging.info("Security flag is set")
-                        #Note that is doesn't seem to be advised to use blkdiscard instead of hdparm's secure erase here
-                        #(as suggested in https://github.com/thomas-krenn/TKperf/issues/3). blkdiscard always throw errors
-                        #in our setup when e.g. called manually from the command line.
-                        logging.info("Starting secure erase via hdparm")
-                        out = subprocess.Popen(['hdparm', '--user-master','u',
-                                                '--security-erase','pwd',self.getDevPath()],
-                                                stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                        stdout,stderr = out.communicate()
-                        logging.info("Secure erase done, checking its output")
-                        if out.returncode != 0:
-                            logging.error("# Error: command 'hdparm --user-master u --security-erase pwd returned an error code.")
-                            logging.error(stderr)
-                            raise RuntimeError("hdparm command error")
+                    logging.info("# Successfully carried out secure erase for "+self.getDevPath())
+                    #Check if security is diasbled again, the state is kept for the next erase
+                    security = ProbeCache.getHdparm(self.getDevPath(),refresh=True)['security']
+                    if security['masterPassword']:
+                        logging.info("'Master password' found in post secure erase check")
+                        if security['enabled'] == False:
+                            securitySet = False
+                            logging.info("# Successfully deactivated security for hdparm.")
+                            return True
                         else:
-                            logging.info("# Successfully carried out secure erase for "+self.getDevPath())
-                            #Check if security is diasbled again by parsing the hdparm output
-                            out = subprocess.Popen(['hdparm','-I',self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                            (stdout,stderr) = out.communicate()
-                            if stderr != '':
-                                logging.error("hdparm -I encountered an error: " + stderr)
+                            #Try to disable security manually
+                            logging.info("# Security still enabled for hdparm, therefore calling disable.")
+                            out = subprocess.Popen(['hdparm', '--user-master','u',
+                                '--security-disable','pwd',self.getDevPath()],
+                                stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                            stdout,stderr = out.communicate()
+                            #the cached state still shows the enabled security
+                            ProbeCache.expire(self.getDevPath())
+                            if out.returncode != 0:
+                                logging.error("# Error: command 'hdparm --user-master u --security-disable pwd returned an error code.")
+                                logging.error(stderr)
                                 raise RuntimeError("hdparm command error")
                             else:
-                                lines = stdout.split('\n')
-                                masterPasswordFound = False
-                                for i,line in enumerate(lines):
-                                    if line.find("Master password") > -1:
-                                        masterPasswordFound = True
-                                        logging.info("'Master password' found in post secure erase check")
-                                        if lines[i+2].find("not") > -1 and lines[i+2].find("enabled") > -1:
-                                            securitySet = False
-                                            logging.info("# Successfully deactivated security for hdparm.")
-                                            return True
-                                        else:
-                                            #Try to disable security manually
-                                            logging.info("# Security still enabled for hdparm, therefore calling disable.")
-                                            out = subprocess.Popen(['hdparm', '--user-master','u',
-                                                '--security-disable','pwd',self.getDevPath()],
-                                                stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                                            stdout,stderr = out.communicate()
-                                            if out.returncode != 0:
-                                                logging.error("# Error: command 'hdparm --user-master u --security-disable pwd returned an error code.")
-                                                logging.error(stderr)
-                                                raise RuntimeError("hdparm command error")
-                                            else:
-                                                logging.info("# Successfully deactivated security for hdparm.")
-                                                return True
-                                if not masterPasswordFound:
-                                    logging.info("'Master password' has not been found in hdparm output of post secure erase check")
-                                logging.info("Finished post secure erase 'Master password' check")
+                                logging.info("# Successfully deactivated security for hdparm.")
+                                return True
                     else:
-                        logging.warn("Security flag is NOT set, therefore NO SECURE ERASE has been carried out!!!!!!!!!!!!!!!!!!!!!!")
+                        logging.info("'Master password' has not been found in hdparm output of post secure erase check")
+                    logging.info("Finished post secure erase 'Master password' check")
+            else:
+                logging.warn("Security flag is NOT set, therefore NO SECURE ERASE has been carried out!!!!!!!!!!!!!!!!!!!!!!")
 
     def secureEraseBlkdiscard(self):
         '''
@@ -650,97 +603,134 @@ class SSD(Device):
             logging.info("# Discarded all blocks with blkdiscard: " + stdout)
             return True
 
-    def secureErase(self):
+    def secureEraseSgFormat(self):
         '''
-        Carries out a secure erase via hdparm (if supported), blkdiscard, fstrim,
-        sg_format, fio-sure-erase or nvme format for the given device.
-        sg_format is used only for SAS devices
-        fio-sure-erase is used for fusionio devices
-        nvme format is used for nvme devices
-        @return True if device is secure erased, False if not.
+        Runs a format of a SAS device via sg_format.
+        @return True if the device was formatted, False if not
         '''
-        logging.info("# Trying to run Secure Erase for device: " + self.getDevPath())
-        #before starting the erase sleep, to ensure previous device operations are finished
-        logging.info("# Sleeping for 10 seconds...")
-        sleep(10)
-        if self.getIntfce() == None or self.getIntfce() == 'compactflash' or self.getIntfce() == 'sdcard' or self.getIntfce() == 'usb':
-            if self.secureEraseSupported():
-                self.secureEraseHdparm()
-            elif self.secureEraseBlkdiscard():
-                logging.info("# Succesfully used blkdiscard as Secure Erase not supported by device: " + self.getDevPath())
-            else:
-                logging.warn("# Neither Secure Erase nor blkdiscard supported by device: " + self.getDevPath())
-                logging.warn("# Continuing tests without running Secure Erase/blkdiscard")
-        elif self.getIntfce() == 'sas':
-            logging.info("# Using sg_format as secure erase for SAS device.")
-            out = subprocess.Popen(['sg_format', '--format', self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-            (stdout,stderr) = out.communicate()
-            if out.returncode != 0:
-                logging.error("# Error: sg_format --format encountered an error: " + stderr)
-                return False
-            else:
-                logging.info("# sg_format: " + stdout)
-                return True
-        elif self.getIntfce() == 'nvme':
-            # Detect the correct lbaf of the nvme device and use it for the format command.
-            lbaf_opt = ''
-            logging.info('# Detect used nvme lbaf.')
-            out = subprocess.Popen(['nvme', 'id-ns', self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-            (stdout,stderr) = out.communicate()
-            if out.returncode != 0:
-                logging.error('# Error: nvme id-ns encountered an error: ' + stderr)
-                return False
-            output_line = list([_f for _f in stdout.split('\n') if _f])
-            for line in output_line:
-                if 'lbaf' in line and 'in use' in line:
-                    lbaf_opt = '-l={}'.format(line.split()[1])
-            logging.info("# Using nvme format as secure erase for NVME device.")
-            out = subprocess.Popen(['nvme', 'format', self.getDevPath(), '-s=1', lbaf_opt],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-            (stdout,stderr) = out.communicate()
-            if out.returncode != 0:
-                logging.error("# Error: nvme format encountered an error: " + stderr)
-                return False
-            else:
-                logging.info("# nvme format: " + stdout)
-                return True
-        elif self.getIntfce() == 'fusion':
-            logging.info("# Using fio-sure-erase as secure erase for fusionio device.")
-            # Mapping to real fusionio device
-            # Get the last char and map it to number
-            fusionNum = ord(self.getDevPath()[-1:]) - ord('a')
-            fusionPath = '/dev/fct' + str(fusionNum)
-            logging.info("# Matched " + self.getDevPath() + "to " + fusionPath)
-            logging.info("# Detaching " + fusionPath)
-            out = subprocess.Popen(['fio-detach', fusionPath],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        logging.info("# Using sg_format as secure erase for SAS device.")
+        out = subprocess.Popen(['sg_format', '--format', self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        (stdout,stderr) = out.communicate()
+        if out.returncode != 0:
+            logging.error("# Error: sg_format --format encountered an error: " + stderr)
+            return False
+        else:
+            logging.info("# sg_format: " + stdout)
+            return True
+
+    def secureEraseNvme(self):
+        '''
+        Runs a user data erase of a NVMe device via nvme format, the lba
+        format in use is kept.
+        @return True if the device was formatted, False if not
+        '''
+        # Detect the correct lbaf of the nvme device and use it for the format command.
+        lbaf_opt = ''
+        logging.info('# Detect used nvme lbaf.')
+        out = subprocess.Popen(['nvme', 'id-ns', self.getDevPath()],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        (stdout,stderr) = out.communicate()
+        if out.returncode != 0:
+            logging.error('# Error: nvme id-ns encountered an error: ' + stderr)
+            return False
+        output_line = list([_f for _f in stdout.split('\n') if _f])
+        for line in output_line:
+            if 'lbaf' in line and 'in use' in line:
+                lbaf_opt = '-l={}'.format(line.split()[1])
+        logging.info("# Using nvme format as secure erase for NVME device.")
+        out = subprocess.Popen(['nvme', 'format', self.getDevPath(), '-s=1', lbaf_opt],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        (stdout,stderr) = out.communicate()
+        if out.returncode != 0:
+            logging.error("# Error: nvme format encountered an error: " + stderr)
+            return False
+        else:
+            logging.info("# nvme format: " + stdout)
+            return True
+
+    def secureEraseFusion(self):
+        '''
+        Runs fio-sure-erase for a fusionio device, the device is detached
+        before and attached again after the erase.
+        @return True if the device was erased
+        @exception RuntimeError if a fusionio command fails
+        '''
+        logging.info("# Using fio-sure-erase as secure erase for fusionio device.")
+        # Mapping to real fusionio device
+        # Get the last char and map it to number
+        fusionNum = ord(self.getDevPath()[-1:]) - ord('a')
+        fusionPath = '/dev/fct' + str(fusionNum)
+        logging.info("# Matched " + self.getDevPath() + "to " + fusionPath)
+        logging.info("# Detaching " + fusionPath)
+        out = subprocess.Popen(['fio-detach', fusionPath],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        (stdout,stderr) = out.communicate()
+        if out.returncode != 0:
+            logging.error("# Error: command 'fio-detach' returned an error code.")
+            logging.error(stderr)
+            raise RuntimeError("fio-detach command error")
+        else:
+            logging.info("# Running fio-sure-erase for " + fusionPath)
+            out = subprocess.Popen(['fio-sure-erase', fusionPath, '-y'],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
             (stdout,stderr) = out.communicate()
             if out.returncode != 0:
-                logging.error("# Error: command 'fio-detach' returned an error code.")
+                logging.error("# Error: command 'fio-sure-erase' returned an error code.")
                 logging.error(stderr)
-                raise RuntimeError("fio-detach command error")
+                raise RuntimeError("fio-sure-erase command error")
             else:
-                logging.info("# Running fio-sure-erase for " + fusionPath)
-                out = subprocess.Popen(['fio-sure-erase', fusionPath, '-y'],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                logging.info("# fio-sure-erase: " + stdout)
+                logging.info("# Attaching " + fusionPath)
+                out = subprocess.Popen(['fio-attach', fusionPath],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
                 (stdout,stderr) = out.communicate()
                 if out.returncode != 0:
-                    logging.error("# Error: command 'fio-sure-erase' returned an error code.")
+                    logging.error("# Error: command 'fio-attach' returned an error code.")
                     logging.error(stderr)
-                    raise RuntimeError("fio-sure-erase command error")
+                    raise RuntimeError("fio-attach command error")
                 else:
-                    logging.info("# fio-sure-erase: " + stdout)
-                    logging.info("# Attaching " + fusionPath)
-                    out = subprocess.Popen(['fio-attach', fusionPath],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
-                    (stdout,stderr) = out.communicate()
-                    if out.returncode != 0:
-                        logging.error("# Error: command 'fio-attach' returned an error code.")
-                        logging.error(stderr)
-                        raise RuntimeError("fio-attach command error")
-                    else:
-                        return True
+                    return True
 
-    def precondition(self,nj=1,iod=1):
+    def secureErase(self):
+        '''
+        Carries out a secure erase with the erase method selected by the erase
+        policy, cf. EraseRegistry. The methods are hdparm enhanced erase,
+        blkdiscard, sg_format for SAS devices, nvme format for nvme devices and
+        fio-sure-erase for fusionio devices. If the selected method cannot
+        erase the device the next supported method is used. The used method
+        and the measured duration are kept as last erase of the device.
+        @return True if device is secure erased, False if not.
+        '''
+        logging.info("# Trying to run Secure Erase for device: " + self.getDevPath())
+        #before starting the erase wait until previous device operations are finished
+        if Readiness.waitIdle(self.getDevPath()) == False:
+            logging.warn("# Starting Secure Erase although device " + self.getDevPath() + " is not idle")
+        for backend in EraseRegistry.select(self):
+            expected = backend.getExpectedSec()
+            logging.info("# Using erase method " + backend.name + " for device: " + self.getDevPath())
+            start = time.time()
+            if not backend.erase():
+                logging.warn("# Erase method " + backend.name + " failed for device: " + self.getDevPath())
+                continue
+            duration = round(time.time() - start,1)
+            logging.info("# Erased device " + self.getDevPath() + " with " + backend.name + " in " +
+                         str(duration) + " seconds")
+            ProbeCache.setEraseSec(self.getDevPath(),backend.name,duration)
+            self.setLastErase({'method':backend.name,'fob':backend.fob,'policy':EraseRegistry.policy,
+                               'start':time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(start)),
+                               'expected':expected,'duration':duration})
+            return True
+        logging.warn("# No erase method succeeded for device: " + self.getDevPath())
+        logging.warn("# Continuing tests without running Secure Erase")
+        self.setLastErase({'method':None,'fob':False,'policy':EraseRegistry.policy,
+                           'start':time.strftime('%Y-%m-%d %H:%M:%S'),'expected':None,'duration':None})
+        return False
+
+    def precondition(self,nj=1,iod=1,progress=None):
         '''
         Workload independent preconditioning for SSDs.
-        Write two times the device with streaming I/O.
+        Write two times the device with streaming I/O. In job mode every
+        fio job writes the whole device, in region mode every job writes its
+        own region of the device and the IO depth is tuned before.
+        @param nj Number of fio jobs.
+        @param iod IO depth of every job.
+        @param progress A function called with the bytes written and the
+        total bytes to write, None to not report the progress.
         @return True if precontioning succeded
         @exception RuntimeError if fio command fails
         '''
@@ -750,25 +740,158 @@ class SSD(Device):
         job.addKVArg("bs","128k")
         job.addKVArg("rw","write")
         job.addKVArg("direct","1")
-        job.addSglArg("minimal")
         job.addKVArg("numjobs",str(nj))
         job.addKVArg("ioengine","libaio")
         job.addKVArg("iodepth",str(iod))
         job.addSglArg("group_reporting")
         job.addSglArg('refill_buffers')
 
+        tail = None
+        if SSD.precMode == 'region':
+            if self.getDevSizeB() == None:
+                self.setDevSizeB(self.calcDevSizeB())
+            regionB,tail = self.getPrecRegions(nj,128 * 1024)
+            job.addKVArg("size",str(regionB))
+            job.addKVArg("offset_increment",str(regionB))
+            iod = self.tunePrecIod(job,iod)
+            job.addKVArg("iodepth",str(iod))
+        #every job writes the whole device or its region
+        total = None
+        if self.getDevSizeB() != None:
+            total = self.getDevSizeB() * SSD.wlIndPrecRnds
+            if SSD.precMode == 'job':
+                total *= nj
+        done = 0
+        passes = []
         for i in range(SSD.wlIndPrecRnds):
             logging.info("# Starting preconditioning round "+str(i))
             job.addKVArg("name", self.getDevName() + '-run' + str(i))
-            call,out = job.start()
+            start = time.time()
+            if progress == None:
+                call,out = job.start()
+                results = [out]
+            else:
+                stream = job.startStream(SSD.precStatusInterval)
+                for results in stream:
+                    progress(done + SSD.getWrittenBytes(results),total)
+                call = stream.isOk() and len(stream.getResults()) > 0
+                out = stream.getResults()[0] if call else None
+                results = stream.getResults()
             if call == False:
                 logging.error("# Could not carry out workload independent preconditioning")
                 raise RuntimeError("precondition error, fio command error")
             else:
                 logging.info(out)
+            if tail != None:
+                results = results + [self.writePrecTail(tail,i)]
+            written = SSD.getWrittenBytes(results)
+            done += written
+            if progress != None:
+                progress(done,total)
+            sec = max(time.time() - start,1e-3)
+            passes.append({'round':i,'bytes':written,'sec':round(sec,1),'mbs':round(written / sec / 2**20,1)})
+            logging.info("# Preconditioning round " + str(i) + " wrote " + str(written // 2**20) + " MiB in " +
+                         str(int(sec)) + " seconds, " + str(passes[-1]['mbs']) + " MB/s")
+        self.setLastPrecondition({'mode':SSD.precMode,'nj':nj,'iod':iod,'rounds':passes})
         logging.info("# Finished workload independent preconditioning")
         return True
 
+    def getPrecRegions(self,nj,bs):
+        '''
+        Split the device into one region per fio job for preconditioning.
+        The regions are aligned to the block size, the remaining bytes at
+        the end of the device are the tail.
+        @param nj Number of fio jobs.
+        @param bs Block size in bytes.
+        @return [region size in bytes,[tail offset,tail size]], the tail is
+        None if the regions cover the whole device.
+        '''
+        regionB = self.getDevSizeB() // nj // bs * bs
+        if regionB == 0:
+            logging.error("# Device " + self.getDevPath() + " is too small for " + str(nj) + " regions")
+            raise RuntimeError("precondition error, device too small")
+        tailB = self.getDevSizeB() - nj * regionB
+        logging.info("# Preconditioning " + str(nj) + " regions of " + str(regionB) + " bytes, tail of " +
+                     str(tailB) + " bytes")
+        if tailB == 0:
+            return [regionB,None]
+        return [regionB,[nj * regionB,tailB]]
+
+    def writePrecTail(self,tail,rnd):
+        '''
+        Write the end of the device not covered by the preconditioning regions.
+        @param tail [offset,size] of the tail in bytes.
+        @param rnd The preconditioning round.
+        @return The FioResult of the tail.
+        @exception RuntimeError if fio command fails
+        '''
+        sector = self.getLogicalSectorSize()
+        if sector == None:
+            sector = DeviceProbe.get(self.getDevPath()).getLogicalSectorSizeB()
+        job = FioJob()
+        job.initialize()
+        job.addKVArg("filename",self.getDevPath())
+        job.addKVArg("name",self.getDevName() + '-tail' + str(rnd))
+        job.addKVArg("bs",str(sector))
+        job.addKVArg("rw","write")
+        job.addKVArg("direct","1")
+        job.addKVArg("ioengine","libaio")
+        job.addKVArg("iodepth","16")
+        job.addKVArg("offset",str(tail[0]))
+        job.addKVArg("size",str(tail[1]))
+        job.addSglArg('refill_buffers')
+        call,out = job.start()
+        if call == False:
+            logging.error("# Could not precondition the end of the device")
+            raise RuntimeError("precondition error, fio command error")
+        return out
+
+    def tunePrecIod(self,job,iod):
+        '''
+        Find the IO depth saturating the device for region preconditioning.
+        Starting at the given IO depth, the IO depth is doubled as long as the
+        sequential write bandwidth increases by precTuneGain. Every IO depth
+        writes precTuneSec seconds, the written data is overwritten by the
+        preconditioning.
+        @param job The fio job of the preconditioning.
+        @param iod The IO depth to start with.
+        @return The IO depth with the best bandwidth.
+        @exception RuntimeError if fio command fails
+        '''
+        if SSD.precTuneSec <= 0:
+            return iod
+        job.addKVArg("runtime",str(SSD.precTuneSec))
+        job.addSglArg("time_based")
+        best = [iod,None]
+        qd = iod
+        while qd <= max(SSD.precMaxIod,iod):
+            job.addKVArg("name",self.getDevName() + '-qd' + str(qd))
+            job.addKVArg("iodepth",str(qd))
+            call,out = job.start()
+            if call == False:
+                logging.error("# Could not tune the IO depth for preconditioning")
+                raise RuntimeError("precondition error, fio command error")
+            bw = out.getTPWrite()
+            logging.info("# Preconditioning with IO depth " + str(qd) + ": " + str(bw) + " KB/s")
+            #a higher IO depth without a relevant gain only adds latency
+            if best[1] != None and bw < best[1] * (1 + SSD.precTuneGain):
+                break
+            best = [qd,bw]
+            qd *= 2
+        job.removeKVArg("runtime")
+        job.getSglArgs().remove("time_based")
+        logging.info("# Using IO depth " + str(best[0]) + " for preconditioning")
+        return best[0]
+
+    @staticmethod
+    def getWrittenBytes(results):
+        '''
+        Get the bytes written by a fio run.
+        @param results A list of FioResult objects.
+        @return The written bytes, fio reports the IO in KiB.
+        '''
+        return sum(r.getTotIOWrite() for r in results) * 1024
+
 class HDD(Device):
     '''
     Representing a HDD.
@@ -800,9 +923,12 @@ class RAID(Device):
         self.__config = config
         ## The used RAID technology, linux sw RAID, lsi hw RAID
         self.__raidTec = None
+        ## Timings of the member devices of the last operations, operation: path: timing
+        self.__opTimings = {}
 
     def getType(self): return self.__type
     def getConfig(self): return self.__config
+    def getOpTimings(self): return self.__opTimings
     def setConfig(self,cfg):
         self.__config = cfg
 
@@ -818,6 +944,7 @@ class RAID(Device):
             # Create raid if it doesn't exist
             if not self.__raidTec.checkRaidPath():
                 self.__raidTec.createVD()
+                DeviceProbe.invalidate(self.getDevPath())
             self.setDevSizeB(self.calcDevSizeB())
             self.setDevSizeKB(self.calcDevSizeKB())
             self.setDevIsMounted(self.checkDevIsMounted())
@@ -874,29 +1001,32 @@ class RAID(Device):
         if self.__raidTec.checkRaidPath() == True:
             logging.info("# Found raid device "+self.getDevPath()+", deleting it!")
             self.__raidTec.deleteVD()
-        # Create the raid device
+        # Create the raid device, the probed size may have changed
         self.__raidTec.createVD()
-        while not self.__raidTec.isReady():
-            sleep(30)
+        DeviceProbe.invalidate(self.getDevPath())
+        # Wait until the initial sync of the raid has finished
+        if self.getType() == 'sw_mdadm':
+            ready = Readiness.waitRaidSync(self.getDevPath())
+        else:
+            ready = Readiness.waitFor(self.__raidTec.isReady)
+        if ready == False:
+            logging.warn("# Raid device " + self.getDevPath() + " is not ready, results may be affected by its initialization")
 
     def secureErase(self):
         '''
-        Carries out the secure erase for a RAID device.
+        Carries out the secure erase for a RAID device. The members of a
+        software RAID are erased concurrently.
         '''
         if self.getType() == 'sw_mdadm':
-            import multiprocessing
-            m = multiprocessing.Manager()
-            exc = m.Queue()
-            ps = []
-            for d in self.__raidTec.getDevices():
-                p = multiprocessing.Process(target=self.operator,args=(d,'erase',None, None, exc))
-                ps.append(p)
-                p.start()
-            for p in ps:
-                p.join()
-            if exc.empty():
-                pass
-            else:
+            engine = OpEngine('erase',self.__raidTec.getDevices(),self.operator('erase'))
+            start = time.time()
+            ok = engine.run()
+            self.__opTimings['erase'] = engine.getTimings()
+            members = dict((p,t['duration']) for p,t in engine.getTimings().items())
+            self.setLastErase({'method':'members','fob':None,'policy':EraseRegistry.policy,
+                               'start':time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(start)),
+                               'expected':None,'duration':round(time.time() - start,1),'members':members})
+            if not ok:
                 logging.error("# Error: Could not secure erase " + self.getDevPath())
                 raise RuntimeError("secure erase error")
         if self.getType() == 'hw_lsi':
@@ -908,22 +1038,14 @@ class RAID(Device):
 
     def precondition(self,nj=1,iod=1):
         '''
-        Carries out the preconditioning for a RAID device.
+        Carries out the preconditioning for a RAID device. The members of a
+        software RAID are preconditioned concurrently.
         '''
         if self.getType() == 'sw_mdadm':
-            import multiprocessing
-            m = multiprocessing.Manager()
-            exc = m.Queue()
-            ps = []
-            for d in self.__raidTec.getDevices():
-                p = multiprocessing.Process(target=self.operator,args=(d,'condition',nj, iod, exc))
-                ps.append(p)
-                p.start()
-            for p in ps:
-                p.join()
-            if exc.empty():
-                pass
-            else:
+            engine = OpEngine('precondition',self.__raidTec.getDevices(),self.operator('condition',nj,iod))
+            ok = engine.run()
+            self.__opTimings['precondition'] = engine.getTimings()
+            if not ok:
                 logging.error("# Error: Could not precondition " + self.getDevPath())
                 raise RuntimeError("precondition error")
         if self.getType() == 'hw_lsi':
@@ -933,13 +1055,20 @@ class RAID(Device):
         logging.info("# Creating raid device "+self.getDevPath()+" after workload independet preconditioning!")
         self.createRaid()
 
-    def operator(self, path, op, nj, iod, exc):
-        try:
+    def operator(self, op, nj=1, iod=1):
+        '''
+        Get the function carrying out an operation on a member device.
+        @param op The operation (erase|condition).
+        @param nj Number of fio jobs for preconditioning.
+        @param iod IO depth for preconditioning.
+        @return A function taking the member path and a progress function.
+        '''
+        def run(path, progress):
             tmpSSD = SSD('ssd', path, self.getDevName())
             tmpSSD.setInterface(self.getIntfce())
             if op == 'erase':
                 tmpSSD.secureErase()
             if op == 'condition':
-                tmpSSD.precondition(nj, iod)
-        except RuntimeError:
-            exc.put('Error')
+                tmpSSD.setDevSizeB(tmpSSD.calcDevSizeB())
+                tmpSSD.precondition(nj, iod, progress)
+        return run
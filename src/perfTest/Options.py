@@ -28,15 +28,37 @@ class Options(object):
         self.__runtime = runtime
         ## Further single arguments as list for fio.
         self.__xargs = xargs
+        ## Relative confidence interval the IOPS of a combination must reach
+        ## in adaptive runtime mode, None if the runtime is fixed.
+        self.__targetCI = None
+        ## Minimum runtime of a combination in adaptive runtime mode.
+        self.__minRuntime = 10
+        ## Maximum runtime of a combination in adaptive runtime mode,
+        ## None to use the runtime.
+        self.__maxRuntime = None
 
     def getNj(self): return self.__nj
     def getIod(self): return self.__iod
     def getRuntime(self): return self.__runtime
     def getXargs(self): return self.__xargs
+    def getTargetCI(self): return self.__targetCI
+    def getMinRuntime(self): return self.__minRuntime
+    def getMaxRuntime(self):
+        ''' @return The maximum runtime in adaptive mode, defaults to the runtime. '''
+        if self.__maxRuntime == None:
+            return self.__runtime
+        return self.__maxRuntime
     def setNj(self,nj): self.__nj = nj
     def setIod(self,iod): self.__iod = iod
     def setRuntime(self,rt): self.__runtime = rt
     def setXargs(self,xargs): self.__xargs = xargs
+    def setTargetCI(self,ci): self.__targetCI = ci
+    def setMinRuntime(self,rt): self.__minRuntime = rt
+    def setMaxRuntime(self,rt): self.__maxRuntime = rt
+
+    def isAdaptive(self):
+        ''' @return True if the runtime of a combination is chosen adaptively. '''
+        return self.__targetCI != None
     
     def appendXml(self,r):
         '''
@@ -60,6 +82,11 @@ class Options(object):
             e = etree.SubElement(r,'xargs')
             e.text = data
 
+        if self.__targetCI != None:
+            data = json.dumps([self.__targetCI,self.__minRuntime,self.getMaxRuntime()])
+            e = etree.SubElement(r,'adaptivert')
+            e.text = data
+
     def fromXml(self,root):
         '''
         Loads the information about options from XML.
@@ -74,6 +101,8 @@ class Options(object):
             self.__runtime = json.loads(root.findtext('runtime'))
         if root.findtext('xargs'):
                 self.__xargs = json.loads(root.findtext('xargs'))
+        if root.findtext('adaptivert'):
+            self.__targetCI,self.__minRuntime,self.__maxRuntime = json.loads(root.findtext('adaptivert'))
         logging.info("# Loading options from xml")
         logging.info("# Options nj:"+str(self.__nj))
         logging.info("# Options iod: "+str(self.__iod))
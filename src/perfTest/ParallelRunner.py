@@ -0,0 +1,127 @@
+''' @package ParallelRunner
+A module running the performance tests of several devices in parallel.
+'''
+import logging
+import multiprocessing
+import sys
+import time
+
+class ParallelRunner(object):
+    '''
+    Runs the performance tests of several devices concurrently. Every
+    performance test is run in its own process, the processes share a
+    status dictionary that is used to print an aggregated status.
+    '''
+    ## Seconds between two status prints.
+    statusInterval = 60
+
+    ## The performance tests are passed to the processes by forking, they
+    ## hold objects that cannot be pickled.
+    mpContext = multiprocessing.get_context('fork')
+
+    ## Format of the per device log files.
+    logformat = '%(asctime)s %(name)-8s %(levelname)-8s %(message)s'
+    logdatefmt = '%Y%m%d %H:%M'
+
+    def __init__(self, perfTests, loglevel=logging.INFO):
+        '''
+        Constructor
+        @param perfTests A list of initialized PerfTest objects, one per device.
+        @param loglevel The log level for the per device log files.
+        '''
+        ## The performance tests to run
+        self.__perfTests = perfTests
+        ## Log level of the workers
+        self.__loglevel = loglevel
+        ## Result of each test after running, testname: True|False
+        self.__results = {}
+
+    def getPerfTests(self): return self.__perfTests
+    def getResults(self): return self.__results
+
+    @staticmethod
+    def getLogfile(perfTest): return perfTest.getTestname() + '.log'
+
+    def worker(self,perfTest,status):
+        '''
+        Run one performance test, called in a separate process. Logging and
+        standard output of the process are redirected to the log file of the
+        performance test.
+        @param perfTest The PerfTest object to run.
+        @param status The shared status dictionary.
+        '''
+        name = perfTest.getTestname()
+        logfile = ParallelRunner.getLogfile(perfTest)
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        handler = logging.FileHandler(logfile)
+        handler.setFormatter(logging.Formatter(ParallelRunner.logformat,ParallelRunner.logdatefmt))
+        root.addHandler(handler)
+        root.setLevel(self.__loglevel)
+        sys.stdout = open(logfile,'a')
+
+        def hook(key,state):
+            status[name] = [key,state,time.time()]
+        perfTest.setStatusHook(hook)
+        status[name] = [None,'started',time.time()]
+        try:
+            perfTest.run()
+            status[name] = [None,'finished',time.time()]
+        except (RuntimeError,SystemExit) as e:
+            logging.error("# Running performance test failed: " + str(e))
+            status[name] = [None,'failed',time.time()]
+        finally:
+            sys.stdout.close()
+
+    @staticmethod
+    def formatStatus(status):
+        '''
+        Get an aggregated status string of all running tests.
+        @param status The status dictionary.
+        @return The status string, one line per device.
+        '''
+        now = time.time()
+        lines = []
+        for name in sorted(status.keys()):
+            key,state,since = status[name]
+            line = name + ": " + state
+            if key != None:
+                line += " test " + key
+            line += " (" + str(int(now - since)) + "s)"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def run(self):
+        '''
+        Start one process per performance test, print the status periodically
+        and wait until all processes have finished.
+        @return True if all tests finished successfully, False otherwise.
+        '''
+        manager = ParallelRunner.mpContext.Manager()
+        status = manager.dict()
+        procs = []
+        for perfTest in self.__perfTests:
+            status[perfTest.getTestname()] = [None,'waiting',time.time()]
+            p = ParallelRunner.mpContext.Process(target=self.worker,args=(perfTest,status),
+                                                 name=perfTest.getTestname())
+            p.start()
+            logging.info("# Started process " + str(p.pid) + " for " + perfTest.getTestname())
+            procs.append(p)
+        lastPrint = 0
+        while len([p for p in procs if p.is_alive()]) > 0:
+            if time.time() - lastPrint >= ParallelRunner.statusInterval:
+                print("### Status ###")
+                print(ParallelRunner.formatStatus(status))
+                lastPrint = time.time()
+            time.sleep(1)
+        for p in procs:
+            p.join()
+        print("### Status ###")
+        print(ParallelRunner.formatStatus(status))
+        for perfTest,p in zip(self.__perfTests,procs):
+            name = perfTest.getTestname()
+            self.__results[name] = (p.exitcode == 0 and status[name][1] == 'finished')
+            logging.info("# Performance test " + name + " finished: " + str(self.__results[name]))
+        manager.shutdown()
+        return all(self.__results.values())
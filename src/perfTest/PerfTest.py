@@ -18,13 +18,64 @@ import perfTest.DeviceTests as dt
 from perfTest.Devices import SSD
 from perfTest.Devices import HDD
 from perfTest.Options import Options
+from perfTest.Scheduler import Scheduler
 from reports.XmlReport import XmlReport
 from reports.RstReport import RstReport
+from reports.NpzReport import NpzReport
+from system.Readiness import Readiness
+
+class LazyTests(dict):
+    '''
+    A dictionary of device tests, tests loaded from xml are only created
+    when they are accessed for the first time.
+    '''
+
+    def __init__(self):
+        dict.__init__(self)
+        ## Functions creating the tests not accessed yet, key: function
+        self.__loaders = {}
+
+    def addLoader(self,key,loader):
+        '''
+        Add a test that is created on first access.
+        @param key The key of the test.
+        @param loader A function without arguments returning the test.
+        '''
+        dict.__setitem__(self,key,None)
+        self.__loaders[key] = loader
+
+    def isLoaded(self,key):
+        ''' @return True if the test with the given key has been created. '''
+        return key in self and key not in self.__loaders
+
+    def __getitem__(self,key):
+        if key in self.__loaders:
+            logging.info("# Loading test " + key)
+            dict.__setitem__(self,key,self.__loaders.pop(key)())
+        return dict.__getitem__(self,key)
+
+    def __setitem__(self,key,value):
+        self.__loaders.pop(key,None)
+        dict.__setitem__(self,key,value)
+
+    def get(self,key,default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def items(self): return [(k,self[k]) for k in list(self.keys())]
+    def values(self): return [self[k] for k in list(self.keys())]
+
+    def clear(self):
+        self.__loaders.clear()
+        dict.clear(self)
 
 class PerfTest(object):
     '''
     A performance test, consists of multiple Device Tests.
     '''
+    ## Store the result matrices in a binary npz file next to the xml file.
+    npzResults = False
 
     def __init__(self,testname,device):
         '''
@@ -45,7 +96,7 @@ class PerfTest(object):
         self.__rstReport = RstReport(self.__testname)
 
         ## Dictionary of tests to carry out
-        self.__tests = {}
+        self.__tests = LazyTests()
 
         ## Date the test has been carried out
         self.__testDate = None
@@ -60,6 +111,18 @@ class PerfTest(object):
         ## Hold the command line used to call the test
         self.__cmdLineArgs = None
 
+        ## Function called on state changes of the tests
+        self.__statusHook = None
+
+        ## Checkpoint the tests record their rounds in
+        self.__checkpoint = None
+
+        ## Npz file the result matrices are appended to, None if not used
+        self.__npzReport = None
+
+        ## Planned order of the tests and shared device states, cf. Scheduler.plan
+        self.__schedule = None
+
     def getTestname(self): return self.__testname
     def getDevice(self): return self.__device
     def getTestDate(self): return self.__testDate
@@ -69,6 +132,9 @@ class PerfTest(object):
     def getTests(self): return self.__tests
     def getXmlReport(self): return self.__xmlReport
     def getRstReport(self): return self.__rstReport
+    def getStatusHook(self): return self.__statusHook
+    def getCheckpoint(self): return self.__checkpoint
+    def getSchedule(self): return self.__schedule
 
     def collOSInfos(self):
         '''
@@ -136,6 +202,40 @@ class PerfTest(object):
         '''
         self.__cmdLineArgs = cmdLineStr
 
+    def setSchedule(self,schedule):
+        '''
+        Sets the planned schedule of the tests.
+        @param schedule The plan, cf. Scheduler.plan.
+        '''
+        self.__schedule = schedule
+
+    def setCheckpoint(self,ckpt):
+        '''
+        Sets the checkpoint for all tests, every test records its rounds
+        under its key.
+        @param ckpt A Checkpoint object.
+        '''
+        self.__checkpoint = ckpt
+        for k,v in self.__tests.items():
+            v.setCheckpoint(ckpt,k)
+
+    def setStatusHook(self,hook):
+        '''
+        Sets a function that is called if the state of a test changes.
+        @param hook A function taking the test key and the new state
+        (running|done), None to disable it.
+        '''
+        self.__statusHook = hook
+
+    def reportStatus(self,key,state):
+        '''
+        Pass a state change of a test to the status hook.
+        @param key The key of the test in the dictionary.
+        @param state The new state of the test.
+        '''
+        if self.__statusHook != None:
+            self.__statusHook(key,state)
+
     def addTest(self,key,test):
         '''
         Add a test to the test dictionary.
@@ -144,53 +244,127 @@ class PerfTest(object):
         '''
         self.__tests[key] = test
 
+    def addXmlTest(self,key,testClass,elem,device,npz):
+        '''
+        Add a test that is loaded from its xml representation on first access.
+        @param key The key for the test in the dictionary.
+        @param testClass The class of the device test.
+        @param elem The xml element of the test.
+        @param device The Device object loaded from xml.
+        @param npz The NpzReport holding the result matrices, None if not used.
+        '''
+        def loader():
+            # Every test gets its own options, they are initialized in fromXml
+            test = testClass(self.getTestname(),device,Options(None,None))
+            test.setNpzReport(npz)
+            test.fromXml(elem)
+            #the block sizes dropped to meet a time budget are not in the results
+            if self.__schedule != None:
+                Scheduler.apply(self.__schedule,key,test)
+            return test
+        self.__tests.addLoader(key,loader)
+
     def resetTests(self):
         '''
         Clear the dictionary containing the tests.
         '''
         self.__tests.clear()
 
+    def getTestKeys(self):
+        '''
+        Get the keys of the tests in a deterministic order.
+        @return The keys in the order of the schedule, sorted if the tests
+        have not been scheduled.
+        '''
+        keys = sorted(self.__tests.keys())
+        if self.__schedule != None:
+            planned = [step['key'] for step in self.__schedule['steps'] if step['key'] in self.__tests]
+            keys = planned + [k for k in keys if k not in planned]
+        return keys
+
     def initialize(self):
         '''
         Initialize the given tests, this sets the device and Fio
         init params for all tests.
         '''
-        sorted(self.__tests.items())
-        for k,v in list(self.__tests.items()):
+        for k in self.getTestKeys():
             logging.info("# Initialiazing test "+k)
-            v.initialize()
+            self.__tests[k].initialize()
+
+    def planTests(self):
+        '''
+        Plan the order of the tests and the shared device states, estimate
+        their durations and trim them to the time budget, cf. Scheduler.
+        A resumed run uses the schedule recorded in its checkpoint.
+        '''
+        if self.__checkpoint != None and self.__checkpoint.getSchedule() != None:
+            logging.info("# Using the schedule of the resumed run")
+            self.__schedule = self.__checkpoint.getSchedule()
+        else:
+            self.__schedule = Scheduler.plan(self.__tests,sorted(self.__tests.keys()))
+            Scheduler.fit(self.__schedule,self.__tests,self.getDevice())
+            if self.__checkpoint != None:
+                self.__checkpoint.addSchedule(self.__schedule)
+        for step in self.__schedule['steps']:
+            Scheduler.apply(self.__schedule,step['key'],self.__tests[step['key']])
+        if self.__schedule.get('estimate') != None:
+            print("Estimated duration of the tests: " + str(int(self.__schedule['estimate'] // 60)) + " minutes")
 
     def runTests(self):
         '''
         Call the run method of every test in the test dictionary. The run method
         of a test is its core function where the performance test is carried out.
-        '''
-        #sort per key to ensure tests have the same order
-        sorted(self.__tests.items())
-        for k,v in list(self.__tests.items()):
+        The xml file is written before the first test, the results of every test
+        are appended as soon as it has finished. Resumed tests restore their
+        rounds from the checkpoint and are appended again.
+        The tests are run in the order planned by the Scheduler, a test can
+        start from the device state of the previous one.
+        '''
+        self.planTests()
+        self.startXml()
+        prev = None
+        for step in self.__schedule['steps']:
+            k = step['key']
+            v = self.__tests[k]
             print("Starting test: " + k)
-            #before each test sleep, to ensure device operations of previous
+            self.reportStatus(k,'running')
+            #before each test wait until device operations of previous
             #tests are finished
-            logging.info("# Sleeping for 5 seconds...")
-            time.sleep(5)
+            if Readiness.waitIdle(self.getDevice().getDevPath()) == False:
+                logging.warn("# Starting test " + k + " although device is not idle")
+            Scheduler.share(step,self.__tests,prev)
+            start = time.time()
             v.run()
+            Scheduler.record(k,v,time.time() - start)
+            self.appendTestXml(k,v)
+            self.reportStatus(k,'done')
+            prev = k
 
-    def genPlots(self):
+    def genPlots(self,jobs=None):
         '''
         Generate the plots/charts for each specific test in the dictionary.
-        '''
-        sorted(self.__tests.items())
-        for k,v in list(self.__tests.items()):
+        The measurement tables are calculated directly, the figures are
+        rendered concurrently in a pool of processes.
+        @param jobs A list to queue the rendering of the figures in, e.g. to
+        render the figures of several performance tests together. If None
+        the figures of this performance test are rendered before returning.
+        '''
+        import plots.genPlots as pgp
+        render = (jobs == None)
+        if render:
+            jobs = []
+        for k in self.getTestKeys():
             logging.info("# Generating plots for "+k+" test")
-            v.genPlots()
+            self.__tests[k].genPlots(jobs)
+        if render:
+            pgp.renderPlots(jobs)
 
-    def toXml(self):
+    def headerToXml(self):
         '''
-        First the device information is written to the xml file.
-        Calls for every test in the test dictionary the toXMl method
-        and writes the results to the xml file.
+        Start a new xml tree with the date, device and OS information, the
+        test suite version and the command line.
         '''
-        tests = self.getTests()
+        self.getXmlReport().clear()
         e = self.getXmlReport().getXml()
         # Add the current date to the xml
         if self.__testDate != None:
@@ -213,22 +387,70 @@ class PerfTest(object):
         if self.__cmdLineArgs != None:
             dev = etree.SubElement(e,'cmdline')
             dev.text = json.dumps(self.__cmdLineArgs)
+        # Add the planned schedule of the tests
+        if self.__schedule != None:
+            dev = etree.SubElement(e,'schedule')
+            dev.text = json.dumps(self.__schedule)
+
+    def startXml(self):
+        '''
+        Write a new xml file containing only the header information, the
+        results of the tests are appended with appendTestXml.
+        '''
+        self.headerToXml()
+        # The result matrices are written to a npz file, the xml references them
+        self.__npzReport = None
+        if PerfTest.npzResults == True:
+            #tests loaded from xml can still map their matrices from the file
+            for k in self.getTestKeys():
+                self.__tests[k].detachNpz()
+            self.__npzReport = NpzReport(self.getTestname())
+            self.__npzReport.toFile()
+        self.getXmlReport().startFile(self.getTestname())
+
+    def appendTestXml(self,key,test):
+        '''
+        Append the results of a finished test to the xml file. The file on
+        disk stays valid, if a later test fails the results of the finished
+        tests are still usable.
+        @param key The key of the test in the test dictionary.
+        @param test The test object.
+        '''
+        test.setNpzReport(self.__npzReport)
+        elem = test.toXml(key)
+        #the arrays must exist before the xml file references them
+        if self.__npzReport != None:
+            self.__npzReport.appendToFile()
+        self.getXmlReport().appendToFile(self.getTestname(),elem)
+        logging.info("# Appended results of test " + key + " to " + self.getTestname() + ".xml")
+
+    def toXml(self):
+        '''
+        First the device information is written to the xml file.
+        Calls for every test in the test dictionary the toXMl method
+        and appends the results to the xml file.
+        '''
+        self.startXml()
         # Call the xml function for every test in the dictionary
-        sorted(self.__tests.items())
-        for k,v in tests.items():
-            e.append(v.toXml(k))
-        self.getXmlReport().xmlToFile(self.getTestname())
+        for k in self.getTestKeys():
+            self.appendTestXml(k,self.__tests[k])
 
     def fromXml(self):
         '''
         Reads out the xml file name 'testname.xml' and initializes the test
         specified with xml. The valid tags are "iops,lat,tp,writesat" for ssd,
         "iops, tp" for hdd. But there isn't always every test run, so xml can
-        miss a test.
+        miss a test. A test is only loaded from its xml element when it is
+        accessed for the first time.
         '''
         self.getXmlReport().fileToXml(self.getTestname())
         self.resetTests()
         root = self.getXmlReport().getXml()
+        # Result matrices can be stored in a npz file next to the xml file
+        npz = None
+        if os.path.isfile(self.getTestname() + '.npz'):
+            npz = NpzReport(self.getTestname())
+            npz.fromFile()
 
         if(root.findtext('testdate')):
             self.setTestDate(json.loads(root.findtext('testdate')))
@@ -250,41 +472,27 @@ class PerfTest(object):
             self.setCmdLineArgs(json.loads(root.findtext('cmdline')))
         else:
             self.setCmdLineArgs('n.a.')
-        # Create an empty options object, it is initialized in fromXml
-        options = Options(None,None)
-        # Initialize device and performance tests
+        # Older xml files do not contain a schedule
+        self.setSchedule(None)
+        if(root.findtext('schedule')):
+            self.setSchedule(json.loads(root.findtext('schedule')))
+        # Initialize device, the performance tests are loaded on first access
         if isinstance(self, SsdPerfTest):
             device = SSD('ssd',None,self.getTestname())
             device.fromXml(root)
-            for tag in SsdPerfTest.testKeys:
-                #check which test tags are in the xml file
-                for elem in root.iterfind(tag):
-                    test = None
-                    if elem.tag == SsdPerfTest.iopsKey:
-                        test = dt.SsdIopsTest(self.getTestname(),device,options)
-                    if elem.tag == SsdPerfTest.latKey:
-                        test = dt.SsdLatencyTest(self.getTestname(),device,options)
-                    if elem.tag == SsdPerfTest.tpKey:
-                        test = dt.SsdTPTest(self.getTestname(),device,options)
-                    if elem.tag == SsdPerfTest.wrKey:
-                        test = dt.SsdWriteSatTest(self.getTestname(),device,options)
-                    #we found a tag in the xml file, now we can read the data from xml
-                    if test != None:
-                        test.fromXml(elem)
-                        self.addTest(tag, test)
+            testClasses = {SsdPerfTest.iopsKey:dt.SsdIopsTest,SsdPerfTest.latKey:dt.SsdLatencyTest,
+                           SsdPerfTest.tpKey:dt.SsdTPTest,SsdPerfTest.wrKey:dt.SsdWriteSatTest}
+            testKeys = SsdPerfTest.testKeys
         elif isinstance(self, HddPerfTest):
             device = HDD('hdd',None,self.getTestname())
             device.fromXml(root)
-            for tag in HddPerfTest.testKeys:
-                for elem in root.iterfind(tag):
-                    test = None
-                    if elem.tag == HddPerfTest.iopsKey:
-                        test = dt.HddIopsTest(self.getTestname(),device,options)
-                    if elem.tag == HddPerfTest.tpKey:
-                        test = dt.HddTPTest(self.getTestname(),device,options)
-                    if test != None:
-                        test.fromXml(elem)
-                        self.addTest(tag, test)
+            testClasses = {HddPerfTest.iopsKey:dt.HddIopsTest,HddPerfTest.tpKey:dt.HddTPTest}
+            testKeys = HddPerfTest.testKeys
+        for tag in testKeys:
+            #check which test tags are in the xml file
+            for elem in root.iterfind(tag):
+                if elem.tag in testClasses:
+                    self.addXmlTest(tag,testClasses[elem.tag],elem,device,npz)
 
     @abstractmethod
     def toRst(self):
@@ -293,7 +501,9 @@ class PerfTest(object):
     def run(self):
         ''' The main run method, runs tests, generates plots and rst report. '''
         self.runTests()
-        self.toXml()
+        #all results are in the xml file now
+        if self.__checkpoint != None:
+            self.__checkpoint.remove()
         self.genPlots()
         self.toRst()
 
@@ -353,8 +563,12 @@ class SsdPerfTest(PerfTest):
                                  self.getTestDate())
                 rst.addFioJobInfo(tests[keys].getOptions().getNj(), tests[keys].getOptions().getIod())
                 rst.addOSInfo(self.getOSInfo())
-                rst.addGeneralInfo('ssd')
+                #the steady state mode of the run, the tests may be loaded from xml
+                modes = [t.getStdyState().getMode() for t in tests.values() if hasattr(t,'getStdyState')]
+                rst.addGeneralInfo('ssd',modes[0] if len(modes) > 0 else 'snia')
                 break
+        if self.getSchedule() != None:
+            rst.addSchedule(self.getSchedule(),tests)
 
         if SsdPerfTest.iopsKey in tests:
             rst.addChapter("IOPS")
@@ -384,6 +598,9 @@ class SsdPerfTest(PerfTest):
             rst.addSection("Measurement Window Summary Table")
             rst.addTable(tests['lat'].getTables()[0],tests['lat'].getBsLabels(),'avg-lat')#avg lat
             rst.addTable(tests['lat'].getTables()[1],tests['lat'].getBsLabels(),'max-lat')#max lat
+            if len(tests['lat'].getTables()) > 2:
+                rst.addTable(tests['lat'].getTables()[2],tests['lat'].getBsLabels(),
+                             'p'+str(dt.SsdLatencyTest.reportPct)+'-lat')#percentile lat
         if SsdPerfTest.wrKey in tests:
             rst.addChapter("Write Saturation")
             rst.addTestInfo('ssd','writesat',tests['writesat'])
@@ -443,6 +660,8 @@ class HddPerfTest(PerfTest):
             rst.addOSInfo(self.getOSInfo())
             rst.addGeneralInfo('hdd')
             break
+        if self.getSchedule() != None:
+            rst.addSchedule(self.getSchedule(),tests)
         if HddPerfTest.iopsKey in tests:
             rst.addChapter("IOPS")
             rst.addTestInfo('hdd','iops',tests['iops'])
@@ -0,0 +1,454 @@
+''' @package Scheduler
+A module planning the order and duration of the tests.
+'''
+import logging
+import math
+
+import perfTest.DeviceTests as dt
+from perfTest.Devices import SSD
+from perfTest.StdyState import StdyState
+from system.Erase import EraseRegistry
+from system.ProbeCache import ProbeCache
+
+class Scheduler(object):
+    '''
+    Plans the order of the tests of a performance test and which tests start
+    from the device state the previous test has left instead of erasing and
+    preconditioning the device again. A test can follow another test if a
+    share rule for the two test classes exists. Tests following each other
+    are kept together, the groups are ordered by the first of their tests
+    in the given order. If the previous test has not reached the state it
+    promises, e.g. the IOPS test did not reach its steady state, the
+    following test erases and preconditions the device as usual.
+
+    The duration of every test is estimated from the device size, the
+    runtime and the rounds and round durations of earlier runs on the same
+    device, kept in the probe cache. If the estimate exceeds the time budget
+    the tests are trimmed until it is met: the write saturation test is
+    stopped earlier, the rounds of the steady state tests are limited to
+    keepRnds, then block sizes besides the dependent variables are dropped
+    and at last the rounds are limited to the minimum of the steady state
+    detection. Every trim is recorded with its trade-off in the plan.
+    '''
+    ## Start tests from the device state of the previous test if possible.
+    sharePrec = False
+    ## Rules of sharing the device state: [test class leaving the state,
+    ## test class starting from it, assumption of the rule]
+    shares = [[dt.SsdWriteSatTest,dt.SsdIopsTest,
+               "Writing 4 times the device size with random 4k writes leaves the device at least as "
+               "preconditioned as the workload independent preconditioning, the IOPS test reaches "
+               "its steady state from this state."],
+              [dt.SsdIopsTest,dt.SsdLatencyTest,
+               "The steady state of the IOPS test covers the random workloads and block sizes of the "
+               "latency test, the latency test reaches its steady state from this state."]]
+    ## Total time budget of the tests in seconds, None for no budget.
+    budgetSec = None
+    ## Bandwidth of the preconditioning in MB/s if it has never been measured.
+    precMBs = 200
+    ## Minimum number of rounds of the write saturation test kept to meet the budget.
+    minWriteSatRnds = 60
+    ## Rounds of the steady state tests kept before block sizes are dropped.
+    keepRnds = 10
+    ## Block sizes dropped to meet the budget in the order they are dropped,
+    ## [test class,block sizes], the block size of the dependent variable of
+    ## a test (stdyBs) is never dropped.
+    trimBs = [[dt.SsdIopsTest,["512","1024k","128k","32k","16k","64k","8k"]],
+              [dt.SsdLatencyTest,["512","8k"]],
+              [dt.SsdTPTest,["512","8k","64k","4k"]],
+              [dt.HddIopsTest,["64k","16k"]],
+              [dt.HddTPTest,["4k"]]]
+
+    @staticmethod
+    def getRule(source,test):
+        '''
+        Get the share rule of two tests.
+        @param source The test leaving the device state.
+        @param test The test starting from the device state.
+        @return The rule, None if the test cannot start from the state of source.
+        '''
+        for rule in Scheduler.shares:
+            if isinstance(source,rule[0]) and isinstance(test,rule[1]):
+                return rule
+        return None
+
+    @staticmethod
+    def plan(tests,keys):
+        '''
+        Plan the order of the tests and the shared device states.
+        @param tests The dictionary of tests, key: DeviceTest.
+        @param keys The keys of the tests in the order they are requested.
+        @return A json serializable plan, a dictionary with the keys share,
+        True if device states are shared, and steps, the tests in the order
+        they are run. A step is a dictionary with the keys key, follows,
+        the key of the test whose state is shared or None, and assumption,
+        the assumption the sharing relies on. The estimates and trims are
+        added by fit.
+        '''
+        keys = [k for k in keys if k in tests]
+        follows = {}
+        if Scheduler.sharePrec:
+            for k in keys:
+                #the first test in the given order leaving a usable state is preferred
+                for s in keys:
+                    if s != k and s not in follows.values() and Scheduler.getRule(tests[s],tests[k]) != None:
+                        follows[k] = s
+                        break
+        #start a group with every test not following another one
+        order = []
+        for k in keys:
+            if k in order:
+                continue
+            group = [k]
+            while group[0] in follows and follows[group[0]] not in order + group:
+                group.insert(0,follows[group[0]])
+            while True:
+                nexts = [n for n in keys if follows.get(n) == group[-1] and n not in order + group]
+                if len(nexts) == 0:
+                    break
+                group.append(nexts[0])
+            order.extend(group)
+        steps = []
+        for k in order:
+            step = {'key':k,'follows':None,'assumption':None}
+            if k in follows:
+                step['follows'] = follows[k]
+                step['assumption'] = Scheduler.getRule(tests[follows[k]],tests[k])[2]
+            steps.append(step)
+            logging.info("# Planned test " + k + (", following " + step['follows'] if step['follows'] != None else ""))
+        return {'share':Scheduler.sharePrec,'steps':steps}
+
+    @staticmethod
+    def share(step,tests,prev):
+        '''
+        Decide if a test starts from the device state of the previous test,
+        the decision is set as shared state of the test.
+        @param step The planned step of the test, cf. plan.
+        @param tests The dictionary of tests, key: DeviceTest.
+        @param prev The key of the test that has run before, None for the first test.
+        @return True if the device state is shared, False if not.
+        '''
+        test = tests[step['key']]
+        test.setSharedFrom(None)
+        if step['follows'] == None:
+            return False
+        if step['follows'] != prev or not tests[prev].isShareable():
+            logging.info("# Test " + str(prev) + " did not leave the planned state, " + step['key'] +
+                         " prepares the device itself")
+            return False
+        logging.info("# Test " + step['key'] + " starts from the device state of " + prev)
+        test.setSharedFrom(prev)
+        return True
+
+    @staticmethod
+    def getRuntime(test):
+        '''
+        Get the seconds every fio job of a test runs.
+        @param test The DeviceTest object.
+        @return The runtime, in adaptive mode the maximum runtime.
+        '''
+        options = test.getOptions()
+        if options == None or options.getRuntime() == None:
+            return 60
+        if options.isAdaptive():
+            return options.getMaxRuntime()
+        return options.getRuntime()
+
+    @staticmethod
+    def getRoundSec(test):
+        '''
+        Get the modeled duration of one round of a test, every fio job runs
+        for the runtime.
+        @param test The DeviceTest object.
+        @return [seconds of a round,maximum number of rounds], a round of the
+        throughput tests covers all block sizes.
+        '''
+        rt = Scheduler.getRuntime(test)
+        if isinstance(test,dt.SsdIopsTest):
+            return [len(dt.SsdIopsTest.mixWlds) * len(test.getBsLabels()) * rt,test.getRndLimit(StdyState.testRnds)]
+        if isinstance(test,dt.SsdLatencyTest):
+            return [len(dt.SsdLatencyTest.mixWlds) * len(test.getBsLabels()) * rt,test.getRndLimit(StdyState.testRnds)]
+        if isinstance(test,dt.SsdTPTest):
+            return [2 * len(test.getBsLabels()) * rt,test.getRndLimit(StdyState.testRnds)]
+        if isinstance(test,dt.SsdWriteSatTest):
+            return [rt,test.getRndLimit(dt.SsdWriteSatTest.maxRnds)]
+        if isinstance(test,dt.HddIopsTest):
+            return [len(dt.HddIopsTest.mixWlds) * len(test.getBsLabels()) * rt,dt.HddIopsTest.maxRnds]
+        if isinstance(test,dt.HddTPTest):
+            return [2 * len(test.getBsLabels()) * rt,dt.HddTPTest.maxRnds]
+        return [0,0]
+
+    @staticmethod
+    def getRunRnds(test):
+        '''
+        Get the number of rounds a test has run.
+        @param test The DeviceTest object.
+        @return The rounds, for the throughput tests the rounds of one block size.
+        '''
+        if isinstance(test,(dt.SsdIopsTest,dt.SsdLatencyTest)):
+            return len(test.getRndMatrices())
+        if isinstance(test,dt.SsdTPTest):
+            return len(test.getRndMatrices()[0][0]) if len(test.getRndMatrices()) > 0 else 0
+        if isinstance(test,dt.SsdWriteSatTest):
+            return test.getRnds() + 1
+        return Scheduler.getRoundSec(test)[1]
+
+    @staticmethod
+    def getEraseSec(device):
+        '''
+        Get the expected duration of an erase of the device, the device is
+        not probed, cf. EraseRegistry.estimate.
+        @param device The Device object.
+        @return The seconds of the erase method, None if unknown.
+        '''
+        if not isinstance(device,SSD) or device.getDevPath() == None:
+            return None
+        return EraseRegistry.estimate(device)
+
+    @staticmethod
+    def getPrecSec(test):
+        '''
+        Get the expected duration of the workload independent preconditioning.
+        @param test The DeviceTest object.
+        @return The seconds to write the device with the measured or assumed
+        bandwidth, None if the device size is unknown.
+        '''
+        device = test.getDevice()
+        if device.getDevSizeB() == None:
+            return None
+        total = device.getDevSizeB() * SSD.wlIndPrecRnds
+        if SSD.precMode == 'job' and test.getOptions() != None and test.getOptions().getNj() != None:
+            total *= test.getOptions().getNj()
+        mbs = Scheduler.getPrecMBs(device)
+        if mbs == None:
+            mbs = Scheduler.precMBs
+        return total / (mbs * 2**20)
+
+    @staticmethod
+    def getPrecMBs(device):
+        '''
+        Get the measured bandwidth of the preconditioning of a device.
+        @param device The Device object.
+        @return The MB/s of the last preconditioning, None if not measured yet.
+        '''
+        if device.getDevPath() == None:
+            return None
+        return ProbeCache.getMeasured(device.getDevPath(),'prec',SSD.precMode)
+
+    @staticmethod
+    def estimate(test,key,step,eraseSec):
+        '''
+        Estimate the duration of a test.
+        @param test The DeviceTest object.
+        @param key The key of the test.
+        @param step The planned step of the test, tests following another
+        test are expected to share its device state.
+        @param eraseSec The expected seconds of an erase, None if unknown.
+        @return A dictionary with the keys round, the seconds of a round,
+        rounds, the expected rounds, prep, the seconds to prepare the device,
+        source, history if earlier runs are known else model, and sec, the
+        expected seconds of the test.
+        '''
+        rnd,limit = Scheduler.getRoundSec(test)
+        est = {'round':rnd,'rounds':limit,'prep':0,'source':'model'}
+        past = None
+        if test.getDevice().getDevPath() != None:
+            past = ProbeCache.getMeasured(test.getDevice().getDevPath(),'tests',key)
+        if past != None:
+            est['rounds'] = min(limit,past['rounds'])
+            est['round'] = rnd * past['ratio']
+            est['source'] = 'history'
+        erase = eraseSec if eraseSec != None else 0
+        if isinstance(test,(dt.SsdIopsTest,dt.SsdLatencyTest)) and step['follows'] == None:
+            prec = Scheduler.getPrecSec(test)
+            est['prep'] = erase + (prec if prec != None else 0)
+        if isinstance(test,dt.SsdTPTest):
+            est['prep'] = erase * len(test.getBsLabels())
+        if isinstance(test,dt.SsdWriteSatTest):
+            est['prep'] = erase
+        est['round'] = int(round(est['round']))
+        est['prep'] = int(round(est['prep']))
+        est['sec'] = est['prep'] + est['rounds'] * est['round']
+        return est
+
+    @staticmethod
+    def getTrims(steps,tests,excess):
+        '''
+        Get the possible trims of the tests to meet the time budget, only
+        the trims of the first applicable kind are returned.
+        @param steps The planned steps with their estimates.
+        @param tests The dictionary of tests, key: DeviceTest.
+        @param excess The seconds the estimate exceeds the budget.
+        @return A list of trims, the one saving most time first. A trim is
+        a dictionary with the keys key, kind (rounds|bs) and value, the
+        round limit or the dropped block size.
+        '''
+        satTrims = []
+        keepTrims = []
+        bsTrims = []
+        rndTrims = []
+        for step in steps:
+            test = tests[step['key']]
+            est = step['estimate']
+            if est['round'] == 0:
+                continue
+            if isinstance(test,dt.SsdWriteSatTest):
+                if est['rounds'] > Scheduler.minWriteSatRnds:
+                    rnds = max(Scheduler.minWriteSatRnds,est['rounds'] - int(math.ceil(excess / est['round'])))
+                    satTrims.append([(est['rounds'] - rnds) * est['round'],
+                                     {'key':step['key'],'kind':'rounds','value':rnds}])
+                continue
+            for rule in Scheduler.trimBs:
+                if not isinstance(test,rule[0]):
+                    continue
+                bsLabels = test.getBsLabels()
+                drop = [bs for bs in rule[1] if bs in bsLabels and bs != test.stdyBs]
+                if len(drop) > 0 and len(bsLabels) > 1:
+                    saved = est['rounds'] * est['round'] // len(bsLabels)
+                    if isinstance(test,dt.SsdTPTest):
+                        saved += est['prep'] // len(bsLabels)
+                    bsTrims.append([saved,{'key':step['key'],'kind':'bs','value':drop[0]}])
+                break
+            if isinstance(test,(dt.SsdIopsTest,dt.SsdLatencyTest,dt.SsdTPTest)):
+                trim = [est['round'],{'key':step['key'],'kind':'rounds','value':est['rounds'] - 1}]
+                if est['rounds'] > max(Scheduler.keepRnds,test.getStdyState().getMinRnds()):
+                    keepTrims.append(trim)
+                if est['rounds'] > test.getStdyState().getMinRnds():
+                    rndTrims.append(trim)
+        for trims in [satTrims,keepTrims,bsTrims,rndTrims]:
+            if len(trims) > 0:
+                #sorting is stable, trims saving the same time keep the order of the plan
+                trims.sort(key=lambda t: -t[0])
+                return [t[1] for t in trims]
+        return []
+
+    @staticmethod
+    def getTradeoff(trim,test):
+        '''
+        Describe the trade-off of a trim.
+        @param trim The trim, cf. getTrims.
+        @param test The trimmed DeviceTest object.
+        @return The description.
+        '''
+        if trim['kind'] == 'bs':
+            return "Block size " + trim['value'] + " is not measured."
+        if isinstance(test,dt.SsdWriteSatTest):
+            return ("The test stops after " + str(trim['value']) + " rounds, "
+                    "it may not write 4 times the device size.")
+        return ("The test stops after " + str(trim['value']) + " rounds, "
+                "the steady state may not be reached.")
+
+    @staticmethod
+    def apply(schedule,key,test):
+        '''
+        Apply the trims of a schedule to a test, e.g. to a test loaded from
+        xml or resumed from a checkpoint. The block size of the dependent
+        variable of the steady state is never dropped.
+        @param schedule The plan, cf. plan and fit.
+        @param key The key of the test.
+        @param test The DeviceTest object.
+        '''
+        for trim in schedule.get('trims',[]):
+            if trim['key'] != key:
+                continue
+            if trim['kind'] == 'bs' and trim['value'] == test.stdyBs:
+                logging.warning("# Not dropping block size " + trim['value'] + " of test " + key +
+                                ", it is the dependent variable of the steady state")
+                continue
+            if trim['kind'] == 'bs':
+                test.prepareBsLabels(None,trim['value'])
+            if trim['kind'] == 'rounds':
+                test.setRndLimit(trim['value'])
+
+    @staticmethod
+    def fit(schedule,tests,device):
+        '''
+        Estimate the duration of the planned tests and trim them until the
+        estimate meets the time budget. The estimates, the trims and the
+        assumptions of the estimates are added to the plan.
+        @param schedule The plan, cf. plan.
+        @param tests The dictionary of tests, key: DeviceTest.
+        @param device The tested Device object.
+        '''
+        steps = schedule['steps']
+        eraseSec = None
+        if any(isinstance(tests[step['key']],(dt.SsdIopsTest,dt.SsdLatencyTest,dt.SsdTPTest,dt.SsdWriteSatTest))
+               for step in steps):
+            eraseSec = Scheduler.getEraseSec(device)
+        for step in steps:
+            step['estimate'] = Scheduler.estimate(tests[step['key']],step['key'],step,eraseSec)
+        total = sum([step['estimate']['sec'] for step in steps])
+        trims = []
+        budget = Scheduler.budgetSec
+        while budget != None and total > budget:
+            cands = Scheduler.getTrims(steps,tests,total - budget)
+            if len(cands) == 0:
+                logging.warning("# The tests cannot be trimmed to the time budget of " + str(budget) +
+                                " seconds, estimated " + str(total) + " seconds")
+                break
+            trim = cands[0]
+            step = [s for s in steps if s['key'] == trim['key']][0]
+            test = tests[trim['key']]
+            Scheduler.apply({'trims':[trim]},trim['key'],test)
+            old = step['estimate']['sec']
+            step['estimate'] = Scheduler.estimate(test,trim['key'],step,eraseSec)
+            total += step['estimate']['sec'] - old
+            #the round limits of a test are merged into one trim
+            prev = [t for t in trims if t['key'] == trim['key'] and t['kind'] == 'rounds']
+            if trim['kind'] == 'rounds' and len(prev) > 0:
+                prev[0]['value'] = trim['value']
+                prev[0]['saved'] += old - step['estimate']['sec']
+                prev[0]['tradeoff'] = Scheduler.getTradeoff(prev[0],test)
+            else:
+                trim['saved'] = old - step['estimate']['sec']
+                trim['tradeoff'] = Scheduler.getTradeoff(trim,test)
+                trims.append(trim)
+            logging.info("# Trimmed test " + trim['key'] + " to meet the time budget: " + trim['kind'] +
+                         " " + str(trim['value']))
+        assumptions = ["Tests without earlier runs on the device are estimated with their maximum number of rounds.",
+                       "Every fio job runs for the runtime, with adaptive runtime for the maximum runtime."]
+        if eraseSec == None:
+            assumptions.append("The duration of a secure erase is unknown and not included.")
+        if any(step['follows'] != None for step in steps):
+            assumptions.append("Tests following another test are expected to share its device state.")
+        if any(isinstance(tests[step['key']],(dt.SsdIopsTest,dt.SsdLatencyTest)) for step in steps) and \
+           Scheduler.getPrecMBs(device) == None:
+            assumptions.append("The preconditioning has not been measured yet, it is expected to write " +
+                               str(Scheduler.precMBs) + " MB/s.")
+        schedule['budget'] = budget
+        schedule['estimate'] = total
+        schedule['trims'] = trims
+        schedule['assumptions'] = assumptions
+        logging.info("# Estimated duration of the tests: " + str(total) + " seconds")
+
+    @staticmethod
+    def record(key,test,sec):
+        '''
+        Store the rounds and round durations of a finished test and the
+        bandwidth of its preconditioning in the probe cache, the next
+        estimates of the device use them. Resumed tests are not recorded.
+        @param key The key of the test.
+        @param test The DeviceTest object.
+        @param sec The seconds the test took.
+        '''
+        path = test.getDevice().getDevPath()
+        if path == None or test.isResumed():
+            return
+        rnd,limit = Scheduler.getRoundSec(test)
+        rounds = Scheduler.getRunRnds(test)
+        prep = sum([e['duration'] for e in test.getErases() if e.get('duration') != None])
+        for prec in test.getPreconditions():
+            prep += sum([r['sec'] for r in prec['rounds']])
+            written = sum([r['bytes'] for r in prec['rounds']])
+            precSec = sum([r['sec'] for r in prec['rounds']])
+            if precSec > 0:
+                ProbeCache.setMeasured(path,'prec',prec['mode'],round(written / precSec / 2**20,1))
+        if rounds == 0 or rnd == 0:
+            return
+        run = {'rounds':rounds,'ratio':round(max(sec - prep,0) / (rounds * rnd),3),'sec':round(sec,1)}
+        #a test stopped by its round limit does not show how many rounds it needs
+        past = ProbeCache.getMeasured(path,'tests',key)
+        if test.getRndLimit(float('inf')) == limit and rounds >= limit:
+            if past == None:
+                return
+            run['rounds'] = past['rounds']
+        ProbeCache.setMeasured(path,'tests',key,run)
@@ -5,6 +5,7 @@ Created on Aug 26, 2014
 '''
 
 import logging
+import math
 import numpy as np
 import json
 from lxml import etree
@@ -17,6 +18,32 @@ class StdyState(object):
     testRnds = 25
     ## Always use a sliding window of 4 to measure performance values.
     testMesWindow = 4
+    ## Steady state detection mode, 'snia' for the excursion and slope
+    ## criterion, 'seq' for the sequential confidence interval test.
+    mode = 'snia'
+    ## Minimum number of values the sequential test needs.
+    seqMinRnds = 3
+    ## Allowed relative half width of the confidence interval for the
+    ## sequential test.
+    seqTolerance = 0.05
+    ## Confidence the sequential test must reach over all its looks, every
+    ## look is tested with a Bonferroni corrected confidence.
+    seqConfidence = 0.95
+    ## Number of interval samples averaged to one batch mean, consecutive
+    ## samples of a round are correlated, their batch means far less.
+    sampleBatch = 10
+    ## Confidence levels of the t table.
+    tLevels = [0.80,0.90,0.95,0.99]
+    ## Two sided critical values of the t distribution per degrees of
+    ## freedom, the last entry is used for all larger degrees of freedom.
+    tTable = [(1,[3.078,6.314,12.706,63.657]),(2,[1.886,2.920,4.303,9.925]),
+              (3,[1.638,2.353,3.182,5.841]),(4,[1.533,2.132,2.776,4.604]),
+              (5,[1.476,2.015,2.571,4.032]),(6,[1.440,1.943,2.447,3.707]),
+              (7,[1.415,1.895,2.365,3.499]),(8,[1.397,1.860,2.306,3.355]),
+              (9,[1.383,1.833,2.262,3.250]),(10,[1.372,1.812,2.228,3.169]),
+              (15,[1.341,1.753,2.131,2.947]),(20,[1.325,1.725,2.086,2.845]),
+              (30,[1.310,1.697,2.042,2.750]),(60,[1.296,1.671,2.000,2.660]),
+              (120,[1.282,1.645,1.960,2.576])]
 
     def __init__(self):
         '''
@@ -34,12 +61,107 @@ class StdyState(object):
         self.__stdySlope = []
         ##States if the steady state has been reached or not
         self.__reachStdyState = None
+        ##Detection mode used for this steady state
+        self.__mode = StdyState.mode
+        ##Confidence reached by the sequential test
+        self.__stdyConf = None
+        ##Relative half width of the confidence interval in the window
+        self.__stdyCI = None
+        ##Interval samples of the dependent variable within each round
+        self.__samples = []
+        ##Number of looks of the sequential test the confidence is corrected for
+        self.__maxLooks = max(StdyState.testRnds - self.getMinRnds() + 1,1)
+        ##Number of looks of the sequential test on new values
+        self.__looks = 0
+        ##Values of the last look, a look on the same values is not counted
+        self.__lastLook = None
+        ##Expected number of interval samples of a round, None if unknown
+        self.__rndSamples = None
 
     def getRnds(self): return self.__rounds
     def getStdyRnds(self): return self.__stdyRnds
     def getStdyAvg(self): return self.__stdyAvg
     def getStdyValues(self): return self.__stdyValues
     def getStdySlope(self): return self.__stdySlope
+    def getMode(self): return self.__mode
+    def getStdyConf(self): return self.__stdyConf
+    def getStdyCI(self): return self.__stdyCI
+    def getSamples(self): return self.__samples
+    def getMaxLooks(self): return self.__maxLooks
+    def getLooks(self): return self.__looks
+
+    def setLooks(self,rnds,rndSamples):
+        '''
+        Set the maximum number of looks of the sequential test, the test is
+        carried out after every round and every batch of interval samples
+        once the minimum number of rounds has been run.
+        @param rnds The maximum number of rounds of the test.
+        @param rndSamples The expected number of interval samples of a round,
+        0 if no samples are taken.
+        '''
+        rnds = max(rnds - self.getMinRnds() + 1,1)
+        self.__maxLooks = rnds * max(rndSamples // StdyState.sampleBatch,1)
+        self.__rndSamples = rndSamples if rndSamples > 0 else None
+
+    def getLookConf(self):
+        '''
+        Get the confidence a single look of the sequential test must reach.
+        @return seqConfidence corrected for the maximum number of looks.
+        '''
+        return 1 - ((1 - StdyState.seqConfidence) / self.__maxLooks)
+
+    def addSamples(self,samples):
+        '''
+        Add the interval samples of the dependent variable of a round, e.g.
+        of a round resumed from a checkpoint. Has to be called for every
+        round that does not stream its samples with startRound and addSample.
+        @param samples A list of values, empty if not available.
+        '''
+        self.__samples.append(list(samples))
+
+    def startRound(self):
+        ''' Start the interval samples of a new round, cf. addSample. '''
+        self.__samples.append([])
+
+    def addSample(self,sample):
+        '''
+        Add an interval sample of the dependent variable to the current
+        round while it runs, e.g. the IOPS of a fio status snapshot.
+        @param sample The value.
+        '''
+        self.__samples[-1].append(sample)
+
+    def getBatchMeans(self,xs):
+        '''
+        Get the batch means of the interval samples of the given rounds.
+        Batches do not span rounds, the last incomplete batch of a round is
+        dropped, a round with less samples than a batch gives one batch.
+        @param xs The rounds to take the samples of.
+        @return [batch positions,batch means], None if samples are missing.
+        '''
+        bx = []
+        by = []
+        for x in xs:
+            if x >= len(self.__samples) or len(self.__samples[x]) == 0:
+                return None
+            smp = self.__samples[x]
+            size = min(len(smp),StdyState.sampleBatch)
+            #position of the batch in rounds, a round stopped early ends before x+1
+            rndLen = self.__rndSamples if self.__rndSamples != None else len(smp)
+            for b in range(len(smp) // size):
+                batch = smp[b * size:(b + 1) * size]
+                bx.append(x + (((b + 0.5) * size) / max(rndLen,len(smp))))
+                by.append(sum(batch) / float(len(batch)))
+        return [bx,by]
+
+    def getMinRnds(self):
+        '''
+        Get the number of rounds needed before the steady state can be checked.
+        @return The number of rounds for the current mode.
+        '''
+        if self.__mode == 'seq':
+            return StdyState.seqMinRnds
+        return StdyState.testMesWindow + 1
 
     def setReachStdyState(self,s): self.__reachStdyState = s
 
@@ -54,6 +176,219 @@ class StdyState(object):
         return self.__reachStdyState
 
     def checkSteadyState(self,xs,ys,rounds):
+        '''
+        Checks if the steady is reached for the given values, the check
+        depends on the mode of the steady state.
+        @param xs Values on x axis
+        @param ys Corresponding values for xs on y axis
+        @param rounds Number of carried out rounds
+        @return True if steady state is reached, False if not
+        '''
+        if self.__mode == 'seq':
+            return self.checkSeqSteadyState(xs,ys,rounds)
+        return self.checkSniaSteadyState(xs,ys,rounds)
+
+    @staticmethod
+    def calcSlope(xs,ys):
+        '''
+        Calculate the linear regression best fit line.
+        @param xs Values on x axis
+        @param ys Corresponding values for xs on y axis
+        @return [k,d] of the line k*x+d
+        '''
+        y = np.array(ys)
+        x = np.array(xs)
+        A = np.vstack([x, np.ones(len(x))]).T
+        k, d = np.linalg.lstsq(A, y, rcond=-1)[0]
+        return [k,d]
+
+    @staticmethod
+    def getTValues(df):
+        '''
+        Get the critical values of the t distribution.
+        @param df Degrees of freedom.
+        @return The critical values for StdyState.tLevels, for degrees of
+        freedom between two table entries the smaller one is taken.
+        '''
+        vals = StdyState.tTable[0][1]
+        for d,v in StdyState.tTable:
+            if d > df:
+                break
+            vals = v
+        return vals
+
+    @staticmethod
+    def calcBetaCf(a,b,x):
+        '''
+        Evaluate the continued fraction of the incomplete beta function with
+        the modified Lentz method.
+        @param a,b The parameters of the beta function.
+        @param x The upper limit of the integral.
+        @return The value of the continued fraction.
+        '''
+        tiny = 1e-300
+        c = 1.0
+        d = 1.0 - ((a + b) * x / (a + 1.0))
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        h = d
+        for m in range(1,201):
+            for num in [m * (b - m) * x / ((a + (2 * m) - 1) * (a + (2 * m))),
+                        -(a + m) * (a + b + m) * x / ((a + (2 * m)) * (a + (2 * m) + 1))]:
+                d = 1.0 + (num * d)
+                d = 1.0 / (d if abs(d) > tiny else tiny)
+                c = 1.0 + (num / c)
+                c = c if abs(c) > tiny else tiny
+                h *= d * c
+            if abs((d * c) - 1.0) < 1e-12:
+                break
+        return h
+
+    @staticmethod
+    def calcBetaInc(a,b,x):
+        '''
+        Calculate the regularized incomplete beta function I_x(a,b).
+        @param a,b The parameters of the beta function.
+        @param x The upper limit of the integral, between 0 and 1.
+        @return The value of the function.
+        '''
+        if x <= 0:
+            return 0.0
+        if x >= 1:
+            return 1.0
+        front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) +
+                         (a * math.log(x)) + (b * math.log(1 - x)))
+        if x < (a + 1) / (a + b + 2):
+            return front * StdyState.calcBetaCf(a,b,x) / a
+        return 1 - (front * StdyState.calcBetaCf(b,a,1 - x) / b)
+
+    @staticmethod
+    def calcTConf(t,df):
+        '''
+        Calculate the confidence of a two sided t interval.
+        @param t The half width of the interval in standard errors.
+        @param df Degrees of freedom.
+        @return The probability that the t distribution lies within [-t,t].
+        '''
+        return 1 - StdyState.calcBetaInc(df / 2.0,0.5,df / (df + (t * t)))
+
+    @staticmethod
+    def calcRelCI(ys,level=0.95):
+        '''
+        Calculate the relative half width of the confidence interval of
+        the average of some values.
+        @param ys The values.
+        @param level The confidence level, one of StdyState.tLevels.
+        @return The half width divided by the average, None if there are
+        less than two values or the average is 0.
+        '''
+        n = len(ys)
+        if n < 2:
+            return None
+        avg = sum(ys)/float(n)
+        if avg == 0:
+            return None
+        se = np.std(np.array(ys),ddof=1) / np.sqrt(n)
+        t = StdyState.getTValues(n - 1)[StdyState.tLevels.index(level)]
+        return float(t * se / abs(avg))
+
+    def testSeq(self,xs,ty,tk):
+        '''
+        Carry out one look of the sequential test. The confidence interval
+        of the mean must be within seqTolerance of the mean with the
+        corrected confidence of a look, and the slope excursion of the
+        linear best fit line must be less than 10% of the mean. A look on
+        values that have already been tested is not counted.
+        @param xs The rounds of the window.
+        @param ty The tested values, batch means or round values.
+        @param tk The slope of the linear best fit line of the tested values.
+        @return [True if the steady state is reached,reached confidence,
+        relative half width of the 95% confidence interval or None]
+        '''
+        look = (tuple(xs),len(ty))
+        if look != self.__lastLook:
+            self.__looks += 1
+            self.__lastLook = look
+        n = len(ty)
+        tAvg = sum(ty)/n
+        #standard error of the mean in the window
+        se = 0.0
+        if n > 1:
+            se = np.std(np.array(ty),ddof=1) / np.sqrt(n)
+        #confidence of the interval reaching exactly the tolerance
+        conf = 0.0
+        tol = abs(tAvg) * StdyState.seqTolerance
+        if n > 1 and se == 0:
+            conf = 1.0
+        elif n > 1:
+            conf = StdyState.calcTConf(tol / se,n - 1)
+        stdyState = conf >= self.getLookConf() and len(xs) >= StdyState.seqMinRnds
+        #guard against a steady drift, cf. checkSniaSteadyState
+        slopeExc = abs(tk * (xs[-1] - xs[0]))
+        if slopeExc > abs(tAvg) * 0.10:
+            stdyState = False
+        ci = None
+        if tAvg != 0:
+            ci = float(StdyState.getTValues(n - 1)[StdyState.tLevels.index(0.95)] * se / abs(tAvg))
+        return [stdyState,float(conf),ci]
+
+    def checkRoundSamples(self,xs):
+        '''
+        Check the steady state on the interval samples of the window while
+        its last round runs. Only the sequential test is carried out, once
+        per complete batch of samples of the running round.
+        @param xs The rounds of the window, the last one is running.
+        @return True if the steady state is reached, the round can be stopped.
+        '''
+        if self.__mode != 'seq' or len(xs) < StdyState.seqMinRnds:
+            return False
+        cur = self.__samples[xs[-1]]
+        if len(cur) == 0 or len(cur) % StdyState.sampleBatch != 0:
+            return False
+        batches = self.getBatchMeans(xs)
+        if batches == None:
+            return False
+        tx,ty = batches
+        stdyState,conf,ci = self.testSeq(xs,ty,StdyState.calcSlope(tx,ty)[0])
+        if stdyState:
+            logging.info("# Steady state reached within round " + str(xs[-1]) + ", confidence " + str(conf))
+        return stdyState
+
+    def checkSeqSteadyState(self,xs,ys,rounds):
+        '''
+        Checks if the steady state is reached with a sequential test. It can
+        be carried out after every new value. The confidence interval of the
+        mean of the window must be within seqTolerance of the mean, and the
+        slope excursion of the linear best fit line in the window must be
+        less than 10% of the average. As the test is repeated every look
+        must reach the confidence seqConfidence corrected with a Bonferroni
+        factor for the maximum number of looks, cf. getLookConf.
+        If interval samples are available for the rounds of the window the
+        test is carried out on their batch means instead of the round values.
+        @param xs Values on x axis
+        @param ys Corresponding values for xs on y axis
+        @param rounds Number of carried out rounds
+        @return True if steady state is reached, False if not
+        '''
+        avg = sum(ys)/len(ys)
+        k,d = StdyState.calcSlope(xs,ys)
+        ty,tk = ys,k
+        batches = self.getBatchMeans(xs)
+        if batches != None:
+            ty = batches[1]
+            tk = StdyState.calcSlope(batches[0],ty)[0]
+        stdyState,conf,ci = self.testSeq(xs,ty,tk)
+
+        self.__rounds = rounds
+        self.__stdyRnds = list(xs)
+        self.__stdyValues = list(ys)
+        self.__stdyAvg = avg
+        self.__stdySlope = [k,d]
+        self.__stdyConf = conf
+        self.__stdyCI = ci
+        self.__reachStdyState = stdyState
+        return stdyState
+
+    def checkSniaSteadyState(self,xs,ys,rounds):
         '''
         Checks if the steady is reached for the given values.
         The steady state is defined by the allowed data excursion from the average (+-10%), and
@@ -72,12 +407,8 @@ class StdyState(object):
         if (maxY - minY) > avgRange:
             stdyState = False
 
-        #do linear regression to calculate slope of linear best fit
-        y = np.array(ys)
-        x = np.array(xs)
-        A = np.vstack([x, np.ones(len(x))]).T
-        #calculate k*x+d
-        k, d = np.linalg.lstsq(A, y, rcond=-1)[0]
+        #do linear regression to calculate slope of linear best fit k*x+d
+        k, d = StdyState.calcSlope(xs,ys)
 
         #as we have a measurement window of 4, we calculate
         #the slope excursion in  the window
@@ -127,6 +458,26 @@ class StdyState(object):
         e = etree.SubElement(r,'rndnr')
         e.text = data
 
+        data = json.dumps(self.__mode)
+        e = etree.SubElement(r,'stdymode')
+        e.text = data
+
+        data = json.dumps(self.__stdyConf)
+        e = etree.SubElement(r,'stdyconf')
+        e.text = data
+
+        data = json.dumps(self.__stdyCI)
+        e = etree.SubElement(r,'stdyci')
+        e.text = data
+
+        data = json.dumps(self.__samples)
+        e = etree.SubElement(r,'stdysamples')
+        e.text = data
+
+        data = json.dumps([self.__looks,self.__maxLooks])
+        e = etree.SubElement(r,'stdylooks')
+        e.text = data
+
     def fromXml(self,root):
         '''
         Loads the information about a steady state from XML.
@@ -139,6 +490,17 @@ class StdyState(object):
         self.__stdyAvg = json.loads(root.findtext('stdyavg'))
         self.__reachStdyState = json.loads(root.findtext('reachstdystate'))
         self.__rounds = json.loads(root.findtext('rndnr'))
+        #The sequential test is not available in xml files of older versions
+        if root.findtext('stdymode'):
+            self.__mode = json.loads(root.findtext('stdymode'))
+            self.__stdyConf = json.loads(root.findtext('stdyconf'))
+            self.__stdyCI = json.loads(root.findtext('stdyci'))
+        else:
+            self.__mode = 'snia'
+        if root.findtext('stdysamples'):
+            self.__samples = json.loads(root.findtext('stdysamples'))
+        if root.findtext('stdylooks'):
+            self.__looks,self.__maxLooks = json.loads(root.findtext('stdylooks'))
         logging.info("########### Loading steady state from xml ###########")
         self.toLog()
 
@@ -159,3 +521,8 @@ class StdyState(object):
         logging.info(self.__rounds)
         logging.info("Reached steady state:")
         logging.info(self.__reachStdyState)
+        logging.info("Steady state mode:")
+        logging.info(self.__mode)
+        if self.__mode == 'seq':
+            logging.info("Reached confidence, relative 95% CI half width and looks:")
+            logging.info([self.__stdyConf,self.__stdyCI,self.__looks,self.__maxLooks])
@@ -4,10 +4,40 @@ Created on Oct 3, 2013
 @author: gschoenb
 '''
 
+import logging
+
+import numpy as np
+
 import plots.genPlots as pgp
+import matplotlib
 import matplotlib.pyplot as plt
 
-__colorTable__ = ['#0000FF','#32cd32','#ffff00','#00ffff','#b22222','#9932cc','#ff4500']
+## Qualitative colormaps for a small number of series, the first one with
+## enough colors is used.
+qualColorMaps = ['tab10','tab20']
+## Colormap sampled if there are more series than qualitative colors.
+seriesColorMap = 'viridis'
+## Percentiles shown as spread around the median in the query plots.
+spreadPcts = [25,75]
+
+def getColorMap(name):
+    ''' @return The matplotlib colormap with the given name. '''
+    if hasattr(matplotlib,'colormaps'):
+        return matplotlib.colormaps[name]
+    return matplotlib.cm.get_cmap(name)
+
+def getColors(n):
+    '''
+    Get distinguishable colors for an arbitrary number of series.
+    @param n The number of series.
+    @return A list of n RGBA colors.
+    '''
+    for name in qualColorMaps:
+        cmap = getColorMap(name)
+        if n <= cmap.N:
+            return [cmap(i) for i in range(n)]
+    cmap = getColorMap(seriesColorMap)
+    return [cmap(x) for x in np.linspace(0,1,n)]
 
 def compWriteSatIOPSPlt(testsToPlot, subfolder=None):
     """
@@ -18,6 +48,7 @@ def compWriteSatIOPSPlt(testsToPlot, subfolder=None):
     testsToPlot -- an array of perfTest objects
     """
     plt.clf()#clear plot
+    colors = getColors(len(testsToPlot))
     min_y = 0
     max_y = 0
     max_x = 0
@@ -27,7 +58,7 @@ def compWriteSatIOPSPlt(testsToPlot, subfolder=None):
         x = list(range(rnds + 1))
         #first elem in matrix are iops
         iops_l = test.getRndMatrices()[0]
-        plt.plot(x,iops_l,'-',label=test.getTestname(), color = __colorTable__[i])
+        plt.plot(x,iops_l,'-',label=test.getTestname(), color = colors[i])
         #fetch new min and max from current test values
         min_y,max_y = pgp.getMinMax(iops_l, min_y, max_y)
         if max(x) > max_x:
@@ -57,6 +88,7 @@ def compILPlt(testsToPlot, mode, subfolder=None):
     mode -- the desired test mode (IOPS or Latency)
     """
     plt.clf()#clear plot
+    colors = getColors(len(testsToPlot))
     x = list(range(3))
     width = 1/len(testsToPlot)
     max_y = 0
@@ -74,7 +106,7 @@ def compILPlt(testsToPlot, mode, subfolder=None):
             testVal = [mixWLds[0][6],mixWLds[3][6],mixWLds[6][6]]
         if mode == "LAT":
             testVal = [mixWLds[0][1],mixWLds[1][1],mixWLds[2][1]]
-        plt.bar(x, testVal, width,label=test.getTestname(),color = __colorTable__[i])
+        plt.bar(x, testVal, width,label=test.getTestname(),color = colors[i])
         x = [v + width for v in x]
         if max(testVal) > max_y:
             max_y = max(testVal)
@@ -109,6 +141,7 @@ def compTPPlt(testsToPlot, subfolder=None):
     testsToPlot -- an array of perfTest objects
     """
     plt.clf()#clear plot
+    colors = getColors(len(testsToPlot))
     height = 1/len(testsToPlot)
     ticksy = [(len(testsToPlot)/2) * height, 1 + height + 0.5, 2 + (2 * height) + 0.5 ]
     labelsy = ['8k','64k','1024k']
@@ -124,7 +157,7 @@ def compTPPlt(testsToPlot, subfolder=None):
         pgp.calcMsmtTPTable(test)
         wlds = test.getTables()[0]
         testRTP = [wlds[0][2],wlds[0][1],wlds[0][0]]
-        ax.barh(y, testRTP, height, label=test.getTestname(),color = __colorTable__[i])
+        ax.barh(y, testRTP, height, label=test.getTestname(),color = colors[i])
         y = [v + height for v in y]
         if max(testRTP) > max_x:
             max_x = max(testRTP)
@@ -143,7 +176,7 @@ def compTPPlt(testsToPlot, subfolder=None):
         test = tests.getTests()['tp']
         wlds = test.getTables()[0]
         testRTP = [wlds[1][2],wlds[1][1],wlds[1][0]]
-        ax.barh(y, testRTP, height, label=test.getTestname(),color = __colorTable__[i])
+        ax.barh(y, testRTP, height, label=test.getTestname(),color = colors[i])
         y = [v + height for v in y]
     plt.xlabel("Write Bandwidth (MB/s)")
     plt.xlim(0,max_x*1.05)
@@ -158,3 +191,97 @@ def compTPPlt(testsToPlot, subfolder=None):
         plt.savefig('compTPPlt.png',dpi=300)
     else:
         plt.savefig(subfolder+'/compTPPlt.png',dpi=300)
+
+def getMetricLabel(metric):
+    '''
+    Get the axis label of a metric of the results database.
+    @param metric The metric, e.g. iops, avg-lat, max-lat, p99.9-lat or tp.
+    @return The label including the unit.
+    '''
+    if metric == 'iops':
+        return "IOPS"
+    if metric == 'tp':
+        return "Bandwidth (MB/s)"
+    if metric == 'avg-lat':
+        return "Avg. latency (ms)"
+    if metric == 'max-lat':
+        return "Max. latency (ms)"
+    if metric.startswith('p') and metric.endswith('-lat'):
+        return metric[:-4] + " latency (ms)"
+    return metric
+
+def getSeriesStats(groups):
+    '''
+    Aggregate the values of every series to their median and spread.
+    @param groups A dictionary of series label: list of values.
+    @return A list of [label,number of values,median,lower,upper percentile]
+    sorted by the median.
+    '''
+    stats = []
+    for label,values in groups.items():
+        v = np.asarray(values,dtype=float)
+        lower,upper = np.percentile(v,spreadPcts)
+        stats.append([label,len(v),float(np.median(v)),float(lower),float(upper)])
+    stats.sort(key=lambda s: s[2])
+    return stats
+
+def compQueryPlt(db, testtype, metric, bs=None, workload=None, where=None, params=(),
+                 groupBy=None, subfolder=None):
+    '''
+    Compare the runs of a results database selected by a query. Only the
+    values of the measurement cell are read from the database, they are
+    aggregated per series, e.g. per model. For every series the median is
+    plotted with the spread between the spreadPcts percentiles and the
+    single values, so any number of runs and series can be compared.
+    @param db A ResultsDB object.
+    @param testtype The test of the cell, e.g. iops.
+    @param metric The metric of the cell, e.g. iops, avg-lat, p99.9-lat or tp.
+    @param bs The block size of the cell, e.g. 4k.
+    @param workload The read percentage of the cell, e.g. 0 for write.
+    @param where A SQL condition on the runs, e.g. "model LIKE 'INTEL%'".
+    @param params Parameters of the condition.
+    @param groupBy A list of run columns forming a series, None for model.
+    @param subfolder The folder to store the plot in.
+    @return The filename of the plot, None if no run matches the query.
+    '''
+    groups = db.getCellGroups(testtype,metric,groupBy,where,params,bs,workload)
+    if len(groups) == 0:
+        logging.warning("# No results in database for " + testtype + " " + metric)
+        return None
+    stats = getSeriesStats(groups)
+    cell = [testtype,metric,'all' if bs == None else bs,'all' if workload == None else str(workload)]
+    filename = 'comp-' + '-'.join(cell) + '-Plt.png'
+    if subfolder != None:
+        filename = subfolder + '/' + filename
+    title = testtype.upper() + " " + metric + " at " + cell[2] + " block size, " + cell[3] + " % read"
+    return pgp.renderJob([renderQueryPlt,filename,
+                          [stats,[groups[s[0]] for s in stats],getMetricLabel(metric),title]])
+
+def renderQueryPlt(filename,stats,values,xlabel,title):
+    '''
+    Render the comparison of aggregated series.
+    @param filename The filename of the figure.
+    @param stats The series as [label,count,median,lower,upper], see getSeriesStats.
+    @param values The single values of every series.
+    @param xlabel The label of the metric.
+    @param title The title of the plot.
+    '''
+    fig = pgp.newFigure()
+    #one line per series, the figure grows with the number of series
+    fig.set_size_inches(8,max(4.8,0.3 * len(stats) + 1.5))
+    ax = fig.add_subplot(1,1,1)
+    colors = getColors(len(stats))
+    y = np.arange(len(stats))
+    medians = np.array([s[2] for s in stats])
+    spread = np.array([[s[2] - s[3] for s in stats],[s[4] - s[2] for s in stats]])
+    ax.barh(y,medians,0.6,xerr=spread,color=colors,ecolor='black',capsize=3,alpha=0.8)
+    for i,v in enumerate(values):
+        ax.plot(v,[i] * len(v),'.',color='black',markersize=3,alpha=0.5)
+    ax.set_ylim(-0.7,len(stats) - 0.3)
+    ax.set_yticks(y)
+    ax.set_yticklabels([s[0] + " (n=" + str(s[1]) + ")" for s in stats],fontsize=8)
+    ax.set_xlabel(xlabel + ", median and " + str(spreadPcts[0]) + "-" + str(spreadPcts[1]) + " percentiles")
+    ax.grid(axis='x')
+    fig.suptitle(title,fontweight='bold')
+    fig.tight_layout(rect=[0,0,1,0.95])
+    fig.savefig(filename,dpi=pgp.dpi)
@@ -4,9 +4,13 @@ Created on 09.07.2012
 @author: gschoenb
 '''
 
+import logging
+import multiprocessing
+
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.ticker as ticker
 import matplotlib.colors as pltm
 from mpl_toolkits.mplot3d import Axes3D
@@ -18,7 +22,13 @@ import perfTest.DeviceTests as dt
 
 __matplotVersion__=float('.'.join(matplotlib.__version__.split('.')[0:2]))
 
-def stdyStVerPlt(toPlot,mode):
+## Number of processes rendering the plots, None uses the number of cpus.
+renderProcs = None
+
+## Resolution of the saved figures.
+dpi = 300
+
+def stdyStVerPlt(toPlot,mode,jobs=None):
     '''
     Generate a steady state verification plot.
     The plot includes:
@@ -29,46 +39,55 @@ def stdyStVerPlt(toPlot,mode):
     The figure is saved as SsdTest.Testname-stdyStVerPlt.png.
     @param toPlot A SsdTest object.
     @param mode A string representing the test mode (IOPS|LAT|TP)
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
+    '''
+    stdy = toPlot.getStdyState()
+    filename = toPlot.getTestname()+'-'+mode+'-stdyStVerPlt.png'
+    return addPlot(toPlot,jobs,filename,renderStdyStVerPlt,mode,list(stdy.getStdyRnds()),
+                   list(stdy.getStdyValues()),stdy.getStdyAvg(),list(stdy.getStdySlope()))
+
+def renderStdyStVerPlt(filename,mode,rnds,values,avg,slope):
     '''
-    x = np.array(toPlot.getStdyState().getStdyRnds())
+    Render the steady state verification plot.
+    @param filename The filename of the figure.
+    @param mode A string representing the test mode (IOPS|LAT|TP)
+    @param rnds The rounds of the measurement window.
+    @param values The values of the measurement window.
+    @param avg The average of the measurement window.
+    @param slope Slope and intercept of the best fit line.
+    '''
+    x = np.array(rnds)
     #calculate average and its top and bottom limit
-    av = []
-    avT = []
-    avB = []
-    av.append(toPlot.getStdyState().getStdyAvg())
-    avTop = toPlot.getStdyState().getStdyAvg() * 1.10
-    avBot = toPlot.getStdyState().getStdyAvg() * 0.9
-    avT.append(avTop)
-    avB.append(avBot)
-    av = av * len(x)
-    avT = avT * len(x)
-    avB = avB * len(x)
-
-    plt.clf()#clear
-    plt.plot(x,toPlot.getStdyState().getStdyValues(),'o', label=mode, markersize=10)
-    plt.plot(x, toPlot.getStdyState().getStdySlope()[0]*x + toPlot.getStdyState().getStdySlope()[1], 'r', label='Slope')
-    plt.plot(x, av, '-', color='black',label='Average')
-    plt.plot(x, avT, '--', color='black',label='Top')
-    plt.plot(x, avB, '--', color='black',label='Bottom')
-    
+    av = [avg] * len(x)
+    avT = [avg * 1.10] * len(x)
+    avB = [avg * 0.9] * len(x)
+
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
+    ax.plot(x,values,'o', label=mode, markersize=10)
+    ax.plot(x, slope[0]*x + slope[1], 'r', label='Slope')
+    ax.plot(x, av, '-', color='black',label='Average')
+    ax.plot(x, avT, '--', color='black',label='Top')
+    ax.plot(x, avB, '--', color='black',label='Bottom')
+
     #set the y axes to start at 3/4 of mininum
-    plt.ylim(min(toPlot.getStdyState().getStdyValues())*0.75,max(toPlot.getStdyState().getStdyValues())*1.25)
-    plt.xticks(x)
+    ax.set_ylim(min(values)*0.75,max(values)*1.25)
+    ax.set_xticks(x)
     title = mode + " Steady State Verification Plot"
-    plt.suptitle(title,fontweight='bold')
-    plt.xlabel("Round #")
+    fig.suptitle(title,fontweight='bold')
+    ax.set_xlabel("Round #")
     if mode == "LAT":
-        plt.ylabel("Latency (us)")
+        ax.set_ylabel("Latency (us)")
     if mode == "TP":
-        plt.ylabel("Bandwidth (KB/s)")
+        ax.set_ylabel("Bandwidth (KB/s)")
     if mode == "IOPS":
-        plt.ylabel(mode)
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+        ax.set_ylabel(mode)
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=3, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-'+mode+'-stdyStVerPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-'+mode+'-stdyStVerPlt.png')
+    fig.savefig(filename,dpi=dpi)
 
-def stdyStConvPlt(toPlot,mode):
+def stdyStConvPlt(toPlot,mode,jobs=None):
     '''
     Generate a steady state convergence plot.
     The plot consists of:
@@ -81,72 +100,63 @@ def stdyStConvPlt(toPlot,mode):
     The figure is saved as SsdTest.Testname-stdyStConvPlt.png.
     @param toPlot A SsdTest object.
     @param mode A string representing the test mode (IOPS|LAT)
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
     rnds = toPlot.getStdyState().getRnds()
-    matrices = toPlot.getRndMatrices()
-    bsLens = len(matrices[0][-1])#fetch the number of bs of the first matrix
-    
-    #initialize matrix for plotting
+    rndArr = getRndArray(toPlot.getRndMatrices())
+
+    #switch from round wise to block size wise ordering of values
     if mode == "IOPS":
-        lines = []
-        for i in range(bsLens):
-            lines.append([])
-        for rndMat in matrices:
-            row = rndMat[-1]#last row is random write
-            for i in range(len(row)):
-                lines[i].append(row[i])#switch from row to column wise ordering of values
-    
+        #last row is random write
+        lines = [rndArr[:,-1,:].T.tolist()]
     if mode == "LAT":
-        readLines = []
-        writeLines = []
-        mixLines = []
-        for i in range(bsLens):
-            readLines.append([])
-            writeLines.append([])
-            mixLines.append([])
-        for rndMat in matrices:
-            #take read mat len, every elem has the same len
-            for i in range(len(rndMat[0])):
-                #also convert it from us to ms
-                readLines[i].append((rndMat[0][i][2]) / 1000)#mean latency
-                mixLines[i].append((rndMat[1][i][2]) / 1000)#mean latency
-                writeLines[i].append((rndMat[2][i][2]) / 1000)#mean latency
-    
-    plt.clf()#clear
+        #mean latency of read, mixed and write, converted from us to ms
+        lines = [(rndArr[:,i,:,2].T / 1000).tolist() for i in range(3)]
+
+    filename = toPlot.getTestname()+'-'+mode+'-stdyStConvPlt.png'
+    return addPlot(toPlot,jobs,filename,renderStdyStConvPlt,mode,rnds,list(toPlot.getBsLabels()),lines)
+
+def renderStdyStConvPlt(filename,mode,rnds,bsLabels,lines):
+    '''
+    Render the steady state convergence plot.
+    @param filename The filename of the figure.
+    @param mode A string representing the test mode (IOPS|LAT)
+    @param rnds The number of carried out rounds.
+    @param bsLabels The block size labels.
+    @param lines For IOPS one list of lines per block size, for LAT
+    the lists of read, mixed and write lines.
+    '''
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
 
     #fetch number of rounds, we want to include all rounds
     x = list(range(rnds + 1))
     max_y = 0
     min_y = 0
     if mode == "IOPS":
-        for i in range(len(lines)):
-            min_y,max_y = getMinMax(lines[i], min_y, max_y)
-            plt.plot(x,lines[i],'o-',label='bs='+toPlot.getBsLabels()[i])
+        for i in range(len(lines[0])):
+            min_y,max_y = getMinMax(lines[0][i], min_y, max_y)
+            ax.plot(x,lines[0][i],'o-',label='bs='+bsLabels[i])
     if mode == "LAT":
-        for i in range(len(readLines)):
-            min_y,max_y = getMinMax(readLines[i], min_y, max_y)
-            plt.plot(x,readLines[i],'s-',label='bs='+toPlot.getBsLabels()[i]+' read')
-        for i in range(len(mixLines)):
-            min_y,max_y = getMinMax(mixLines[i], min_y, max_y)
-            plt.plot(x,mixLines[i],'^-',label='bs='+toPlot.getBsLabels()[i]+' mixed')
-        for i in range(len(writeLines)):
-            min_y,max_y = getMinMax(writeLines[i], min_y, max_y)
-            plt.plot(x,writeLines[i],'o-',label='bs='+toPlot.getBsLabels()[i]+' write')
-    
-    plt.xticks(x)
-    plt.suptitle(mode+" Steady State Convergence Plot",fontweight='bold')
-    plt.xlabel("Round #")
-    plt.ylim((min_y*0.75,max_y*1.25))
+        for style,name,wlLines in zip(['s-','^-','o-'],['read','mixed','write'],lines):
+            for i in range(len(wlLines)):
+                min_y,max_y = getMinMax(wlLines[i], min_y, max_y)
+                ax.plot(x,wlLines[i],style,label='bs='+bsLabels[i]+' '+name)
+
+    ax.set_xticks(x)
+    fig.suptitle(mode+" Steady State Convergence Plot",fontweight='bold')
+    ax.set_xlabel("Round #")
+    ax.set_ylim((min_y*0.75,max_y*1.25))
     if mode == "LAT":
-        plt.ylabel("Latency (ms)")
+        ax.set_ylabel("Latency (ms)")
     if mode == "IOPS":
-        plt.ylabel(mode)
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+        ax.set_ylabel(mode)
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=3, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-'+mode+'-stdyStConvPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-'+mode+'-stdyStConvPlt.png')
-    
-def mes2DPlt(toPlot,mode):
+    fig.savefig(filename,dpi=dpi)
+
+def mes2DPlt(toPlot,mode,jobs=None):
     '''
     Generate a measurement 2D plot and the measurement overview table.
     The plot includes:
@@ -160,60 +170,72 @@ def mes2DPlt(toPlot,mode):
     The figure is saved as SsdTest.Testname-mode-mes2DPlt.png.
     @param toPlot A SsdTest object.
     @param mode A string representing the test mode (IOPS|max-LAT|avg-LAT)
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
     # Generate the measurement table
     calcMsmtTable(toPlot, mode)
     if mode == "IOPS":
         wlds = dt.SsdIopsTest.mixWlds
-        bsLabels = toPlot.getBsLabels()
         mixWLds = toPlot.getTables()[0]
     if mode == "avg-LAT" or mode == "max-LAT":
         wlds = dt.SsdLatencyTest.mixWlds
-        bsLabels = toPlot.getBsLabels()
         if mode == "avg-LAT":
             mixWLds = toPlot.getTables()[0]
         if mode == "max-LAT":
             mixWLds = toPlot.getTables()[1]
 
-    plt.clf()#clear plot
-    if mode == "IOPS":
-        x = getBS(toPlot.getBsLabels())
-    if mode == "avg-LAT" or mode == "max-LAT":
-        x = getBS(toPlot.getBsLabels())
-        
+    filename = toPlot.getTestname()+'-'+mode+'-mes2DPlt.png'
+    return addPlot(toPlot,jobs,filename,renderMes2DPlt,mode,list(toPlot.getBsLabels()),
+                   list(wlds),deepcopy(mixWLds))
+
+def renderMes2DPlt(filename,mode,bsLabels,wlds,mixWLds):
+    '''
+    Render the measurement 2D plot.
+    @param filename The filename of the figure.
+    @param mode A string representing the test mode (IOPS|max-LAT|avg-LAT)
+    @param bsLabels The block size labels.
+    @param wlds The read percentages of the workloads.
+    @param mixWLds The measurement table, one row per workload.
+    '''
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
+    x = getBS(bsLabels)
+
     max_y = 0
     min_y = 0
     for i in range(len(mixWLds)):
         min_y,max_y = getMinMax(mixWLds[i], min_y, max_y)
         #the labels are r/w percentage of mixed workload
-        plt.plot(x,mixWLds[i],'o-',
+        ax.plot(x,mixWLds[i],'o-',
                   label=str(wlds[i])+'/'+str(100-wlds[i]))
     if mode == 'IOPS':
-        plt.yscale('log')
-        plt.xscale('log')
-        plt.ylabel(mode)
-        plt.legend(prop={'size':12})
+        ax.set_yscale('log')
+        ax.set_xscale('log')
+        ax.set_ylabel(mode)
+        ax.legend(prop={'size':12})
     if mode == "avg-LAT" or mode == "max-LAT":
-        plt.ylabel("Latency (ms)")
-        plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+        ax.set_ylabel("Latency (ms)")
+        ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=3, fancybox=True, shadow=True,prop={'size':12})
-    
-    plt.xlabel("Block Size (Byte)")
+
+    ax.set_xlabel("Block Size (Byte)")
     #scale axis to min and max
-    plt.ylim((min_y*0.75,max_y*1.15))
-    plt.xticks(x,bsLabels)
-    plt.suptitle(mode+" Measurement Plot",fontweight='bold')
-    plt.savefig(toPlot.getTestname()+'-'+mode+'-mes2DPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-'+mode+'-mes2DPlt.png')
+    ax.set_ylim((min_y*0.75,max_y*1.15))
+    ax.set_xticks(x)
+    ax.set_xticklabels(bsLabels)
+    fig.suptitle(mode+" Measurement Plot",fontweight='bold')
+    fig.savefig(filename,dpi=dpi)
 
-def mes3DPlt(toPlot,mode):
+def mes3DPlt(toPlot,mode,jobs=None):
     '''
     Generate a measurement 3D plot. This plot depends on the
     mes2DPlt as there the measurement overview table is calculated.
     @param toPlot A SsdTest object.
     @param mode A string representing the test mode (IOPS)
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
-    colorTable = ['#0000FF','#008080','#00FFFF','#FFFF00','#00FF00','#FF00FF','#800000']
     if mode == 'IOPS':
         #Iops have only one measurement table
         matrix = deepcopy(toPlot.getTables()[0])
@@ -224,168 +246,200 @@ def mes3DPlt(toPlot,mode):
             row.reverse()
         bsLabels = list(toPlot.getBsLabels())
         mixWlds = list(dt.SsdIopsTest.mixWlds)
-    
+
+    filename = toPlot.getTestname()+'-'+mode+'-mes3DPlt.png'
+    return addPlot(toPlot,jobs,filename,renderMes3DPlt,mode,bsLabels,mixWlds,matrix)
+
+def renderMes3DPlt(filename,mode,bsLabels,mixWlds,matrix):
+    '''
+    Render the measurement 3D plot.
+    @param filename The filename of the figure.
+    @param mode A string representing the test mode (IOPS)
+    @param bsLabels The block size labels.
+    @param mixWlds The read percentages of the workloads.
+    @param matrix The reversed measurement table, starting with 0/100 and 512B.
+    '''
+    colorTable = ['#0000FF','#008080','#00FFFF','#FFFF00','#00FF00','#FF00FF','#800000']
     #define positions for bars
-    ypos = np.array([0.25] * len(bsLabels)) 
+    ypos = np.array([0.25] * len(bsLabels))
     xpos = np.arange(0.25, len(bsLabels)+0.25, 1)
     zpos = np.array([0] * len(bsLabels))
-    
+
     #define widht and height (x,y) of bars
     # z will be the measured values
     dx = np.array([0.5] * len(bsLabels))
     dy = np.array([0.5] * len(bsLabels))
-    
-    plt.clf
-    fig = plt.figure()
+
+    fig = newFigure()
     if __matplotVersion__ >= 1.0:
-        ax = fig.gca(projection='3d')
+        ax = fig.add_subplot(1,1,1,projection='3d')
     else:
         ax = Axes3D(fig)
     for j,wl in enumerate(matrix):
         ax.bar3d(xpos,ypos,zpos, dx, dy, wl, color=pltm.colorConverter.to_rgba_array(colorTable[j]))
         for pos in range(len(ypos)):
             ypos[pos] += 1
-            
+
     ticksx = np.arange(0.5, len(bsLabels), 1)
     bsLabels.reverse()
     ticksy = np.arange(0.5, len(mixWlds), 1)
     mixWlds.reverse()
     if __matplotVersion__ >= 1.0:
-        plt.yticks(ticksy,mixWlds)
-        plt.xticks(ticksx, bsLabels)
+        ax.set_yticks(ticksy)
+        ax.set_yticklabels(mixWlds)
+        ax.set_xticks(ticksx)
+        ax.set_xticklabels(bsLabels)
     else:
         ax.w_xaxis.set_major_locator(ticker.FixedLocator(ticksx))
         ax.w_xaxis.set_ticklabels(bsLabels)
         ax.w_yaxis.set_major_locator(ticker.FixedLocator(ticksy))
         ax.w_yaxis.set_ticklabels(mixWlds)
-    
-    plt.suptitle(mode+" 3D Measurement Plot",fontweight='bold')
+
+    fig.suptitle(mode+" 3D Measurement Plot",fontweight='bold')
     ax.set_xlabel('Block Size (Byte)')
     ax.set_ylabel('R/W Mix%')
     if mode == 'IOPS':
         ax.set_zlabel('IOPS',rotation='vertical')
-    plt.savefig(toPlot.getTestname()+'-'+mode+'-mes3DPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-'+mode+'-mes3DPlt.png')
+    fig.savefig(filename,dpi=dpi)
 
-def latMes3DPlt(toPlot):
+def latMes3DPlt(toPlot,jobs=None):
     '''
     Generate a measurement 3D plot for latency. This plot depends on the
-    mes2DPlt as there the measurement overview table is calculated.
+    mes2DPlt as there the measurement overview table is calculated. If a
+    percentile table has been calculated it is plotted between the average
+    and the max latencies.
     @param toPlot A SsdTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
-    colorTable = ['#0000FF','#008080','#00FFFF']
-    mixWlds = list(dt.SsdLatencyTest.mixWlds)
-    bsLabels = list(toPlot.getBsLabels())
+    matrices = [deepcopy(toPlot.getTables()[0])]
+    if len(toPlot.getTables()) > 2:
+        matrices.append(deepcopy(toPlot.getTables()[2]))
+    matrices.append(deepcopy(toPlot.getTables()[1]))
+    zLabels = ['Avg. Latency (ms)']
+    if len(matrices) > 2:
+        zLabels.append('p' + str(dt.SsdLatencyTest.reportPct) + ' Latency (ms)')
+    zLabels.append('Max. Latency (ms)')
+
+    filename = toPlot.getTestname()+'-LAT-mes3DPlt.png'
+    return addPlot(toPlot,jobs,filename,renderLatMes3DPlt,list(toPlot.getBsLabels()),
+                   list(dt.SsdLatencyTest.mixWlds),matrices,zLabels)
 
-    avgMatrix = deepcopy(toPlot.getTables()[0])
-    maxMatrix = deepcopy(toPlot.getTables()[1])
-    
+def renderLatMes3DPlt(filename,bsLabels,mixWlds,matrices,zLabels):
+    '''
+    Render the latency measurement 3D plot, one subplot per table.
+    @param filename The filename of the figure.
+    @param bsLabels The block size labels.
+    @param mixWlds The read percentages of the workloads.
+    @param matrices The measurement tables to plot.
+    @param zLabels The z axis label of every table.
+    '''
+    colorTable = ['#0000FF','#008080','#00FFFF']
     #define positions for bars
-    ypos = np.array([0.25] * len(bsLabels)) 
     xpos = np.arange(0.25, len(bsLabels)+0.25, 1)
     zpos = np.array([0] * len(bsLabels))
-    
+
     #define widht and height (x,y) of bars
     # z will be the measured values
     dx = np.array([0.5] * len(bsLabels))
     dy = np.array([0.5] * len(bsLabels))
-    
-    plt.clf()
-    fig = plt.figure()
-    if __matplotVersion__ >= 1.0:
-        ax = fig.add_subplot(2, 1, 1, projection='3d')
-    else:
-        rect = fig.add_subplot(2, 1, 1).get_position()
-        ax = Axes3D(fig, rect)
-    for j,wl in enumerate(avgMatrix):
-        ax.bar3d(xpos,ypos,zpos, dx, dy, wl, color=pltm.colorConverter.to_rgba_array(colorTable[j]))
-        for pos in range(len(ypos)):
-            ypos[pos] += 1
-    ax.xaxis.set_ticks([]) 
-    ax.yaxis.set_ticks([])
-    ax.set_zlabel('Latency (ms)',rotation='vertical')
-            
-    #Second subplot
-    if __matplotVersion__ >= 1.0:
-        ax = fig.add_subplot(2,1,2, projection='3d')
-    else:
-        rect = fig.add_subplot(2, 1, 2).get_position()
-        ax = Axes3D(fig, rect)
-    #reset ypos
-    ypos = np.array([0.25] * len(bsLabels)) 
-    for j,wl in enumerate(maxMatrix):
-        ax.bar3d(xpos,ypos,zpos, dx, dy, wl, color=pltm.colorConverter.to_rgba_array(colorTable[j]))
-        for pos in range(len(ypos)):
-            ypos[pos] += 1
-            
+
+    fig = newFigure()
+    for m,matrix in enumerate(matrices):
+        if __matplotVersion__ >= 1.0:
+            ax = fig.add_subplot(len(matrices), 1, m + 1, projection='3d')
+        else:
+            rect = fig.add_subplot(len(matrices), 1, m + 1).get_position()
+            ax = Axes3D(fig, rect)
+        #reset ypos for every subplot
+        ypos = np.array([0.25] * len(bsLabels))
+        for j,wl in enumerate(matrix):
+            ax.bar3d(xpos,ypos,zpos, dx, dy, wl, color=pltm.colorConverter.to_rgba_array(colorTable[j]))
+            for pos in range(len(ypos)):
+                ypos[pos] += 1
+        ax.set_zlabel(zLabels[m],rotation='vertical')
+        #only the last subplot gets ticks
+        if m != len(matrices) - 1:
+            ax.xaxis.set_ticks([])
+            ax.yaxis.set_ticks([])
+
     ticksx = np.arange(0.5, len(bsLabels), 1)
     ticksy = np.arange(0.5, len(mixWlds), 1)
     if __matplotVersion__ >= 1.0:
-        plt.xticks(ticksx, bsLabels)
-        plt.yticks(ticksy,mixWlds)
+        ax.set_xticks(ticksx)
+        ax.set_xticklabels(bsLabels)
+        ax.set_yticks(ticksy)
+        ax.set_yticklabels(mixWlds)
     else:
         ax.w_xaxis.set_major_locator(ticker.FixedLocator(ticksx))
         ax.w_xaxis.set_ticklabels(bsLabels)
         ax.w_yaxis.set_major_locator(ticker.FixedLocator(ticksy))
         ax.w_yaxis.set_ticklabels(mixWlds)
 
-    plt.suptitle("LAT 3D Measurement Plot",fontweight='bold')
+    fig.suptitle("LAT 3D Measurement Plot",fontweight='bold')
     #ax.set_xlabel('Block Size (Byte)')
     ax.set_ylabel('R/W Mix%')
-    ax.set_zlabel('Latency (ms)',rotation='vertical')
-    plt.savefig(toPlot.getTestname()+'-LAT-mes3DPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-LAT-mes3DPlt.png')
+    fig.savefig(filename,dpi=dpi)
 
-def writeSatIOPSPlt(toPlot):
-    #fetch number of rounds, we want to include all rounds
-    #as stdy state was reached at rnds, it must be included
-    rnds = toPlot.getRnds()
-    x = list(range(rnds + 1))
-    
-    iops_l = toPlot.getRndMatrices()[0]#first elem in matrix are iops
+def writeSatIOPSPlt(toPlot,jobs=None):
+    '''
+    Generate the IOPS plot of the write saturation test.
+    @param toPlot A SsdTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
+    '''
+    iops_l = list(toPlot.getRndMatrices()[0])#first elem in matrix are iops
+    filename = toPlot.getTestname()+'-writeSatIOPSPlt.png'
+    return addPlot(toPlot,jobs,filename,renderWriteSatPlt,toPlot.getRnds(),iops_l,
+                   'Avg IOPS',"IOPS")
 
-    plt.clf()#clear plot        
-    plt.plot(x,iops_l,'-',label='Avg IOPS')
-    plt.ylim(min(iops_l)*0.75,max(iops_l)*1.25)
-    #every 10 rounds print the round number
-    x = list(range(0,rnds + 1,50))
-    plt.xticks(x)
-    plt.suptitle("Write Saturation Test",fontweight='bold')
-    plt.xlabel("Round #")
-    plt.ylabel("IOPS")
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
-               ncol=1, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-writeSatIOPSPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-writeSatIOPSPlt.png')
-    
-def writeSatLatPlt(toPlot):
-    rnds = toPlot.getRnds()
-    x = list(range(rnds + 1))
-    
+def writeSatLatPlt(toPlot,jobs=None):
+    '''
+    Generate the latency plot of the write saturation test.
+    @param toPlot A SsdTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
+    '''
     lats_l = toPlot.getRndMatrices()[1]#second elem in matrix are latencies
-    
+
     #get the average latencies from the lat list (last elem)
     av_lats = []
     for i in lats_l:
         #convert from us to ms
         av_lats.append((i[2]) / 1000)
-    
-    plt.clf()#clear plot
-    plt.plot(x,av_lats,'-',label='Avg latency')
+    filename = toPlot.getTestname()+'-writeSatLatPlt.png'
+    return addPlot(toPlot,jobs,filename,renderWriteSatPlt,toPlot.getRnds(),av_lats,
+                   'Avg latency',"Latency (ms)")
+
+def renderWriteSatPlt(filename,rnds,values,label,ylabel):
+    '''
+    Render a plot of the write saturation test.
+    @param filename The filename of the figure.
+    @param rnds The number of carried out rounds.
+    @param values The value of every round.
+    @param label The legend label of the values.
+    @param ylabel The label of the y axes.
+    '''
+    #fetch number of rounds, we want to include all rounds
+    #as stdy state was reached at rnds, it must be included
+    x = list(range(rnds + 1))
+
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
+    ax.plot(x,values,'-',label=label)
     #set the y axes to start at 3/4 of mininum
-    plt.ylim(min(av_lats)*0.75,max(av_lats)*1.25)
+    ax.set_ylim(min(values)*0.75,max(values)*1.25)
     #every 50 rounds print the round number
     x = list(range(0,rnds + 1,50))
-    plt.xticks(x)
-    plt.suptitle("Write Saturation Test",fontweight='bold')
-    plt.xlabel("Round #")
-    plt.ylabel("Latency (ms)")
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+    ax.set_xticks(x)
+    fig.suptitle("Write Saturation Test",fontweight='bold')
+    ax.set_xlabel("Round #")
+    ax.set_ylabel(ylabel)
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=1, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-writeSatLatPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-writeSatLatPlt.png')
-    
-def tpRWStdyStConvPlt(toPlot):
+    fig.savefig(filename,dpi=dpi)
+
+def tpRWStdyStConvPlt(toPlot,jobs=None):
     '''
     Generate one steady state convergence plot for throughput read and write measurements.
     The plot consists of:
@@ -396,62 +450,59 @@ def tpRWStdyStConvPlt(toPlot):
     The top plot is write, below read
     The figure is saved as SsdTest.Testname-TP-RW-stdyStConvPlt.png.
     @param toPlot A SsdTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
-    matrices = deepcopy(toPlot.getRndMatrices())
     rnds = toPlot.getStdyState().getRnds()#fetch the number of total rounds
-    bsLens = len(matrices)#fetch the number of bs, each row is a bs in the matrix
-    bsLabels = toPlot.getBsLabels()
-    
-    #initialize matrix for plotting
-    lines = []
-    for i in range(bsLens):
-        lines.append([])
-    
+    #convert to MB/s, each row of the matrix is a block size
+    matrices = getMBMatrices(toPlot)
+
+    filename = toPlot.getTestname()+'-TP-RW-stdyStConvPlt.png'
+    return addPlot(toPlot,jobs,filename,renderTpRWStdyStConvPlt,rnds,
+                   list(toPlot.getBsLabels()),matrices)
+
+def renderTpRWStdyStConvPlt(filename,rnds,bsLabels,matrices):
+    '''
+    Render the throughput steady state convergence plot.
+    @param filename The filename of the figure.
+    @param rnds The number of carried out rounds.
+    @param bsLabels The block size labels.
+    @param matrices Read and write bandwidths in MB/s for every block size.
+    '''
     #values for scaling the axes
     max_y = 0
     min_y = 0
-    
-    plt.clf()#clear
+
     x = list(range(rnds+1))#ensure to include all rounds
-    
-    plt.clf
-    fig = plt.figure()
+
+    fig = newFigure()
     ax = fig.add_subplot(2, 1, 1)
     for i,rndMat in enumerate(matrices):
         row = rndMat[1]#plot the write row
-        #convert to MB/s
-        for v in range(len(row)):
-            row[v] = row[v] / 1024
         #calc min,man to scale axes
         min_y,max_y = getMinMax(row, min_y, max_y)
         ax.plot(x,row,'o-',label='bs='+bsLabels[i])
-    plt.xticks(x)
-    plt.ylim((0,max_y*1.15))
-    plt.legend()
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.10),
+    ax.set_xticks(x)
+    ax.set_ylim((0,max_y*1.15))
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.10),
                ncol=5, fancybox=True, shadow=True,prop={'size':11})
-    plt.ylabel("Write TP (MB/s)")
-     
+    ax.set_ylabel("Write TP (MB/s)")
+
     ax = fig.add_subplot(2, 1, 2)
     for i,rndMat in enumerate(matrices):
         row = rndMat[0]#plot the read row
-        #convert to MB/s
-        for v in range(len(row)):
-            row[v] = row[v] / 1024
         #calc min,man to scale axes
         min_y,max_y = getMinMax(row, min_y, max_y)
         ax.plot(x,row,'o-',label='bs='+bsLabels[i])
-    plt.xticks(x)
-    plt.ylim((0,max_y*1.15))
-    plt.ylabel("Read TP (MB/s)")
-
-    plt.xlabel("Round #")
-    plt.suptitle("TP R/W Steady State Convergence Plot",fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_ylim((0,max_y*1.15))
+    ax.set_ylabel("Read TP (MB/s)")
 
-    plt.savefig(toPlot.getTestname()+'-TP-RW-stdyStConvPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-TP-RW-stdyStConvPlt.png')
+    ax.set_xlabel("Round #")
+    fig.suptitle("TP R/W Steady State Convergence Plot",fontweight='bold')
+    fig.savefig(filename,dpi=dpi)
 
-def tpMes2DPlt(toPlot):
+def tpMes2DPlt(toPlot,jobs=None):
     '''
     Generate a measurement 2D plot and the measurement overview table for throughput.
     The plot includes:
@@ -462,31 +513,43 @@ def tpMes2DPlt(toPlot):
     the average over the measurement window for each block size.
     The figure is saved as SsdTest.Testname-bw-mes2DPlt.png.
     @param toPlot A SsdTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
     calcMsmtTPTable(toPlot)
-    wlds = toPlot.getTables()[0]
-    #start plotting
-    plt.clf()#clear
-    x = getBS(toPlot.getBsLabels())
+    filename = toPlot.getTestname()+'-TP-mes2DPlt.png'
+    return addPlot(toPlot,jobs,filename,renderTpMes2DPlt,list(toPlot.getBsLabels()),
+                   deepcopy(toPlot.getTables()[0]))
+
+def renderTpMes2DPlt(filename,bsLabels,wlds):
+    '''
+    Render the throughput measurement 2D plot.
+    @param filename The filename of the figure.
+    @param bsLabels The block size labels.
+    @param wlds The measurement table, read and write row.
+    '''
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
+    x = getBS(bsLabels)
     for i in range(len(wlds)):
         if i == 0:
             label = "read"
         else:
             label = "write"
-        plt.plot(x,wlds[i],'o-',label=label)
-
-    plt.xscale('log')
-    plt.suptitle("TP Measurement Plot",fontweight='bold')
-    plt.xlabel("Block Size (Byte)")
-    plt.ylabel("Bandwidth (MB/s)")
-    plt.xticks(x,toPlot.getBsLabels())
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+        ax.plot(x,wlds[i],'o-',label=label)
+
+    ax.set_xscale('log')
+    fig.suptitle("TP Measurement Plot",fontweight='bold')
+    ax.set_xlabel("Block Size (Byte)")
+    ax.set_ylabel("Bandwidth (MB/s)")
+    ax.set_xticks(x)
+    ax.set_xticklabels(bsLabels)
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=3, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-TP-mes2DPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-TP-mes2DPlt.png')
+    fig.savefig(filename,dpi=dpi)
 
 ######### PLOTS FOR HDD TESTS #########
-def TPplot(toPlot):
+def TPplot(toPlot,jobs=None):
     '''
     Generate a R/W throughput measurement plot for the hdd round results.
     The plot consists of:
@@ -495,72 +558,77 @@ def TPplot(toPlot):
     -y axes is the bandwidth of the corresponding round
     The figure is saved as TPTest.Testname-TP-RW-Plt.png.
     @param toPlot A hdd TPTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
+    '''
+    filename = toPlot.getTestname()+'-TP-RW-Plt.png'
+    return addPlot(toPlot,jobs,filename,renderTPplot,dt.HddTPTest.maxRnds,
+                   list(toPlot.getBsLabels()),getMBMatrices(toPlot))
+
+def renderTPplot(filename,rnds,bsLabels,matrices):
+    '''
+    Render the hdd throughput measurement plot.
+    @param filename The filename of the figure.
+    @param rnds The number of carried out rounds.
+    @param bsLabels The block size labels.
+    @param matrices Read and write bandwidths in MB/s for every block size.
     '''
-    #As the values are converted to KB, copy the matrices
-    matrices = deepcopy(toPlot.getRndMatrices())
-    rnds = dt.HddTPTest.maxRnds
-    bsLabels = toPlot.getBsLabels()
-    
     #values for scaling the axes
     max_y = 0
     min_y = 0
-    
-    plt.clf()#clear
+
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
     x = list(range(rnds))
     for i,rndMat in enumerate(matrices):
-        #convert to MB/S
-        for v in range(len(rndMat[0])):
-            rndMat[0][v] = (rndMat[0][v]) / 1024
         #plot the read row for current BS
         min_y,max_y = getMinMax(rndMat[0], min_y, max_y)
-        plt.plot(x,rndMat[0],'o-',label='read bs='+bsLabels[i])
+        ax.plot(x,rndMat[0],'o-',label='read bs='+bsLabels[i])
         #plot the write row for current BS
-        for v in range(len(rndMat[1])):
-            rndMat[1][v] = (rndMat[1][v]) / 1024
         min_y,max_y = getMinMax(rndMat[1], min_y, max_y)
-        plt.plot(x,rndMat[1],'o-',label='write bs='+bsLabels[i])
-    
+        ax.plot(x,rndMat[1],'o-',label='write bs='+bsLabels[i])
+
     x = list(range(0,rnds+1,16))
-    plt.xticks(x)
-    plt.suptitle("TP Measurement Plot",fontweight='bold')    
-    plt.xlabel("Area of Device (in rounds)")
-    plt.ylabel("Bandwidth (MB/s)")
+    ax.set_xticks(x)
+    fig.suptitle("TP Measurement Plot",fontweight='bold')
+    ax.set_xlabel("Area of Device (in rounds)")
+    ax.set_ylabel("Bandwidth (MB/s)")
     #scale axis to min and max +- 15%
-    plt.ylim((min_y*0.6,max_y*1.15))
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+    ax.set_ylim((min_y*0.6,max_y*1.15))
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=2, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-TP-RW-Plt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-TP-RW-Plt.png')
+    fig.savefig(filename,dpi=dpi)
 
-def IOPSplot(toPlot):
+def IOPSplot(toPlot,jobs=None):
     '''
     Generate the IOPS plot for a hdd performance test. The plot consists
     of plotting the IOPS results from the 128 rounds that have been carried
     out. In each round the mixed workloads and all block sizes are plotted.
     @param toPlot An hdd IopsTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
-    rnds = dt.HddIopsTest.maxRnds
-    matrices = toPlot.getRndMatrices()
-    
     wlds = dt.HddIopsTest.mixWlds
     bsLabels = toPlot.getBsLabels()
-    
-    #each row will be a workload percentage
-    mixWLds = []
-    for i in range(len(wlds)):
-        mixWLds.append([])
-        #in each row will be the different block sizes
-        for bs in range(len(bsLabels)):
-            mixWLds[i].append([])
-            
-    for rnd in matrices:
-        #each round has its workloads
-        for i,row in enumerate(rnd):
-            #each workload has its block sizes
-            for j,bs in enumerate(row):
-                mixWLds[i][j].append(bs)
-
-    plt.clf()#clear
+    #each row will be a workload percentage, in each row will be the
+    #different block sizes with the IOPS of all rounds
+    mixWLds = getRndArray(toPlot.getRndMatrices()).transpose(1,2,0).tolist()
+
+    filename = toPlot.getTestname()+'-IOPSPlt.png'
+    return addPlot(toPlot,jobs,filename,renderIOPSplot,dt.HddIopsTest.maxRnds,
+                   list(bsLabels),list(wlds),mixWLds)
+
+def renderIOPSplot(filename,rnds,bsLabels,wlds,mixWLds):
+    '''
+    Render the hdd IOPS plot.
+    @param filename The filename of the figure.
+    @param rnds The number of carried out rounds.
+    @param bsLabels The block size labels.
+    @param wlds The read percentages of the workloads.
+    @param mixWLds The IOPS of every round per workload and block size.
+    '''
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
     x = list(range(rnds))
     max_y = 0
     min_y = 0
@@ -579,21 +647,20 @@ def IOPSplot(toPlot):
             if j == 2:
                 ls = '^-'
             min_y,max_y = getMinMax(mixWLds[i][j], min_y, max_y)
-            plt.plot(x,mixWLds[i][j],ls,color=lc,
+            ax.plot(x,mixWLds[i][j],ls,color=lc,
                   label=str(wlds[i])+'/bs=' + bsLabels[j])
     x = list(range(0,rnds + 1,16))
-    plt.xticks(x)
-    plt.suptitle("IOPS Measurement Plot",fontweight='bold')
-    plt.xlabel("Area of Device (in rounds)")
-    plt.ylabel("IOPS")
-    #plt.yscale('log')
-    plt.ylim((min_y*0.75,max_y*1.25))
-    plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
+    ax.set_xticks(x)
+    fig.suptitle("IOPS Measurement Plot",fontweight='bold')
+    ax.set_xlabel("Area of Device (in rounds)")
+    ax.set_ylabel("IOPS")
+    #ax.set_yscale('log')
+    ax.set_ylim((min_y*0.75,max_y*1.25))
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=3, fancybox=True, shadow=True,prop={'size':12})
-    plt.savefig(toPlot.getTestname()+'-IOPSPlt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-IOPSPlt.png')
-    
-def TPBoxPlot(toPlot):
+    fig.savefig(filename,dpi=dpi)
+
+def TPBoxPlot(toPlot,jobs=None):
     '''
     Generate a R/W throughput box plot for the hdd round results.
     The plot consists of:
@@ -602,110 +669,157 @@ def TPBoxPlot(toPlot):
     -y axes is the bandwidth of the corresponding round
     The figure is saved as TPTest.Testname-TP-RW-Plt.png.
     @param toPlot A hdd TPTest object.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @return The filename of the figure.
     '''
-    #As the values are converted to KB, copy the matrices
-    matrices = deepcopy(toPlot.getRndMatrices())
-    bsLabels = toPlot.getBsLabels()
-    
-    plt.clf()#clear
+    filename = toPlot.getTestname()+'-TP-Boxplt.png'
+    return addPlot(toPlot,jobs,filename,renderTPBoxPlot,list(toPlot.getBsLabels()),
+                   getMBMatrices(toPlot))
+
+def renderTPBoxPlot(filename,bsLabels,matrices):
+    '''
+    Render the hdd throughput box plot.
+    @param filename The filename of the figure.
+    @param bsLabels The block size labels.
+    @param matrices Read and write bandwidths in MB/s for every block size.
+    '''
+    fig = newFigure()
+    ax = fig.add_subplot(1,1,1)
     boxes = []
     min_y = 0
     max_y = 0
     for bsRows in matrices:
         #For each BS we have read and write, both rows have equal length
-        for v in range(len(bsRows[0])):
-            bsRows[0][v] = (bsRows[0][v]) / 1024
-            bsRows[1][v] = (bsRows[1][v]) / 1024
         boxes.append(bsRows[0])
         min_y,max_y = getMinMax(bsRows[0], min_y, max_y)
         boxes.append(bsRows[1])
         min_y,max_y = getMinMax(bsRows[1], min_y, max_y)
     #Length of BS per R/W
     pos = list(range(len(bsLabels) * 2))
-    plt.boxplot(boxes,positions=pos)
+    ax.boxplot(boxes,positions=pos)
     labels = []
     for l in bsLabels:
         labels.append(l + ' (R)')
         labels.append(l + ' (W)')
-    plt.xticks(pos,labels)
-    plt.xlabel('BS (Mode)')
-    plt.suptitle("TP Boxplot",fontweight='bold')    
-    plt.ylabel("Bandwidth (MB/s)")
+    ax.set_xticks(pos)
+    ax.set_xticklabels(labels)
+    ax.set_xlabel('BS (Mode)')
+    fig.suptitle("TP Boxplot",fontweight='bold')
+    ax.set_ylabel("Bandwidth (MB/s)")
     #scale axis to min and max +- 15%
-    plt.ylim((min_y*0.7,max_y*1.10))
+    ax.set_ylim((min_y*0.7,max_y*1.10))
     #Draw some fake data for legend
-    hB, = plt.plot([1,1],'b-')
-    hR, = plt.plot([1,1],'r-')
-    plt.legend((hB, hR),('Quartiles', 'Median'),loc='upper center', bbox_to_anchor=(0.5, 1.07),
+    hB, = ax.plot([1,1],'b-')
+    hR, = ax.plot([1,1],'r-')
+    ax.legend((hB, hR),('Quartiles', 'Median'),loc='upper center', bbox_to_anchor=(0.5, 1.07),
                ncol=2, fancybox=True, shadow=True,prop={'size':12})
     hB.set_visible(False)
     hR.set_visible(False)
-    plt.savefig(toPlot.getTestname()+'-TP-Boxplt.png',dpi=300)
-    toPlot.addFigure(toPlot.getTestname()+'-TP-Boxplt.png')
+    fig.savefig(filename,dpi=dpi)
+
+######### RENDERING OF PLOTS #########
+def newFigure():
+    '''
+    Create a new figure drawn by the Agg canvas. The figure does not use
+    the global pyplot state, therefore figures can be rendered concurrently.
+    @return The new Figure object.
+    '''
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+def addPlot(toPlot,jobs,filename,render,*args):
+    '''
+    Add a figure to a test and render it or queue its rendering.
+    @param toPlot The test object the figure belongs to.
+    @param jobs A list to queue the rendering in, None to render immediately.
+    @param filename The filename of the figure.
+    @param render The render function, called with the filename and args.
+    @param args Picklable arguments of the render function.
+    @return The filename of the figure.
+    '''
+    toPlot.addFigure(filename)
+    job = [render,filename,args]
+    if jobs == None:
+        return renderJob(job)
+    jobs.append(job)
+    return filename
+
+def renderJob(job):
+    '''
+    Render a queued figure.
+    @param job A list of render function, filename and arguments.
+    @return The filename of the rendered figure.
+    '''
+    render,filename,args = job
+    render(filename,*args)
+    return filename
+
+def renderPlots(jobs,procs=None):
+    '''
+    Render queued figures in a pool of processes.
+    @param jobs The list of queued render jobs.
+    @param procs Number of processes, if None renderProcs is used.
+    @return The list of filenames of the rendered figures.
+    '''
+    if procs == None:
+        procs = renderProcs
+    if procs == None:
+        procs = multiprocessing.cpu_count()
+    procs = min(procs,len(jobs))
+    if procs <= 1:
+        return [renderJob(j) for j in jobs]
+    logging.info("# Rendering " + str(len(jobs)) + " plots with " + str(procs) + " processes")
+    pool = multiprocessing.get_context('fork').Pool(procs)
+    try:
+        #one job per task, the 3D plots take much longer than the others
+        files = pool.map(renderJob,jobs,chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return files
 
 ######### HELPER FUNCTIONS TO GENERATE PLOTS #########
 def calcMsmtTable(toPlot,mode):
     '''
     Generate the measurement overview table for IOPS and Latency. The table is
     an overview over the average values in the measurement window. For latency
-    the values are converted from us to ms also.
+    the values are converted from us to ms also. For a percentile the higher
+    value of the read and write completion latency percentile is taken. If
+    clat histograms are available the percentile is calculated from the
+    histograms merged over the measurement window.
     @param toPlot A SsdTest object.
-    @param mode A string representing the test mode (IOPS|max-LAT|avg-LAT)
+    @param mode A string representing the test mode (IOPS|max-LAT|avg-LAT|pXX-LAT),
+    e.g. p99.9-LAT for the 99.9th percentile.
     '''
-    mixWLds = []
-    mesWin = toPlot.getStdyState().getStdyRnds() #get measurement window, only include these values
-    if mode == "IOPS":
-        wlds = dt.SsdIopsTest.mixWlds
-        bsLabels = toPlot.getBsLabels()
-    if mode == "avg-LAT" or mode == "max-LAT":
-        wlds = dt.SsdLatencyTest.mixWlds
-        bsLabels = toPlot.getBsLabels()
+    mesWin = list(toPlot.getStdyState().getStdyRnds()) #get measurement window, only include these values
+    if mode.startswith("p") and mode.endswith("-LAT"):
+        pct = float(mode[1:-4])
+        winHists = toPlot.getWindowHistograms()
+        if winHists != None:
+            #percentiles of the merged histograms are exact for the whole window
+            table = np.array([[max(bs[0].getPercentile(pct),bs[1].getPercentile(pct)) for bs in row]
+                              for row in winHists],dtype=float)
+        else:
+            #rounds x workloads x block sizes x read/write x percentiles
+            pctIdx = dt.SsdLatencyTest.percentiles.index(pct)
+            rndArr = getRndArray(toPlot.getPctMatrices())[mesWin]
+            #use the higher percentile of read and write for each block size
+            table = rndArr[:,:,:,:,pctIdx].max(axis=3).mean(axis=0)
+        #convert to ms
+        toPlot.addTable((table / 1000).tolist())
+        return
 
-    #each row will be a workload percentage
-    for i in range(len(wlds)):
-        mixWLds.append([])
-        #in each row will be the different block sizes
-        for bs in range(len(bsLabels)):
-            mixWLds[i].append(0)
-    matrices = toPlot.getRndMatrices()
-
-    #as j does not necessarily start from 0, we need k
-    #to calculate the average iteratively
-    k = 0
-    #limit the matrices to the measurement window
-    for j in mesWin:
-        rndMat = matrices[j]
-        #each row is a percentage of a workload
-        for i,row in enumerate(rndMat):
-            #in each row are the different block sizes
-            for bs in range(len(row)):
-                #calculate average iteratively
-                if mixWLds[i][bs] != 0:
-                    #calculate max latency or continue with average
-                    if mode == "max-LAT":
-                        if row[bs][1] > mixWLds[i][bs]:
-                            mixWLds[i][bs] = row[bs][1]#max latency
-                    else:
-                        mixWLds[i][bs] *= k
-                        if mode == "IOPS":
-                            mixWLds[i][bs] += row[bs]#IOPS
-                        if mode == "avg-LAT":
-                            mixWLds[i][bs] += row[bs][2]#mean latency
-                        mixWLds[i][bs] = (mixWLds[i][bs]) / (k+1)
-                else:
-                    if mode == "IOPS":
-                        mixWLds[i][bs] = row[bs]#IOPS
-                    if mode == "max-LAT":
-                        mixWLds[i][bs] = row[bs][1]#max latency
-                    if mode == "avg-LAT":
-                        mixWLds[i][bs] = row[bs][2]#mean latency
-        k += 1
-    #for latency convert to ms
-    for i in range(len(mixWLds)):
-        if mode == "avg-LAT" or mode == "max-LAT":
-            for v in range(len(mixWLds[i])):
-                mixWLds[i][v] = (mixWLds[i][v]) / 1000
-    toPlot.addTable(mixWLds)
+    #IOPS: rounds x workloads x block sizes
+    #latency: rounds x workloads x block sizes x [min,max,mean]
+    rndArr = getRndArray(toPlot.getRndMatrices())[mesWin]
+    if mode == "IOPS":
+        table = rndArr.mean(axis=0)
+    if mode == "max-LAT":
+        table = rndArr[:,:,:,1].max(axis=0) / 1000
+    if mode == "avg-LAT":
+        table = rndArr[:,:,:,2].mean(axis=0) / 1000
+    toPlot.addTable(table.tolist())
 
 def calcMsmtTPTable(toPlot):
     '''
@@ -713,36 +827,29 @@ def calcMsmtTPTable(toPlot):
     an overview over the average values in the measurement window. 
     @param toPlot A SsdTest object.
     '''
-    wlds = [] #read and write workload mode
-    #one row for read, one for write
-    for i in range(2):
-        wlds.append([])
-        #in each row will be the different block sizes
-        for bs in range(len(toPlot.getBsLabels())):
-            wlds[i].append(0)
-    matrices = deepcopy(toPlot.getRndMatrices())
-    #each row of the matrix is a block size
-    for j,bs in enumerate(matrices):
-        #each block size has read and write
-        for i,row in enumerate(bs):
-            #as rnd does not need to start at 0
-            #we need k to calculate average
-            k = 0
-            #read and write have their round values
-            for rnd in toPlot.getStdyState().getStdyRnds():
-                #calculate average iteratively
-                if wlds[i][j] != 0:
-                    wlds[i][j] *= k
-                    wlds[i][j] += row[rnd]
-                    wlds[i][j] = (wlds[i][j]) / (k+1)
-                else:
-                    wlds[i][j] = row[rnd]
-                k += 1
-    #Convert to MB/s
-    for i in range(len(wlds)):
-        for v in range(len(wlds[i])):
-            wlds[i][v] = (wlds[i][v]) / 1024
-    toPlot.addTable(wlds)
+    #block sizes x read/write x rounds
+    rndArr = getRndArray(toPlot.getRndMatrices())
+    table = rndArr[:,:,list(toPlot.getStdyState().getStdyRnds())].mean(axis=2)
+    #one row for read, one for write, converted to MB/s
+    toPlot.addTable((table.T / 1024).tolist())
+
+def getRndArray(matrices):
+    '''
+    Convert the round matrices of a test to a NumPy array, e.g. of the shape
+    rounds x workloads x block sizes x metric for the latency test.
+    @param matrices A list of round matrices, all with the same dimensions.
+    @return A float array of the matrices.
+    '''
+    return np.asarray(matrices,dtype=float)
+
+def getMBMatrices(toPlot):
+    '''
+    Get the round matrices of a throughput test with the
+    bandwidths converted to MB/s.
+    @param toPlot A hdd or ssd TPTest object.
+    @return The converted matrices, read and write row for every block size.
+    '''
+    return (getRndArray(toPlot.getRndMatrices()) / 1024).tolist()
 
 def getBS(bsLabels):
     '''
@@ -0,0 +1,195 @@
+''' @package NpzReport
+A module storing the result matrices in a memory mappable npz file.
+'''
+import logging
+import os
+import shutil
+import struct
+import zipfile
+
+import numpy as np
+
+class NpzReport(object):
+    '''
+    Stores the numeric results of the device tests, e.g. the round matrices,
+    in an uncompressed npz file next to the xml file. The xml file only
+    references the arrays. As the npz members are stored uncompressed the
+    arrays are mapped into memory when loading instead of being parsed.
+    '''
+    ## Suffix of the member holding the length of a list that is not a
+    ## rectangular array, its elements are stored as key.0, key.1, ...
+    lenSuffix = '.len'
+
+    def __init__(self,testname):
+        '''
+        Constructor
+        @param testname Name of the performance test, the file is testname.npz
+        '''
+        ## Path of the npz file
+        self.__path = testname + '.npz'
+        ## Arrays to write, member name: array
+        self.__arrays = {}
+        ## Members of the loaded file, member name: [offset,dtype,shape,fortran order]
+        self.__members = {}
+
+    def getPath(self): return self.__path
+    def getFilename(self): return os.path.basename(self.__path)
+    def getArrays(self): return self.__arrays
+
+    @staticmethod
+    def toList(data):
+        '''
+        Convert data loaded from a npz file back to nested lists, e.g. to
+        write it as json.
+        @param data Arrays or lists of arrays.
+        @return The data as nested lists.
+        '''
+        if isinstance(data,np.ndarray):
+            return data.tolist()
+        if isinstance(data,(list,tuple)):
+            return [NpzReport.toList(d) for d in data]
+        return data
+
+    @staticmethod
+    def copy(data):
+        '''
+        Copy data loaded from a npz file into memory, the copy does not
+        depend on the file anymore.
+        @param data Arrays or lists of arrays.
+        @return The data with in memory arrays.
+        '''
+        if isinstance(data,np.ndarray):
+            return np.array(data)
+        if isinstance(data,(list,tuple)):
+            return [NpzReport.copy(d) for d in data]
+        return data
+
+    def addData(self,key,data):
+        '''
+        Add numeric data to the report. Nested lists that are not a rectangular
+        array, e.g. the IOPS and latencies of the write saturation test, are
+        stored per element.
+        @param key The name of the data, e.g. iops.roundmat.
+        @param data A list of numbers, nested lists or an array.
+        @return True if the data has been added, False if it is not numeric.
+        '''
+        arrays = {}
+        if not self.toArrays(key,data,arrays):
+            return False
+        self.__arrays.update(arrays)
+        return True
+
+    def toArrays(self,key,data,arrays):
+        '''
+        Convert data to arrays, recursively for lists that are not rectangular.
+        @param key The name of the data.
+        @param data The data to convert.
+        @param arrays Dictionary to add the arrays to.
+        @return True if the data could be converted, False if not.
+        '''
+        try:
+            arr = np.asarray(data)
+        except ValueError:
+            #numpy does not create ragged arrays implicitly
+            arr = None
+        if arr is not None and arr.dtype.kind in 'biuf':
+            arrays[key] = arr
+            return True
+        if not isinstance(data,(list,tuple)) or len(data) == 0:
+            return False
+        arrays[key + NpzReport.lenSuffix] = np.array(len(data))
+        for i,d in enumerate(data):
+            if not self.toArrays(key + '.' + str(i),d,arrays):
+                return False
+        return True
+
+    def toFile(self):
+        '''
+        Write the added arrays to the npz file. The file is written to a
+        temporary file first and then renamed.
+        '''
+        tmpPath = self.__path + '.tmp'
+        with open(tmpPath,'wb') as f:
+            #savez stores the members uncompressed, this allows mapping them
+            np.savez(f,**self.__arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath,self.__path)
+        logging.info("# Wrote " + str(len(self.__arrays)) + " arrays to " + self.__path)
+
+    def appendToFile(self):
+        '''
+        Append the added arrays to an existing npz file and release them,
+        e.g. after every finished test. The file is copied to a temporary
+        file that is extended and renamed, so the file on disk is always
+        complete.
+        '''
+        tmpPath = self.__path + '.tmp'
+        shutil.copyfile(self.__path,tmpPath)
+        with zipfile.ZipFile(tmpPath,'a',zipfile.ZIP_STORED,allowZip64=True) as z:
+            for key,arr in self.__arrays.items():
+                with z.open(key + '.npy','w',force_zip64=True) as f:
+                    np.lib.format.write_array(f,np.asanyarray(arr),allow_pickle=False)
+        with open(tmpPath,'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmpPath,self.__path)
+        logging.info("# Appended " + str(len(self.__arrays)) + " arrays to " + self.__path)
+        self.__arrays = {}
+
+    def fromFile(self):
+        '''
+        Read the member offsets and array headers of the npz file, the arrays
+        themselves are only mapped when they are accessed.
+        @exception RuntimeError if a member of the file is compressed.
+        '''
+        self.__members = {}
+        with zipfile.ZipFile(self.__path,'r') as z:
+            infos = z.infolist()
+        with open(self.__path,'rb') as f:
+            for info in infos:
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise RuntimeError("member " + info.filename + " of " + self.__path + " is compressed")
+                #the data starts after the local file header and its variable fields
+                f.seek(info.header_offset)
+                header = f.read(30)
+                nameLen,extraLen = struct.unpack('<HH',header[26:30])
+                f.seek(info.header_offset + 30 + nameLen + extraLen)
+                version = np.lib.format.read_magic(f)
+                if version == (1,0):
+                    shape,fortran,dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape,fortran,dtype = np.lib.format.read_array_header_2_0(f)
+                key = info.filename[:-len('.npy')]
+                self.__members[key] = [f.tell(),dtype,shape,fortran]
+        logging.info("# Found " + str(len(self.__members)) + " arrays in " + self.__path)
+
+    def hasData(self,key):
+        ''' @return True if data with the given name is in the loaded file. '''
+        return key in self.__members or (key + NpzReport.lenSuffix) in self.__members
+
+    def getArray(self,key):
+        '''
+        Map an array of the loaded file read only into memory.
+        @param key The member name of the array.
+        @return The memory mapped array.
+        '''
+        offset,dtype,shape,fortran = self.__members[key]
+        if int(np.prod(shape)) == 0:
+            return np.empty(shape,dtype)
+        order = 'F' if fortran else 'C'
+        return np.memmap(self.__path,dtype=dtype,mode='r',offset=offset,shape=shape,order=order)
+
+    def getData(self,key):
+        '''
+        Get data of the loaded file.
+        @param key The name the data has been added with.
+        @return A memory mapped array or a list of arrays for data that is
+        not a rectangular array.
+        @exception RuntimeError if the data is not in the file.
+        '''
+        if key in self.__members:
+            return self.getArray(key)
+        if (key + NpzReport.lenSuffix) not in self.__members:
+            raise RuntimeError("no data " + key + " in " + self.__path)
+        length = int(self.getArray(key + NpzReport.lenSuffix))
+        return [self.getData(key + '.' + str(i)) for i in range(length)]
@@ -0,0 +1,318 @@
+''' @package ResultsDB
+A module storing the results of performance tests in a SQLite database.
+'''
+import datetime
+import logging
+import os
+import sqlite3
+
+import numpy as np
+
+import perfTest.DeviceTests as dt
+from perfTest.StdyState import StdyState
+
+class ResultsDB(object):
+    '''
+    A local SQLite database holding the results of many performance tests.
+    For every ingested xml file the device identity, the test options and
+    the measurement overview values of every cell (metric, workload, block
+    size) are stored, so runs can be selected and compared by query instead
+    of parsing their xml files.
+    '''
+    ## Version of the database schema, stored as user_version
+    schemaVersion = 1
+    ## Statements creating the tables and indexes
+    schema = ['''CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    xml TEXT UNIQUE NOT NULL,
+                    testname TEXT,
+                    mode TEXT,
+                    testdate TEXT,
+                    model TEXT,
+                    serial TEXT,
+                    firmware TEXT,
+                    interface TEXT,
+                    ioperfversion TEXT,
+                    cmdline TEXT,
+                    kernel TEXT,
+                    ingested TEXT)''',
+              '''CREATE TABLE IF NOT EXISTS tests (
+                    id INTEGER PRIMARY KEY,
+                    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+                    testtype TEXT NOT NULL,
+                    fioversion TEXT,
+                    numjobs INTEGER,
+                    iodepth INTEGER,
+                    runtime INTEGER,
+                    xargs TEXT,
+                    stdyreached INTEGER,
+                    stdyrounds TEXT,
+                    stdyavg REAL)''',
+              '''CREATE TABLE IF NOT EXISTS cells (
+                    test_id INTEGER NOT NULL REFERENCES tests(id) ON DELETE CASCADE,
+                    metric TEXT NOT NULL,
+                    workload INTEGER,
+                    bs TEXT,
+                    value REAL)''',
+              'CREATE INDEX IF NOT EXISTS runs_model ON runs(model,firmware)',
+              'CREATE INDEX IF NOT EXISTS runs_serial ON runs(serial)',
+              'CREATE INDEX IF NOT EXISTS tests_run ON tests(run_id)',
+              'CREATE INDEX IF NOT EXISTS tests_type ON tests(testtype)',
+              'CREATE INDEX IF NOT EXISTS cells_test ON cells(test_id,metric,bs,workload)']
+    ## Columns of a run returned by findRuns
+    runColumns = ['id','xml','testname','mode','testdate','model','serial','firmware',
+                  'interface','ioperfversion','cmdline','kernel','ingested']
+
+    def __init__(self,path):
+        '''
+        Constructor, opens the database and creates the schema if necessary.
+        @param path The path of the database file.
+        @exception RuntimeError if the database has a newer schema.
+        '''
+        ## Path of the database file
+        self.__path = path
+        ## The database connection
+        self.__conn = sqlite3.connect(path)
+        self.__conn.execute('PRAGMA foreign_keys = ON')
+        version = self.__conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > ResultsDB.schemaVersion:
+            self.__conn.close()
+            raise RuntimeError("results database " + path + " has unknown schema version " + str(version))
+        with self.__conn:
+            for stmt in ResultsDB.schema:
+                self.__conn.execute(stmt)
+            self.__conn.execute('PRAGMA user_version = ' + str(ResultsDB.schemaVersion))
+
+    def getPath(self): return self.__path
+    def getConnection(self): return self.__conn
+
+    def close(self):
+        ''' Close the database connection. '''
+        self.__conn.close()
+
+    @staticmethod
+    def getStdyCells(stdyState):
+        '''
+        Get the steady state information of a test for the tests table.
+        @param stdyState The StdyState object of the test, None if the test
+        has no steady state.
+        @return [reached (1|0|None),rounds of the measurement window,average].
+        '''
+        if stdyState == None:
+            return [None,None,None]
+        try:
+            reached = 1 if stdyState.isSteady() else 0
+        except RuntimeError:
+            reached = None
+        rnds = ','.join(str(r) for r in stdyState.getStdyRnds())
+        return [reached,rnds,stdyState.getStdyAvg()]
+
+    @staticmethod
+    def calcCells(test):
+        '''
+        Calculate the overview values of a test the same way the measurement
+        tables of the report are calculated, i.e. averages over the steady
+        state measurement window. Latencies are in ms, throughputs in MB/s.
+        @param test A device test loaded from xml.
+        @return A list of [metric,workload,block size,value] entries.
+        '''
+        cells = []
+        if isinstance(test,dt.SsdWriteSatTest):
+            #the measurement window are the last rounds of the test
+            win = StdyState.testMesWindow + 1
+            mats = test.getRndMatrices()
+            if len(mats) == 2 and len(mats[0]) > 0:
+                cells.append(['iops',0,'4k',float(np.mean(np.asarray(mats[0][-win:],dtype=float)))])
+                lats = np.asarray(mats[1][-win:],dtype=float)
+                cells.append(['avg-lat',0,'4k',float(lats[:,2].mean() / 1000)])
+            return cells
+        if len(test.getRndMatrices()) == 0:
+            return cells
+        #without a measurement window there are no overview values
+        if hasattr(test,'getStdyState') and len(test.getStdyState().getStdyRnds()) == 0:
+            return cells
+        rndArr = np.asarray(test.getRndMatrices(),dtype=float)
+        bsLabels = test.getBsLabels()
+        if isinstance(test,(dt.SsdIopsTest,dt.HddIopsTest)):
+            #rounds x workloads x block sizes
+            if isinstance(test,dt.SsdIopsTest):
+                rndArr = rndArr[list(test.getStdyState().getStdyRnds())]
+            table = rndArr.mean(axis=0)
+            for i,wl in enumerate(type(test).mixWlds):
+                for j,bs in enumerate(bsLabels):
+                    cells.append(['iops',wl,bs,float(table[i][j])])
+        elif isinstance(test,dt.SsdLatencyTest):
+            #rounds x workloads x block sizes x [min,max,mean]
+            mesWin = list(test.getStdyState().getStdyRnds())
+            rndArr = rndArr[mesWin]
+            tables = {'max-lat':rndArr[:,:,:,1].max(axis=0) / 1000,
+                      'avg-lat':rndArr[:,:,:,2].mean(axis=0) / 1000}
+            winHists = test.getWindowHistograms()
+            for pct in dt.SsdLatencyTest.percentiles:
+                if winHists != None:
+                    table = np.array([[max(bs[0].getPercentile(pct),bs[1].getPercentile(pct)) for bs in row]
+                                      for row in winHists],dtype=float)
+                elif len(test.getPctMatrices()) > 0:
+                    pctIdx = dt.SsdLatencyTest.percentiles.index(pct)
+                    pctArr = np.asarray(test.getPctMatrices(),dtype=float)[mesWin]
+                    table = pctArr[:,:,:,:,pctIdx].max(axis=3).mean(axis=0)
+                else:
+                    break
+                tables['p' + str(pct) + '-lat'] = table / 1000
+            for metric,table in tables.items():
+                for i,wl in enumerate(dt.SsdLatencyTest.mixWlds):
+                    for j,bs in enumerate(bsLabels):
+                        cells.append([metric,wl,bs,float(table[i][j])])
+        elif isinstance(test,(dt.SsdTPTest,dt.HddTPTest)):
+            #block sizes x read/write x rounds
+            if isinstance(test,dt.SsdTPTest):
+                rndArr = rndArr[:,:,list(test.getStdyState().getStdyRnds())]
+            table = rndArr.mean(axis=2) / 1024
+            for j,bs in enumerate(bsLabels):
+                cells.append(['tp',100,bs,float(table[j][0])])
+                cells.append(['tp',0,bs,float(table[j][1])])
+        return cells
+
+    def ingest(self,perfTest,xmlPath,mode):
+        '''
+        Store the results of a performance test. A run that has already been
+        ingested from the same xml file is replaced.
+        @param perfTest A PerfTest object loaded from xml.
+        @param xmlPath The path of the xml file.
+        @param mode The test mode (ssd|hdd|raid).
+        @return The id of the run.
+        '''
+        xml = os.path.abspath(xmlPath)
+        if xml.endswith('.xml'):
+            xml = xml[:-4]
+        tests = sorted(perfTest.getTests().items())
+        #the device information from xml is loaded into the device of the tests
+        dev = tests[0][1].getDevice() if len(tests) > 0 else perfTest.getDevice()
+        identity = dev.getIdentity()
+        kernel = perfTest.getOSInfo().get('kernel')
+        if kernel != None:
+            kernel = kernel.strip()
+        with self.__conn:
+            self.__conn.execute('DELETE FROM runs WHERE xml = ?',(xml,))
+            cur = self.__conn.execute('''INSERT INTO runs (xml,testname,mode,testdate,model,serial,
+                                         firmware,interface,ioperfversion,cmdline,kernel,ingested)
+                                         VALUES (?,?,?,?,?,?,?,?,?,?,?,?)''',
+                                      (xml,os.path.basename(perfTest.getTestname()),mode,
+                                       perfTest.getTestDate(),identity['model'],identity['serial'],
+                                       identity['firmware'],dev.getIntfce(),perfTest.getIOPerfVersion(),
+                                       perfTest.getCmdLineArgs(),kernel,datetime.datetime.now().isoformat()))
+            runId = cur.lastrowid
+            for key,test in tests:
+                opts = test.getOptions()
+                optCells = [None,None,None,None]
+                if opts != None:
+                    xargs = opts.getXargs()
+                    optCells = [opts.getNj(),opts.getIod(),opts.getRuntime(),
+                                ' '.join(xargs) if xargs != None else None]
+                stdyState = test.getStdyState() if hasattr(test,'getStdyState') else None
+                cur = self.__conn.execute('''INSERT INTO tests (run_id,testtype,fioversion,numjobs,iodepth,
+                                             runtime,xargs,stdyreached,stdyrounds,stdyavg)
+                                             VALUES (?,?,?,?,?,?,?,?,?,?)''',
+                                          [runId,key,test.getFioJob().getFioVersion()] + optCells +
+                                          ResultsDB.getStdyCells(stdyState))
+                testId = cur.lastrowid
+                cells = ResultsDB.calcCells(test)
+                self.__conn.executemany('INSERT INTO cells (test_id,metric,workload,bs,value) VALUES (?,?,?,?,?)',
+                                        [[testId] + c for c in cells])
+                logging.info("# Ingested " + str(len(cells)) + " cells of test " + key + " from " + xml)
+        return runId
+
+    def findRuns(self,where=None,params=()):
+        '''
+        Select runs, e.g. all runs of a model with a firmware.
+        @param where A SQL condition on the columns of the runs table, e.g.
+        "model LIKE 'INTEL%' AND firmware = ?", None for all runs.
+        @param params Parameters of the condition.
+        @return A list of dictionaries with the run columns, ordered by date.
+        '''
+        query = 'SELECT ' + ','.join(ResultsDB.runColumns) + ' FROM runs'
+        if where != None:
+            query += ' WHERE ' + where
+        query += ' ORDER BY testdate,id'
+        rows = self.__conn.execute(query,params).fetchall()
+        return [dict(zip(ResultsDB.runColumns,row)) for row in rows]
+
+    @staticmethod
+    def cellQuery(columns,testtype,metric,where=None,params=(),bs=None,workload=None):
+        '''
+        Build the query selecting cells of a test and metric.
+        @param columns The selected columns, e.g. runs.model,cells.value.
+        @param testtype The test the cells belong to, e.g. iops.
+        @param metric The metric of the cells, e.g. iops, avg-lat, p99.9-lat or tp.
+        @param where A SQL condition on the columns of the runs table, None
+        for all runs.
+        @param params Parameters of the condition.
+        @param bs Only select cells of this block size, e.g. 4k.
+        @param workload Only select cells of this read percentage.
+        @return [query,arguments of the query].
+        '''
+        query = ('SELECT ' + columns + ' FROM runs' +
+                 ' JOIN tests ON tests.run_id = runs.id JOIN cells ON cells.test_id = tests.id' +
+                 ' WHERE tests.testtype = ? AND cells.metric = ?')
+        args = [testtype,metric]
+        if bs != None:
+            query += ' AND cells.bs = ?'
+            args.append(bs)
+        if workload != None:
+            query += ' AND cells.workload = ?'
+            args.append(workload)
+        if where != None:
+            query += ' AND (' + where + ')'
+            args.extend(params)
+        return [query,args]
+
+    def getCells(self,testtype,metric,where=None,params=(),bs=None,workload=None):
+        '''
+        Select the values of cells together with the run they belong to.
+        @param testtype The test the cells belong to, e.g. iops.
+        @param metric The metric of the cells, e.g. iops, avg-lat, p99.9-lat or tp.
+        @param where A SQL condition on the columns of the runs table, None
+        for all runs.
+        @param params Parameters of the condition.
+        @param bs Only select cells of this block size, e.g. 4k.
+        @param workload Only select cells of this read percentage.
+        @return A list of [run dictionary,workload,block size,value] entries.
+        '''
+        columns = ','.join('runs.' + c for c in ResultsDB.runColumns) + ',cells.workload,cells.bs,cells.value'
+        query,args = ResultsDB.cellQuery(columns,testtype,metric,where,params,bs,workload)
+        query += ' ORDER BY runs.testdate,runs.id'
+        cells = []
+        n = len(ResultsDB.runColumns)
+        for row in self.__conn.execute(query,args):
+            cells.append([dict(zip(ResultsDB.runColumns,row[:n]))] + list(row[n:]))
+        return cells
+
+    def getCellGroups(self,testtype,metric,groupBy=None,where=None,params=(),bs=None,workload=None):
+        '''
+        Select only the values of cells, grouped by columns of their runs,
+        e.g. the 4k random write IOPS of all runs per model and firmware.
+        @param testtype The test the cells belong to, e.g. iops.
+        @param metric The metric of the cells, e.g. iops, avg-lat, p99.9-lat or tp.
+        @param groupBy A list of columns of the runs table to group by,
+        None groups by model.
+        @param where A SQL condition on the columns of the runs table, None
+        for all runs.
+        @param params Parameters of the condition.
+        @param bs Only select cells of this block size, e.g. 4k.
+        @param workload Only select cells of this read percentage.
+        @return A dictionary of group label: list of values.
+        @exception RuntimeError if a group column is not a column of the runs.
+        '''
+        if groupBy == None:
+            groupBy = ['model']
+        for c in groupBy:
+            if c not in ResultsDB.runColumns:
+                raise RuntimeError("unknown column " + c + " to group runs by")
+        #missing values are grouped as n.a.
+        label = " || ' ' || ".join("IFNULL(runs." + c + ",'n.a.')" for c in groupBy)
+        query,args = ResultsDB.cellQuery(label + ',cells.value',testtype,metric,where,params,bs,workload)
+        groups = {}
+        for group,value in self.__conn.execute(query,args):
+            if value != None:
+                groups.setdefault(group,[]).append(value)
+        return groups
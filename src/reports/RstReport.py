@@ -111,7 +111,9 @@ class RstReport(object):
                     caption += "random writes, the 20% average window and the slope of the linear best fit line "
                     caption += "in the measurement window."
                 if index == 4:
-                    caption = "\tThe Latency Measurement 3D Plot shows the average latency on top and the max latency below it. "
+                    caption = "\tThe Latency Measurement 3D Plot shows the average latency on top and the max latency at the bottom. "
+                    caption += "If percentiles have been measured, the p" + str(dt.SsdLatencyTest.reportPct) + " completion latency "
+                    caption += "is plotted between them. "
                     caption += "For the measurement window every workload including all block sizes is plotted."
             if perftype == 'writesat':
                 if index == 0:
@@ -172,6 +174,13 @@ class RstReport(object):
             print("\t:header: \"Block Size\ |darr|\", \"Wld. |rarr| \" 0/100, 65/35, 100/0\n", file=self.__rst)
             #reverse to start with 0/100
             t.reverse()
+
+        if perftype.startswith('p') and perftype.endswith('-lat'):
+            val = StringIO()
+            print(".. csv-table:: " + perftype[:-4] + " Completion Latency (ms) vs. Block Size and R/W Mix %", file=self.__rst)
+            print("\t:header: \"Block Size\ |darr|\", \"Wld. |rarr| \" 0/100, 65/35, 100/0\n", file=self.__rst)
+            #reverse to start with 0/100
+            t.reverse()
             
         for i in range(len(l)):
             val.write("\t")
@@ -252,10 +261,12 @@ class RstReport(object):
             if 'lsb' in OSDict:
                 print(" - " + OSDict['lsb'], file=self.__rst)
         
-    def addGeneralInfo(self,testtype):
+    def addGeneralInfo(self,testtype,stdyMode='snia'):
         '''
         Defines some general used words.
         @param testtype The type of the performance test (ssd,hdd)
+        @param stdyMode The steady state detection mode the tests were run
+        with (snia,seq).
         ''' 
         info = StringIO()
         self.addChapter("General Information")
@@ -275,10 +286,22 @@ class RstReport(object):
             self.addSection("Steady State")
             info.write("The Steady State is to determine if a test has reached a steady performance level. ")
             info.write("Each test has a different dependence variable to check if the state has already been reached. ")
-            info.write("To check for the steady state the performance values of a test measurement window are taken (the last 5 rounds).\n")
-            info.write("The steady state is reached if:\n\n")
-            info.write("- The maximum data excursion is less than 20% of the average in the measurement window.\n")
-            info.write("- The slope of the linear best fit line is less than 10% of the average in the measurement window\n\n")
+            if stdyMode == 'seq':
+                info.write("To check for the steady state a sequential test is carried out after every round on the ")
+                info.write("measurement window (the last rounds, at least " + str(StdyState.seqMinRnds) + "). ")
+                info.write("For the IOPS test the test is carried out on batch means of the IOPS of every second, ")
+                info.write("also while the dependent variable of a round runs, which stops it early.\n")
+                info.write("The steady state is reached if:\n\n")
+                info.write("- The " + str(int(StdyState.seqConfidence * 100)) + "% confidence interval of the average ")
+                info.write("is within " + str(int(StdyState.seqTolerance * 100)) + "% of the average in the measurement window. ")
+                info.write("The confidence holds for all looks of the test, every look is tested with a Bonferroni ")
+                info.write("corrected confidence.\n")
+                info.write("- The slope of the linear best fit line is less than 10% of the average in the measurement window\n\n")
+            else:
+                info.write("To check for the steady state the performance values of a test measurement window are taken (the last 5 rounds).\n")
+                info.write("The steady state is reached if:\n\n")
+                info.write("- The maximum data excursion is less than 20% of the average in the measurement window.\n")
+                info.write("- The slope of the linear best fit line is less than 10% of the average in the measurement window\n\n")
             
             info.write("If these two conditions are met the steady state has been reach for the specific dependence variable. ")
             info.write("Therefore the test can be stopped and the performance values of the measurement window can be taken ")
@@ -289,6 +312,63 @@ class RstReport(object):
             self.addString(info.getvalue())
             info.close()
     
+    @staticmethod
+    def formatSec(sec):
+        '''
+        Format a duration for the report.
+        @param sec The duration in seconds.
+        @return The duration in hours and minutes, e.g. 2h 05min.
+        '''
+        minutes = int(round(sec / 60.0))
+        return str(minutes // 60) + "h " + str(minutes % 60).zfill(2) + "min"
+
+    def addSchedule(self,schedule,tests):
+        '''
+        Add the planned order of the tests, the shared device states, the
+        estimated durations and the trims to meet the time budget to the
+        report.
+        @param schedule The plan of the tests, cf. Scheduler.plan and Scheduler.fit.
+        @param tests The dictionary of tests, key: DeviceTest.
+        '''
+        self.addSection("Test Schedule")
+        info = StringIO()
+        info.write("The tests have been carried out in the order: ")
+        info.write(", ".join([step['key'] for step in schedule['steps']]) + ".\n")
+        if schedule.get('estimate') != None:
+            info.write("The estimated duration of the tests has been " + RstReport.formatSec(schedule['estimate']))
+            if schedule.get('budget') != None:
+                info.write(" with a time budget of " + RstReport.formatSec(schedule['budget']))
+            info.write(":\n\n")
+            for step in schedule['steps']:
+                est = step['estimate']
+                info.write("- *" + step['key'] + "*: " + RstReport.formatSec(est['sec']) + ", " + str(est['rounds']))
+                info.write(" rounds of " + RstReport.formatSec(est['round']) + ", preparation ")
+                info.write(RstReport.formatSec(est['prep']) + " (" + est['source'] + ")\n")
+            info.write("\nAssumptions of the estimate:\n\n")
+            for assumption in schedule['assumptions']:
+                info.write("- " + assumption + "\n")
+            info.write("\n")
+            if len(schedule['trims']) > 0:
+                info.write("To meet the time budget the following trade-offs have been made:\n\n")
+                for trim in schedule['trims']:
+                    info.write("- *" + trim['key'] + "*: " + trim['tradeoff'] + " Saves " +
+                               RstReport.formatSec(trim['saved']) + ".\n")
+                info.write("\n")
+        shared = [step for step in schedule['steps'] if step['follows'] != None]
+        if not schedule['share'] or len(shared) == 0:
+            info.write("Every test has prepared the device itself.\n")
+        else:
+            info.write("The following tests have been planned to start from the device state of the previous ")
+            info.write("test instead of erasing and preconditioning the device. If the previous test did not reach ")
+            info.write("its state the device has been prepared as usual.\n\n")
+            for step in shared:
+                done = step['key'] in tests and tests[step['key']].getSharedFrom() == step['follows']
+                info.write("- *" + step['key'] + "* after *" + step['follows'] + "*: ")
+                info.write(("shared" if done else "not shared, device prepared") + ". ")
+                info.write("Assumption: " + step['assumption'] + "\n")
+        self.addString(info.getvalue())
+        info.close()
+
     def addSteadyInfo(self,test):
         ''' 
         Adds information about the steady state to the rst report.
@@ -313,6 +393,15 @@ class RstReport(object):
         stdyStr.write(" - ")
         print(test.getStdyState().getStdyAvg(), file=stdyStr)  
         
+        if test.getStdyState().getMode() == 'seq':
+            stdyStr.write("Confidence reached by the sequential test:\n")
+            stdyStr.write(" - ")
+            print(test.getStdyState().getStdyConf(), file=stdyStr)
+            stdyStr.write("Confidence required per look, looks carried out of the maximum:\n")
+            stdyStr.write(" - ")
+            print([round(test.getStdyState().getLookConf(),6),test.getStdyState().getLooks(),
+                   test.getStdyState().getMaxLooks()], file=stdyStr)
+        
         self.addString(stdyStr.getvalue())
         stdyStr.close()
     
@@ -330,8 +419,11 @@ class RstReport(object):
                 desc = StringIO()
                 desc.write("The IOPS test consists of looping over the following parameters:\n")
                 desc.write('\n::\n\n\t')
-                print("Make Secure Erase", file=desc)
-                print("\tWorkload Ind. Preconditioning", file=desc)
+                if test.getSharedFrom() != None:
+                    print("Start from the state of the " + test.getSharedFrom() + " test", file=desc)
+                else:
+                    print("Make Secure Erase", file=desc)
+                    print("\tWorkload Ind. Preconditioning", file=desc)
                 print("\tWhile not Steady State", file=desc)
                 print("\t\tFor workloads ", end=' ', file=desc)
                 print(dt.SsdIopsTest.mixWlds, file=desc)
@@ -373,8 +465,11 @@ class RstReport(object):
                 desc = StringIO()
                 desc.write("The latency test consists of looping over the following parameters:\n")
                 desc.write('\n::\n\n\t')
-                print("Make Secure Erase", file=desc)
-                print("\tWorkload Ind. Preconditioning", file=desc)
+                if test.getSharedFrom() != None:
+                    print("Start from the state of the " + test.getSharedFrom() + " test", file=desc)
+                else:
+                    print("Make Secure Erase", file=desc)
+                    print("\tWorkload Ind. Preconditioning", file=desc)
                 print("\tWhile not Steady State", file=desc)
                 print("\t\tFor workloads ", end=' ', file=desc)
                 print(dt.SsdLatencyTest.mixWlds, file=desc)
@@ -384,6 +479,9 @@ class RstReport(object):
                 desc.write("\nFor all block sizes random read, a 65/35 read/write mixed workload and random write is carried out for 60 ") 
                 desc.write("seconds using direct IO. ")
                 desc.write("For every combination the Min, Max and Mean Latency is measured. ")
+                desc.write("Additionally the read and write completion latency percentiles ")
+                desc.write(str(dt.SsdLatencyTest.percentiles) + " are recorded, for the summary the higher ")
+                desc.write("percentile of read and write is taken. ")
                 desc.write("After these loops are finished one test round has been carried out. To detect the steady state ")
                 desc.write("the mean latency of 4k random write is taken.\n\n")
                 print("- Dependent Variable: 4k block size, random write mean latency", file=desc)
@@ -402,6 +500,12 @@ class RstReport(object):
                 desc.write("For each round (60 second window) the write IOPS and latencies are measured. Also the total written ")
                 desc.write("IO is measured to check if 4x capacity has been written.\n\n")
                 desc.write("As no steady state detection is necessary there is no dependence variable.\n\n")
+                hist = test.getWindowHistogram()
+                if hist != None:
+                    desc.write("Write completion latency percentiles of the last rounds (ms): ")
+                    pcts = ["p" + str(p) + "=" + str(round(hist.getPercentile(p) / 1000,3))
+                            for p in dt.SsdLatencyTest.percentiles]
+                    desc.write(", ".join(pcts) + "\n\n")
                 self.addString(desc.getvalue())
                 desc.close()
         
@@ -3,6 +3,8 @@ Created on 03.08.2012
 
 @author: gschoenb
 '''
+import os
+
 from lxml import etree
 
 class XmlReport(object):
@@ -15,11 +17,12 @@ class XmlReport(object):
         '''
         Constructor
         @param testname The name of the root tag, equals the name
-        of the performance test. 
+        of the performance test. The name can contain a directory, e.g.
+        for tests selected from a results database.
         '''
         
         ## The root tag of the xml file.
-        self.__xml = etree.Element(testname)
+        self.__xml = etree.Element(os.path.basename(testname))
         
     def getXml(self):
         return self.__xml
@@ -34,4 +37,57 @@ class XmlReport(object):
     def fileToXml(self,testname):
         et = etree.parse(testname + '.xml')
         self.__xml = et.getroot()
-        
\ No newline at end of file
+        
+
+    def clear(self):
+        ''' Start a new, empty xml tree with the same root tag. '''
+        self.__xml = etree.Element(self.__xml.tag)
+
+    def getClosingTag(self):
+        ''' @return The closing tag of the root element as bytes. '''
+        return b'</' + self.__xml.tag.encode() + b'>'
+
+    def startFile(self,testname):
+        '''
+        Write the current xml tree to a new file. Further elements are
+        appended to the file with appendToFile.
+        @param testname The name of the test, the file is testname.xml.
+        '''
+        data = etree.tostring(self.__xml)
+        closing = self.getClosingTag()
+        if not data.endswith(closing):
+            #an empty root element is written as <tag/>
+            data = data[:-2] + b'>' + closing
+        path = testname + '.xml'
+        with open(path + '.tmp','wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp',path)
+
+    def appendToFile(self,testname,elem):
+        '''
+        Append an element to the root element of a file written with
+        startFile. The file is copied with the new element to a temporary
+        file that is renamed, so the file on disk is always valid xml.
+        @param testname The name of the test, the file is testname.xml.
+        @param elem The element to append, it is not added to the xml tree.
+        @exception RuntimeError if the file does not end with the root tag.
+        '''
+        path = testname + '.xml'
+        closing = self.getClosingTag()
+        remaining = os.path.getsize(path) - len(closing)
+        with open(path,'rb') as src, open(path + '.tmp','wb') as dst:
+            src.seek(remaining)
+            if src.read() != closing:
+                raise RuntimeError("xml file " + path + " does not end with " + closing.decode())
+            src.seek(0)
+            while remaining > 0:
+                buf = src.read(min(remaining,1 << 20))
+                dst.write(buf)
+                remaining -= len(buf)
+            dst.write(etree.tostring(elem))
+            dst.write(closing)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(path + '.tmp',path)
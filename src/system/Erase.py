@@ -0,0 +1,249 @@
+''' @package Erase
+A module selecting and running the erase method of a device.
+'''
+from abc import ABCMeta, abstractmethod
+import logging
+import shutil
+
+from system.Probe import DeviceProbe
+from system.ProbeCache import ProbeCache
+
+class EraseBackend(object, metaclass=ABCMeta):
+    '''
+    A method to erase a device, e.g. an ATA secure erase via hdparm. A
+    backend reports if it supports the device, how long the erase is
+    expected to take and if the device is in a fresh-out-of-box (FOB) like
+    state afterwards. The expected duration is the measured duration of
+    the last erase of the device if it is known.
+    '''
+    ## Name of the backend, used for the erase policy and in the report.
+    name = None
+    ## Device interfaces the backend is used for, None is a device without
+    ## a given interface.
+    interfaces = []
+    ## Tool that must be installed to use the backend.
+    tool = None
+    ## True if the device is in a fresh-out-of-box like state after the erase.
+    fob = True
+
+    def __init__(self,device):
+        '''
+        Constructor
+        @param device The SSD object to erase.
+        '''
+        ## The device to erase
+        self.__device = device
+
+    def getDevice(self): return self.__device
+
+    def isApplicable(self):
+        '''
+        Check if the backend is used for the interface of the device and its
+        tool is installed, without probing the device.
+        @return True if applicable, False if not.
+        '''
+        if self.__device.getIntfce() not in self.interfaces:
+            return False
+        if self.tool != None and shutil.which(self.tool) == None:
+            logging.info("# " + self.tool + " not found, cannot use erase method " + self.name)
+            return False
+        return True
+
+    def isSupported(self):
+        '''
+        Check if the backend can erase the device.
+        @return True if supported, False if not.
+        '''
+        return self.isApplicable()
+
+    def getDefaultSec(self,probe=True):
+        '''
+        Get the duration of an erase if it has never been measured.
+        @param probe False to only use cached information about the device.
+        @return The expected seconds, None if unknown.
+        '''
+        return None
+
+    def getExpectedSec(self,probe=True):
+        '''
+        Get the expected duration of an erase.
+        @param probe False to only use cached information about the device.
+        @return The seconds of the last erase of the device, if not measured
+        yet the default of the backend, None if unknown.
+        '''
+        sec = ProbeCache.getEraseSec(self.__device.getDevPath(),self.name)
+        if sec == None:
+            sec = self.getDefaultSec(probe)
+        return sec
+
+    @abstractmethod
+    def erase(self):
+        '''
+        Erase the device.
+        @return True if the device was erased, False if not.
+        @exception RuntimeError if the erase failed and the device must not
+        be tested.
+        '''
+
+class HdparmErase(EraseBackend):
+    ''' ATA enhanced security erase via hdparm. '''
+    name = 'hdparm'
+    interfaces = [None,'compactflash','sdcard','usb']
+    tool = 'hdparm'
+
+    def isSupported(self):
+        return super(HdparmErase,self).isSupported() and self.getDevice().secureEraseSupported()
+
+    def getDefaultSec(self,probe=True):
+        #the drive reports the minutes of the enhanced erase
+        if probe:
+            try:
+                hdparm = ProbeCache.getHdparm(self.getDevice().getDevPath())
+            except RuntimeError:
+                return None
+        else:
+            entry = ProbeCache.getEntry(self.getDevice().getDevPath())
+            if entry == None or 'hdparm' not in entry:
+                return None
+            hdparm = entry['hdparm']
+        minutes = hdparm['erase']['enhancedMin']
+        return minutes * 60 if minutes != None else None
+
+    def erase(self):
+        self.getDevice().secureEraseHdparm()
+        return True
+
+class BlkdiscardErase(EraseBackend):
+    '''
+    Discard of all blocks via blkdiscard. The firmware only marks the blocks
+    as unused, therefore the result is not regarded as FOB state.
+    '''
+    name = 'blkdiscard'
+    interfaces = [None,'compactflash','sdcard','usb']
+    tool = 'blkdiscard'
+    fob = False
+
+    def isSupported(self):
+        if not super(BlkdiscardErase,self).isSupported():
+            return False
+        maxBytes = DeviceProbe.get(self.getDevice().getDevPath()).readQueue('discard_max_bytes')
+        return maxBytes == None or maxBytes > 0
+
+    def erase(self):
+        return self.getDevice().secureEraseBlkdiscard()
+
+class SgFormatErase(EraseBackend):
+    ''' Format of SAS devices via sg_format. '''
+    name = 'sg_format'
+    interfaces = ['sas']
+    tool = 'sg_format'
+
+    def erase(self):
+        return self.getDevice().secureEraseSgFormat()
+
+class NvmeFormatErase(EraseBackend):
+    ''' User data erase of NVMe devices via nvme format. '''
+    name = 'nvme-format'
+    interfaces = ['nvme']
+    tool = 'nvme'
+
+    def erase(self):
+        return self.getDevice().secureEraseNvme()
+
+class FusionErase(EraseBackend):
+    ''' Erase of fusionio devices via fio-sure-erase. '''
+    name = 'fio-sure-erase'
+    interfaces = ['fusion']
+    tool = 'fio-sure-erase'
+
+    def erase(self):
+        return self.getDevice().secureEraseFusion()
+
+class EraseRegistry(object):
+    '''
+    Selects the erase backends for a device by the erase policy:
+    fastest-fob uses the fastest backend leaving a FOB like state, if no
+    such backend supports the device the fastest backend, fastest uses the
+    fastest backend, ordered the first supported backend of the registry
+    and a backend name only this backend. Backends with an unknown duration
+    are regarded as slowest.
+    '''
+    ## Registered backend classes, in the order of preference.
+    backends = [HdparmErase,BlkdiscardErase,SgFormatErase,NvmeFormatErase,FusionErase]
+    ## Policies to select a backend, besides the backend names.
+    policies = ['fastest-fob','fastest','ordered']
+    ## The erase policy.
+    policy = 'fastest-fob'
+
+    @staticmethod
+    def register(backend):
+        '''
+        Register an additional backend class, it is preferred the least.
+        @param backend A subclass of EraseBackend.
+        '''
+        if backend not in EraseRegistry.backends:
+            EraseRegistry.backends.append(backend)
+
+    @staticmethod
+    def getPolicies():
+        ''' @return The valid erase policies, including the backend names. '''
+        return EraseRegistry.policies + [b.name for b in EraseRegistry.backends]
+
+    @staticmethod
+    def estimate(device,policy=None):
+        '''
+        Estimate the duration of an erase of a device without probing it,
+        e.g. to plan the tests. Only the measured durations of earlier erases
+        and the cached erase times reported by the device are used, the
+        backends are not checked for support of the device.
+        @param device The SSD object to erase.
+        @param policy The erase policy, if None policy is used.
+        @return The expected seconds of the backend the policy prefers, for
+        the ordered policy the first applicable backend, else among the
+        backends with a known duration. None if unknown.
+        '''
+        if policy == None:
+            policy = EraseRegistry.policy
+        candidates = [b(device) for b in EraseRegistry.backends
+                      if policy in EraseRegistry.policies or b.name == policy]
+        applicable = [b for b in candidates if b.isApplicable()]
+        if policy == 'ordered':
+            #keep the order of select, a later backend is only a fallback
+            return applicable[0].getExpectedSec(False) if len(applicable) > 0 else None
+        known = [[b,b.getExpectedSec(False)] for b in applicable]
+        known = [k for k in known if k[1] != None]
+        if len(known) == 0:
+            return None
+        if policy == 'fastest-fob' and any(b.fob for b,sec in known):
+            known = [k for k in known if k[0].fob]
+        return min(sec for b,sec in known)
+
+    @staticmethod
+    def select(device,policy=None):
+        '''
+        Get the backends to erase a device with.
+        @param device The SSD object to erase.
+        @param policy The erase policy, if None policy is used.
+        @return The supported backends, the first one is selected, the others
+        are used if it cannot erase the device.
+        '''
+        if policy == None:
+            policy = EraseRegistry.policy
+        candidates = [b(device) for b in EraseRegistry.backends
+                      if policy in EraseRegistry.policies or b.name == policy]
+        supported = [b for b in candidates if b.isSupported()]
+        if policy == 'ordered' or len(supported) < 2:
+            return supported
+        expected = {}
+        for b in supported:
+            expected[b.name] = b.getExpectedSec()
+            logging.info("# Erase method " + b.name + " expected to take " + str(expected[b.name]) +
+                         " seconds, FOB state: " + str(b.fob))
+        #sorting is stable, backends with the same duration keep their order
+        supported.sort(key=lambda b: expected[b.name] if expected[b.name] != None else float('inf'))
+        if policy == 'fastest-fob':
+            fob = [b for b in supported if b.fob]
+            if len(fob) == 0:
+                logging.warning("# No erase method of " + device.getDevPath() + " leaves a FOB state")
+            supported = fob + [b for b in supported if not b.fob]
+        return supported
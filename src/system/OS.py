@@ -12,6 +12,8 @@ from os import lstat
 from stat import S_ISBLK
 from time import sleep
 
+from system.Readiness import Readiness
+
 class RAIDtec(object, metaclass=ABCMeta):
     '''
     Representing a RAID technology, used from the OS.
@@ -129,27 +131,13 @@ class Mdadm(RAIDtec):
             mdadm.communicate()
 
     def isReady(self):
+        '''
+        Checks if the raid device has finished its resync, recovery or check.
+        @return True if the raid is in sync, False if not
+        '''
         logging.info("# Checking if raid device "+self.getDevPath()+" is ready...")
-        process = subprocess.Popen(["cat", "/proc/mdstat"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,universal_newlines=True)
-        (stdout, stderr) = process.communicate()
-        if stderr != '':
-            logging.error("cat mdstat encountered an error: " + stderr)
-            raise RuntimeError("cat mdstat command error")
-        else:
-            # Remove the Personalities line
-            stdout = stdout.partition("\n")[2]
-            # Split in single devices
-            mds = stdout.split("\n\n")
-            # Search devices for our device
-            match = re.search('^/dev/(.*)$', self.getDevPath())
-            mdName = match.group(1)
-            for md in mds:
-                if md.startswith(mdName):
-                    # Check if a task is running)
-                    if md.find("finish") != -1:
-                        return False
-                    else:
-                        return True
+        action = Readiness.getSyncAction(Readiness.getBlockName(self.getDevPath()))
+        return action == None or action == 'idle'
 
 class Storcli(RAIDtec):
     '''
@@ -0,0 +1,173 @@
+''' @package OpEngine
+A module running an operation on several devices with a bounded worker pool.
+'''
+import logging
+import multiprocessing
+import time
+
+class OpEngine(object):
+    '''
+    Runs an operation, e.g. secure erase or preconditioning, on several
+    devices like the members of a RAID set. At most maxWorkers operations
+    run at the same time, the next device is started as soon as an
+    operation has finished. The operations report the bytes they have
+    written, the engine prints the progress and an estimated time of
+    arrival per device and records the timings of every device.
+    '''
+    ## Maximum number of operations running at the same time, e.g. to not
+    ## saturate the host bus adapter.
+    maxWorkers = 4
+    ## Seconds between two progress prints.
+    statusInterval = 60
+
+    ## The operations are passed to the processes by forking, they are
+    ## bound methods of device objects that cannot be pickled.
+    mpContext = multiprocessing.get_context('fork')
+
+    def __init__(self, name, paths, op, workers=None):
+        '''
+        Constructor
+        @param name The name of the operation, e.g. erase.
+        @param paths The device paths to run the operation on.
+        @param op A function called with the device path and a progress
+        function. The progress function takes the bytes written and the
+        total bytes to write. The operation raises a RuntimeError on failure.
+        @param workers Maximum number of concurrent operations, if None
+        maxWorkers is used.
+        '''
+        ## The name of the operation
+        self.__name = name
+        ## The device paths
+        self.__paths = list(paths)
+        ## The operation function
+        self.__op = op
+        ## Maximum number of concurrent operations
+        self.__workers = workers if workers != None else OpEngine.maxWorkers
+        ## Timings of every device after running, path: dictionary
+        self.__timings = {}
+
+    def getName(self): return self.__name
+    def getPaths(self): return self.__paths
+    def getTimings(self): return self.__timings
+
+    @staticmethod
+    def newStatus(state):
+        '''
+        Get the status of a device.
+        @param state The state (waiting|running|finished|failed).
+        @return A dictionary with the state, start and end time, the bytes
+        written, the total bytes and an error message.
+        '''
+        return {'state':state,'start':None,'end':None,'bytes':0,'total':None,'error':None}
+
+    def worker(self,path,status):
+        '''
+        Run the operation on one device, called in a separate process.
+        @param path The device path.
+        @param status The shared status dictionary.
+        '''
+        st = OpEngine.newStatus('running')
+        st['start'] = time.time()
+        status[path] = st
+
+        def progress(done,total):
+            st['bytes'] = done
+            st['total'] = total
+            #the managed dictionary only sees reassigned values
+            status[path] = st
+        try:
+            self.__op(path,progress)
+            st['state'] = 'finished'
+        except (RuntimeError,SystemExit) as e:
+            logging.error("# Operation " + self.__name + " failed on " + path + ": " + str(e))
+            st['state'] = 'failed'
+            st['error'] = str(e)
+        st['end'] = time.time()
+        status[path] = st
+
+    @staticmethod
+    def getETA(st,now):
+        '''
+        Estimate the remaining seconds of a running operation from its rate.
+        @param st The status of the device.
+        @param now The current time.
+        @return The remaining seconds, None if they cannot be estimated.
+        '''
+        if st['state'] != 'running' or st['total'] == None or st['bytes'] <= 0:
+            return None
+        rate = st['bytes'] / max(now - st['start'],1e-3)
+        return max(st['total'] - st['bytes'],0) / rate
+
+    @staticmethod
+    def formatStatus(name,status):
+        '''
+        Get the progress of all devices.
+        @param name The name of the operation.
+        @param status The status dictionary.
+        @return The status string, one line per device.
+        '''
+        now = time.time()
+        lines = []
+        for path in sorted(status.keys()):
+            st = status[path]
+            line = path + ": " + name + " " + st['state']
+            if st['start'] != None:
+                end = st['end'] if st['end'] != None else now
+                line += " (" + str(int(end - st['start'])) + "s)"
+            if st['total'] != None and st['total'] > 0:
+                line += " " + str(st['bytes'] // 2**20) + "/" + str(st['total'] // 2**20) + " MiB"
+                line += " (" + str(int(100.0 * st['bytes'] / st['total'])) + "%)"
+            eta = OpEngine.getETA(st,now)
+            if eta != None:
+                line += " ETA " + str(int(eta)) + "s"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def run(self):
+        '''
+        Run the operation on all devices with at most the given number of
+        concurrent processes, print the progress periodically and wait until
+        all operations have finished.
+        @return True if the operation succeeded on all devices, False otherwise.
+        '''
+        manager = OpEngine.mpContext.Manager()
+        status = manager.dict()
+        for path in self.__paths:
+            status[path] = OpEngine.newStatus('waiting')
+        waiting = list(self.__paths)
+        running = {}
+        logging.info("# Running " + self.__name + " on " + str(len(waiting)) + " devices with " +
+                     str(self.__workers) + " workers")
+        lastPrint = time.time()
+        while len(waiting) > 0 or len(running) > 0:
+            for path,p in list(running.items()):
+                if not p.is_alive():
+                    p.join()
+                    del running[path]
+                    logging.info("# " + self.__name + " on " + path + ": " + status[path]['state'])
+            while len(waiting) > 0 and len(running) < max(self.__workers,1):
+                path = waiting.pop(0)
+                p = OpEngine.mpContext.Process(target=self.worker,args=(path,status),
+                                               name=self.__name + '-' + path)
+                p.start()
+                logging.info("# Started " + self.__name + " on " + path + " in process " + str(p.pid))
+                running[path] = p
+            if time.time() - lastPrint >= OpEngine.statusInterval:
+                print("### " + self.__name + " progress ###")
+                print(OpEngine.formatStatus(self.__name,status))
+                logging.info(OpEngine.formatStatus(self.__name,status))
+                lastPrint = time.time()
+            time.sleep(1)
+        self.__timings = {}
+        for path in self.__paths:
+            st = dict(status[path])
+            if st['state'] == 'running':
+                #the process ended without reporting, e.g. it was killed
+                st['state'] = 'failed'
+            st['duration'] = None
+            if st['start'] != None and st['end'] != None:
+                st['duration'] = st['end'] - st['start']
+            self.__timings[path] = st
+        manager.shutdown()
+        logging.info("# Finished " + self.__name + ":\n" + OpEngine.formatStatus(self.__name,self.__timings))
+        return all(st['state'] == 'finished' for st in self.__timings.values())
@@ -0,0 +1,327 @@
+''' @package Probe
+A module probing block devices through sysfs and ioctls.
+'''
+import fcntl
+import logging
+import os
+import re
+import struct
+
+class DeviceProbe(object):
+    '''
+    Reads the size, the sector sizes, the identity and the mount state of a
+    block device directly with ioctls, from sysfs, procfs and the udev
+    database instead of forking blockdev, mount or cat. The values are read
+    once and cached for the run, get returns the same probe for every path
+    of a device.
+    '''
+    ## ioctl returning the device size in bytes as unsigned 64 bit integer
+    BLKGETSIZE64 = 0x80081272
+    ## ioctl returning the logical sector size as int
+    BLKSSZGET = 0x1268
+    ## ioctl returning the physical sector size as unsigned int
+    BLKPBSZGET = 0x127B
+    ## Directory of the block devices in sysfs.
+    sysBlock = '/sys/class/block'
+    ## Mount information of the current process.
+    mountinfo = '/proc/self/mountinfo'
+    ## Partitions known to the kernel.
+    partitions = '/proc/partitions'
+    ## Directory of the udev database.
+    udevData = '/run/udev/data'
+
+    ## Probes of the run, real device path: DeviceProbe
+    __probes = {}
+
+    @staticmethod
+    def get(path):
+        '''
+        Get the probe of a device, it is created on first access.
+        @param path The device path, links like /dev/disk/by-id are resolved.
+        @return The DeviceProbe object of the device.
+        '''
+        real = os.path.realpath(path)
+        if real not in DeviceProbe.__probes:
+            DeviceProbe.__probes[real] = DeviceProbe(real)
+        return DeviceProbe.__probes[real]
+
+    @staticmethod
+    def invalidate(path=None):
+        '''
+        Drop cached probes, e.g. after a RAID device has been created again.
+        @param path The device path, None drops all probes.
+        '''
+        if path == None:
+            DeviceProbe.__probes.clear()
+        else:
+            DeviceProbe.__probes.pop(os.path.realpath(path),None)
+
+    def __init__(self,path):
+        '''
+        Constructor
+        @param path The resolved device path, e.g. /dev/sdb.
+        '''
+        ## The device path
+        self.__path = path
+        ## The kernel name of the device, e.g. sdb
+        self.__name = os.path.basename(path)
+        ## Cached values, key: value
+        self.__values = {}
+
+    def getPath(self): return self.__path
+    def getName(self): return self.__name
+
+    def cached(self,key,read):
+        '''
+        Get a cached value, it is read on first access.
+        @param key The name of the value.
+        @param read A function reading the value.
+        @return The value.
+        '''
+        if key not in self.__values:
+            self.__values[key] = read()
+        return self.__values[key]
+
+    def ioctl(self,request,fmt):
+        '''
+        Run an ioctl on the device returning a number.
+        @param request The ioctl request.
+        @param fmt The struct format of the number.
+        @return The number, None if the device cannot be opened or the
+        ioctl is not supported.
+        '''
+        try:
+            fd = os.open(self.__path,os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            logging.info("# Cannot open " + self.__path + " for ioctl: " + str(e))
+            return None
+        try:
+            buf = fcntl.ioctl(fd,request,bytes(struct.calcsize(fmt)))
+            return struct.unpack(fmt,buf)[0]
+        except (OSError,IOError) as e:
+            logging.info("# ioctl " + hex(request) + " failed on " + self.__path + ": " + str(e))
+            return None
+        finally:
+            os.close(fd)
+
+    def getSysDir(self):
+        ''' @return The sysfs directory of the device. '''
+        return os.path.join(DeviceProbe.sysBlock,self.__name)
+
+    def readSys(self,*names):
+        '''
+        Read a number from sysfs.
+        @param names The path of the attribute below the device directory.
+        @return The number, None if the attribute does not exist.
+        '''
+        try:
+            with open(os.path.join(self.getSysDir(),*names),'r') as f:
+                return int(f.read().strip())
+        except (IOError,OSError,ValueError):
+            return None
+
+    def readQueue(self,attr):
+        '''
+        Read a queue attribute from sysfs, partitions use the queue of
+        their disk.
+        @param attr The attribute, e.g. logical_block_size.
+        @return The number, None if the attribute does not exist.
+        '''
+        value = self.readSys('queue',attr)
+        if value == None:
+            value = self.readSys('..','queue',attr)
+        return value
+
+    def getSizeB(self):
+        '''
+        Get the size of the device in bytes.
+        @return The size.
+        @exception RuntimeError if the size cannot be read or is zero.
+        '''
+        def read():
+            size = self.ioctl(DeviceProbe.BLKGETSIZE64,'Q')
+            if size == None:
+                #sysfs counts in 512 byte sectors independent of the sector size
+                sectors = self.readSys('size')
+                size = sectors * 512 if sectors != None else None
+            if size == None or size == 0:
+                logging.error("# Could not read the size of " + self.__path)
+                raise RuntimeError("device size error")
+            return size
+        return self.cached('size',read)
+
+    def getLogicalSectorSizeB(self):
+        '''
+        Get the logical sector size of the device in bytes.
+        @return The sector size.
+        @exception RuntimeError if the sector size cannot be read or is zero.
+        '''
+        def read():
+            size = self.ioctl(DeviceProbe.BLKSSZGET,'i')
+            if size == None:
+                size = self.readQueue('logical_block_size')
+            if size == None or size == 0:
+                logging.error("# Could not read the logical sector size of " + self.__path)
+                raise RuntimeError("logical sector size error")
+            return size
+        return self.cached('logsector',read)
+
+    def getPhysicalSectorSizeB(self):
+        '''
+        Get the physical sector size of the device in bytes.
+        @return The sector size.
+        @exception RuntimeError if the sector size cannot be read or is zero.
+        '''
+        def read():
+            size = self.ioctl(DeviceProbe.BLKPBSZGET,'I')
+            if size == None:
+                size = self.readQueue('physical_block_size')
+            if size == None or size == 0:
+                logging.error("# Could not read the physical sector size of " + self.__path)
+                raise RuntimeError("physical sector size error")
+            return size
+        return self.cached('physector',read)
+
+    def readSysText(self,*names):
+        '''
+        Read a text attribute from sysfs.
+        @param names The path of the attribute below the device directory.
+        @return The stripped text, None if the attribute does not exist or
+        is empty.
+        '''
+        try:
+            with open(os.path.join(self.getSysDir(),*names),'rb') as f:
+                text = f.read().decode('ascii','ignore').strip()
+        except (IOError,OSError):
+            return None
+        return text if text != '' else None
+
+    def readUdev(self):
+        '''
+        Read the properties of the device from the udev database.
+        @return A dictionary of the udev properties, empty if the database
+        is not available.
+        '''
+        props = {}
+        try:
+            with open(os.path.join(DeviceProbe.sysBlock,self.__name,'dev'),'r') as f:
+                dev = f.read().strip()
+            with open(os.path.join(DeviceProbe.udevData,'b' + dev),'r') as f:
+                for line in f.read().split('\n'):
+                    if line.startswith('E:') and '=' in line:
+                        key,value = line[2:].split('=',1)
+                        props[key] = value.strip()
+        except (IOError,OSError):
+            pass
+        return props
+
+    def getIdentity(self):
+        '''
+        Get the identity of the device without running a tool, read from
+        the udev database and sysfs. Partitions return the identity of
+        their disk.
+        @return A dictionary with the keys wwn, serial, model and firmware,
+        a value is None if it is unknown.
+        '''
+        def read():
+            udev = self.readUdev()
+            identity = {'wwn':udev.get('ID_WWN_WITH_EXTENSION',udev.get('ID_WWN')),
+                        'serial':udev.get('ID_SERIAL_SHORT'),
+                        'model':udev.get('ID_MODEL'),
+                        'firmware':udev.get('ID_REVISION')}
+            #nvme and virtio devices have the attributes in the block device,
+            #scsi and ata devices in the scsi device
+            for base in [[],['device'],['..'],['..','device']]:
+                for key,attrs in [('wwn',['wwid']),('serial',['serial']),
+                                  ('model',['model']),('firmware',['firmware_rev','rev'])]:
+                    for attr in attrs:
+                        if identity[key] == None:
+                            identity[key] = self.readSysText(*(base + [attr]))
+            if identity['serial'] == None:
+                #the unit serial number vpd page, the serial follows a 4 byte header
+                for base in [['device'],['..','device']]:
+                    try:
+                        with open(os.path.join(self.getSysDir(),*(base + ['vpd_pg80'])),'rb') as f:
+                            serial = f.read()[4:].decode('ascii','ignore').strip()
+                    except (IOError,OSError):
+                        continue
+                    if serial != '':
+                        identity['serial'] = serial
+                        break
+            return identity
+        return self.cached('identity',read)
+
+    def getDevNumbers(self):
+        '''
+        Get the device numbers of the device and its partitions.
+        @return A set of "major:minor" strings.
+        '''
+        nums = set()
+        try:
+            rdev = os.stat(self.__path).st_rdev
+            nums.add(str(os.major(rdev)) + ':' + str(os.minor(rdev)))
+        except OSError:
+            pass
+        sysDir = self.getSysDir()
+        if os.path.isdir(sysDir):
+            for entry in os.listdir(sysDir):
+                #partitions are subdirectories with their own dev attribute
+                if os.path.isfile(os.path.join(sysDir,entry,'partition')):
+                    try:
+                        with open(os.path.join(sysDir,entry,'dev'),'r') as f:
+                            nums.add(f.read().strip())
+                    except (IOError,OSError):
+                        pass
+        return nums
+
+    def isMounted(self):
+        '''
+        Check if the device or one of its partitions is mounted.
+        @return True if mounted, False if not.
+        @exception RuntimeError if the mount information cannot be read.
+        '''
+        def read():
+            nums = self.getDevNumbers()
+            #sources of the device itself or of its partitions, e.g. sdb1 or nvme0n1p1
+            sourceRe = re.compile(re.escape(self.__path) + r'(p?\d+)?$')
+            try:
+                with open(DeviceProbe.mountinfo,'r') as f:
+                    lines = f.read().split('\n')
+            except (IOError,OSError) as e:
+                logging.error("# Could not read " + DeviceProbe.mountinfo + ": " + str(e))
+                raise RuntimeError("mountinfo error")
+            for line in lines:
+                fields = line.split(' ')
+                if len(fields) < 5:
+                    continue
+                #the mount source follows the separator of the optional fields
+                source = ''
+                if '-' in fields:
+                    sep = fields.index('-')
+                    source = fields[sep + 2] if len(fields) > sep + 2 else ''
+                if fields[2] in nums or sourceRe.match(source):
+                    logging.info("#" + line)
+                    return True
+            return False
+        return self.cached('mounted',read)
+
+    def isAvailable(self):
+        '''
+        Check if the device is known as disk or partition to the kernel.
+        @return True if yes, False if not.
+        @exception RuntimeError if the partitions cannot be read.
+        '''
+        def read():
+            try:
+                with open(DeviceProbe.partitions,'r') as f:
+                    lines = f.read().split('\n')
+            except (IOError,OSError) as e:
+                logging.error("# Could not read " + DeviceProbe.partitions + ": " + str(e))
+                raise RuntimeError("partitions error")
+            for line in lines:
+                fields = line.split()
+                if len(fields) == 4 and fields[3] == self.__name:
+                    logging.info("#" + line)
+                    return True
+            return False
+        return self.cached('available',read)
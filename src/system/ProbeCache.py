@@ -0,0 +1,285 @@
+''' @package ProbeCache
+A module caching device probes and measurements across runs.
+'''
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+
+from system.Probe import DeviceProbe
+
+class ProbeCache(object):
+    '''
+    Keeps the parsed output of hdparm -I, i.e. the identity, the security
+    state and the erase capabilities of a device, and the values measured on
+    the device, e.g. the durations of its erase methods and tests, between
+    runs. The entries are keyed by the WWN or the serial number read from
+    sysfs, an entry is dropped if the firmware of the device has changed.
+    The identity and the erase capabilities of a stored entry are used
+    directly, the security state is changed by erasing and therefore only
+    used if it was read in the current run.
+    '''
+    ## JSON file keeping the probes between runs, None keeps them in memory only.
+    cacheFile = os.path.join(os.path.expanduser('~'),'.tkperf','probes.json')
+
+    ## Loaded entries, key: dictionary
+    __entries = None
+    ## Keys whose security state was read in the current run
+    __current = set()
+
+    @staticmethod
+    def getKey(path):
+        '''
+        Get the cache key and the firmware of a device.
+        @param path The device path.
+        @return [key,firmware], the key is None if the device has neither
+        a WWN nor a serial number.
+        '''
+        identity = DeviceProbe.get(path).getIdentity()
+        key = None
+        if identity['wwn'] != None:
+            key = 'wwn:' + identity['wwn']
+        elif identity['serial'] != None:
+            key = 'serial:' + str(identity['model']) + ':' + identity['serial']
+        return [key,identity['firmware']]
+
+    @staticmethod
+    def getEntries():
+        '''
+        Get the cached entries, they are loaded from the cache file on first
+        access. A damaged cache file is ignored.
+        @return The dictionary of entries.
+        '''
+        if ProbeCache.__entries == None:
+            ProbeCache.__entries = {}
+            if ProbeCache.cacheFile != None and os.path.isfile(ProbeCache.cacheFile):
+                try:
+                    with open(ProbeCache.cacheFile,'r') as f:
+                        ProbeCache.__entries = json.load(f)
+                except (IOError,OSError,ValueError) as e:
+                    logging.warning("# Ignoring probe cache " + ProbeCache.cacheFile + ": " + str(e))
+        return ProbeCache.__entries
+
+    @staticmethod
+    def save(key):
+        '''
+        Write an entry to the cache file, the file is replaced atomically.
+        Entries written by other processes in the meantime, e.g. for other
+        devices tested in parallel, are kept. A cache that cannot be written
+        is not an error of the test.
+        @param key The key of the entry, it is removed from the file if it
+        is no longer cached.
+        '''
+        if ProbeCache.cacheFile == None:
+            return
+        try:
+            stored = {}
+            if os.path.isfile(ProbeCache.cacheFile):
+                try:
+                    with open(ProbeCache.cacheFile,'r') as f:
+                        stored = json.load(f)
+                except ValueError:
+                    pass
+            if key in ProbeCache.getEntries():
+                stored[key] = ProbeCache.getEntries()[key]
+            else:
+                stored.pop(key,None)
+            folder = os.path.dirname(ProbeCache.cacheFile)
+            if folder != '' and not os.path.isdir(folder):
+                os.makedirs(folder)
+            tmp = ProbeCache.cacheFile + '.' + str(os.getpid())
+            with open(tmp,'w') as f:
+                json.dump(stored,f,indent=1,sort_keys=True)
+            os.replace(tmp,ProbeCache.cacheFile)
+        except (IOError,OSError) as e:
+            logging.warning("# Could not write probe cache " + ProbeCache.cacheFile + ": " + str(e))
+
+    @staticmethod
+    def getEntry(path):
+        '''
+        Get the cached entry of a device.
+        @param path The device path.
+        @return The entry, None if the device is not cached or its firmware
+        has changed.
+        '''
+        key,firmware = ProbeCache.getKey(path)
+        if key == None:
+            return None
+        entry = ProbeCache.getEntries().get(key)
+        if entry != None and entry['firmware'] != firmware:
+            logging.info("# Firmware of " + path + " changed from " + str(entry['firmware']) +
+                         " to " + str(firmware) + ", dropping cached probe")
+            ProbeCache.invalidate(path)
+            return None
+        return entry
+
+    @staticmethod
+    def invalidate(path):
+        '''
+        Drop the cached entry of a device.
+        @param path The device path.
+        '''
+        key = ProbeCache.getKey(path)[0]
+        if key != None and key in ProbeCache.getEntries():
+            del ProbeCache.getEntries()[key]
+            ProbeCache.__current.discard(key)
+            ProbeCache.save(key)
+
+    @staticmethod
+    def expire(path):
+        '''
+        Mark the security state of a device as outdated, e.g. after its
+        security has been disabled. The next erase reads it again.
+        @param path The device path.
+        '''
+        ProbeCache.__current.discard(ProbeCache.getKey(path)[0])
+
+    @staticmethod
+    def parseHdparm(stdout):
+        '''
+        Parse the output of hdparm -I.
+        @param stdout The output of hdparm -I.
+        @return A dictionary with the keys
+        valid: False if hdparm reports bad sense data,
+        info: the identity lines for the device info,
+        security: the Security section with the keys supported, enabled,
+        locked, frozen and masterPassword, None if a state is not printed,
+        erase: the keys erase and enhanced, True if the erase is supported,
+        and eraseMin and enhancedMin, the estimated minutes of the erase.
+        '''
+        probe = {'valid':True,'info':'',
+                 'security':{'supported':None,'enabled':None,'locked':None,'frozen':None,'masterPassword':False},
+                 'erase':{'erase':False,'enhanced':False,'eraseMin':None,'enhancedMin':None}}
+        inSecurity = False
+        for line in stdout.split('\n'):
+            if line.find("questionable sense data") > -1 or line.find("bad/missing sense data") > -1:
+                probe['valid'] = False
+            if not all(ord(char) < 128 for char in line): continue
+            for field in ["Model Number","Serial Number","Firmware Revision","Media Serial Num",
+                          "Media Manufacturer","device size with M = 1000*1000"]:
+                if line.find(field) > -1:
+                    probe['info'] += line + '\n'
+                    break
+            #the sections start at the beginning of a line
+            if line != '' and not line[0].isspace():
+                inSecurity = line.startswith("Security:")
+                continue
+            if not inSecurity:
+                continue
+            state = line.strip()
+            if line.find("Master password") > -1:
+                probe['security']['masterPassword'] = True
+            match = re.match(r'^(not\s+)?(supported|enabled|locked|frozen)$',state)
+            if match != None:
+                probe['security'][match.group(2)] = match.group(1) == None
+            if line.find("supported: enhanced erase") > -1:
+                probe['erase']['enhanced'] = not state.startswith('not')
+            match = re.search(r'(\d+)min for SECURITY ERASE UNIT',line)
+            if match != None:
+                probe['erase']['eraseMin'] = int(match.group(1))
+            match = re.search(r'(\d+)min for ENHANCED SECURITY ERASE UNIT',line)
+            if match != None:
+                probe['erase']['enhancedMin'] = int(match.group(1))
+        probe['erase']['erase'] = probe['security']['supported'] == True
+        probe['erase']['enhanced'] = probe['erase']['enhanced'] and probe['erase']['erase']
+        return probe
+
+    @staticmethod
+    def getHdparm(path,current=False,refresh=False):
+        '''
+        Get the parsed output of hdparm -I for a device, hdparm is only run
+        if the device is not cached.
+        @param path The device path.
+        @param current True if the security state must have been read in the
+        current run, e.g. before an erase.
+        @param refresh True to always run hdparm, e.g. after the security
+        state has been changed.
+        @return The parsed output, see parseHdparm.
+        @exception RuntimeError if hdparm fails.
+        '''
+        key,firmware = ProbeCache.getKey(path)
+        entry = ProbeCache.getEntry(path)
+        if not refresh and entry != None and 'hdparm' in entry and (not current or key in ProbeCache.__current):
+            logging.info("# Using cached hdparm probe of " + path)
+            return entry['hdparm']
+        out = subprocess.Popen(['hdparm','-I',path],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        (stdout,stderr) = out.communicate()
+        if stderr != '':
+            logging.error("hdparm -I encountered an error: " + stderr)
+            raise RuntimeError("hdparm command error")
+        probe = ProbeCache.parseHdparm(stdout)
+        #bad sense data is not cached, it cannot be used for the device info
+        if key != None and probe['valid']:
+            ProbeCache.newEntry(path,entry)['hdparm'] = probe
+            ProbeCache.__current.add(key)
+            ProbeCache.save(key)
+        return probe
+
+    @staticmethod
+    def newEntry(path,entry):
+        '''
+        Get the entry of a device to update it, a new entry is created if the
+        device is not cached yet.
+        @param path The device path.
+        @param entry The current entry of the device, None if not cached.
+        @return The entry, the update time is set to now.
+        '''
+        key,firmware = ProbeCache.getKey(path)
+        if entry == None:
+            entry = {'firmware':firmware,'path':path}
+            ProbeCache.getEntries()[key] = entry
+        entry['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        return entry
+
+    @staticmethod
+    def getMeasured(path,kind,name):
+        '''
+        Get a value measured on a device in an earlier run.
+        @param path The device path.
+        @param kind The kind of the value, e.g. erase.
+        @param name The name of the value, e.g. the erase method.
+        @return The value, None if not measured yet.
+        '''
+        entry = ProbeCache.getEntry(path)
+        if entry == None or kind not in entry:
+            return None
+        return entry[kind].get(name)
+
+    @staticmethod
+    def setMeasured(path,kind,name,value):
+        '''
+        Store a value measured on a device, the last measured value is kept.
+        @param path The device path.
+        @param kind The kind of the value, e.g. erase.
+        @param name The name of the value, e.g. the erase method.
+        @param value The json serializable value.
+        '''
+        key = ProbeCache.getKey(path)[0]
+        if key == None:
+            return
+        entry = ProbeCache.newEntry(path,ProbeCache.getEntry(path))
+        entry.setdefault(kind,{})[name] = value
+        ProbeCache.save(key)
+
+    @staticmethod
+    def getEraseSec(path,method):
+        '''
+        Get the measured duration of an erase method on a device.
+        @param path The device path.
+        @param method The name of the erase method, e.g. hdparm.
+        @return The seconds of the last erase, None if not measured yet.
+        '''
+        return ProbeCache.getMeasured(path,'erase',method)
+
+    @staticmethod
+    def setEraseSec(path,method,sec):
+        '''
+        Store the measured duration of an erase method on a device, it is
+        used as expected duration of the next erase.
+        @param path The device path.
+        @param method The name of the erase method, e.g. hdparm.
+        @param sec The seconds the erase took.
+        '''
+        ProbeCache.setMeasured(path,'erase',method,sec)
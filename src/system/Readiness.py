@@ -0,0 +1,213 @@
+''' @package Readiness
+A module waiting for idle devices and finished RAID syncs.
+'''
+import logging
+import os
+import re
+import select
+import time
+
+class Readiness(object):
+    '''
+    Detects if a block device is idle instead of sleeping a fixed time,
+    e.g. before a secure erase or before the next test. A device is idle
+    if it has no IOs in flight and completed no IOs for quiesceSec seconds,
+    read from the block statistics in sysfs. For software RAID devices the
+    running resync, recovery or check is awaited first, sysfs notifies
+    about changes of the sync action.
+    '''
+    ## Seconds a device must not have any IO to be idle.
+    quiesceSec = 2
+    ## Maximum seconds to wait for an idle device, None to wait forever.
+    maxWaitSec = 300
+    ## Maximum seconds to wait for a RAID sync to finish.
+    syncMaxWaitSec = 24 * 3600
+    ## Seconds between two reads of the block statistics.
+    pollSec = 0.5
+    ## Seconds between two checks of a RAID without sysfs notification.
+    raidPollSec = 30
+    ## Directory of the block devices in sysfs.
+    sysBlock = '/sys/class/block'
+    ## File containing the software RAID status.
+    mdstat = '/proc/mdstat'
+
+    @staticmethod
+    def getBlockName(path):
+        '''
+        Get the kernel name of a block device, e.g. sdb for /dev/sdb or a
+        link in /dev/disk/by-id.
+        @param path The device path.
+        @return The name of the device in sysfs.
+        '''
+        return os.path.basename(os.path.realpath(path))
+
+    @staticmethod
+    def readStat(name):
+        '''
+        Read the block statistics of a device.
+        @param name The kernel name of the device.
+        @return [completed IOs,IOs in flight], None if sysfs does not
+        provide statistics for the device.
+        '''
+        try:
+            with open(os.path.join(Readiness.sysBlock,name,'stat'),'r') as f:
+                fields = [int(v) for v in f.read().split()]
+        except (IOError,OSError,ValueError):
+            return None
+        if len(fields) < 9:
+            return None
+        #reads and writes completed, discards and flushes on newer kernels
+        completed = fields[0] + fields[4] + sum(fields[11:12]) + sum(fields[15:16])
+        return [completed,fields[8]]
+
+    @staticmethod
+    def getSyncAction(name):
+        '''
+        Get the sync action of a software RAID device.
+        @param name The kernel name of the device, e.g. md0.
+        @return The sync action (idle|resync|recover|check|repair|reshape|frozen),
+        None if the device is no software RAID.
+        '''
+        path = os.path.join(Readiness.sysBlock,name,'md','sync_action')
+        if os.path.isfile(path):
+            try:
+                with open(path,'r') as f:
+                    return f.read().strip()
+            except (IOError,OSError):
+                pass
+        #fall back to the progress lines in mdstat
+        try:
+            with open(Readiness.mdstat,'r') as f:
+                stat = f.read()
+        except (IOError,OSError):
+            return None
+        #the device block ends with an empty line
+        md = re.search(r'^' + re.escape(name) + r' : .*?(?:\n\n|\Z)',stat,re.MULTILINE | re.DOTALL)
+        if md == None:
+            return None
+        match = re.search(r'\b(resync|recovery|reshape|check|repair)\s*=',md.group())
+        return match.group(1) if match != None else 'idle'
+
+    @staticmethod
+    def waitSyncAction(name,timeout):
+        '''
+        Wait until the sync action of a software RAID changes or the timeout
+        has passed. sysfs notifies about a change as priority event.
+        @param name The kernel name of the device.
+        @param timeout Maximum seconds to wait.
+        '''
+        path = os.path.join(Readiness.sysBlock,name,'md','sync_action')
+        try:
+            with open(path,'r') as f:
+                f.read()
+                poller = select.poll()
+                poller.register(f,select.POLLPRI | select.POLLERR)
+                poller.poll(timeout * 1000)
+        except (IOError,OSError):
+            time.sleep(timeout)
+
+    @staticmethod
+    def waitRaidSync(path,maxWait=-1):
+        '''
+        Wait until a software RAID device has finished its resync, recovery
+        or check. A frozen sync action never returns to idle by itself.
+        @param path The device path, e.g. /dev/md0.
+        @param maxWait Maximum seconds to wait, None to wait forever, if not
+        given syncMaxWaitSec is used.
+        @return True if the device is in sync, False if the wait timed out.
+        @exception RuntimeError if the sync action of the device is frozen.
+        '''
+        if maxWait == -1:
+            maxWait = Readiness.syncMaxWaitSec
+        name = Readiness.getBlockName(path)
+        start = time.time()
+        action = Readiness.getSyncAction(name)
+        while action not in [None,'idle']:
+            if action == 'frozen':
+                logging.error("# Sync action of raid device " + path + " is frozen")
+                raise RuntimeError("sync action of " + path + " is frozen")
+            waited = time.time() - start
+            if maxWait != None and waited >= maxWait:
+                logging.warning("# Raid device " + path + " still runs " + action + " after " +
+                                str(int(waited)) + " seconds")
+                return False
+            logging.info("# Waiting for " + action + " of raid device " + path)
+            timeout = Readiness.raidPollSec
+            if maxWait != None:
+                timeout = min(timeout,maxWait - waited)
+            Readiness.waitSyncAction(name,max(timeout,Readiness.pollSec))
+            action = Readiness.getSyncAction(name)
+        logging.info("# Raid device " + path + " is in sync after " + str(int(time.time() - start)) + " seconds")
+        return True
+
+    @staticmethod
+    def waitFor(check,interval=None,maxWait=-1):
+        '''
+        Wait until a check succeeds, e.g. for hardware RAIDs whose state is
+        only available from the controller tool.
+        @param check A function returning True if the device is ready.
+        @param interval Seconds between two checks, if None raidPollSec is used.
+        @param maxWait Maximum seconds to wait, None to wait forever, if not
+        given syncMaxWaitSec is used.
+        @return True if the check succeeded, False if the wait timed out.
+        '''
+        if interval == None:
+            interval = Readiness.raidPollSec
+        if maxWait == -1:
+            maxWait = Readiness.syncMaxWaitSec
+        start = time.time()
+        while not check():
+            if maxWait != None and time.time() - start >= maxWait:
+                logging.warning("# Device not ready after " + str(int(time.time() - start)) + " seconds")
+                return False
+            time.sleep(interval)
+        return True
+
+    @staticmethod
+    def waitIdle(path,quiesce=None,maxWait=-1):
+        '''
+        Wait until a device is idle, i.e. no IO is in flight and no IO has
+        completed for the quiesce time. A software RAID must have finished
+        its sync first.
+        @param path The device path.
+        @param quiesce Seconds without IO, if None quiesceSec is used.
+        @param maxWait Maximum seconds to wait, None to wait forever, if not
+        given maxWaitSec is used.
+        @return True if the device is idle, False if the wait timed out.
+        @exception RuntimeError if the sync action of a software RAID is frozen.
+        '''
+        if quiesce == None:
+            quiesce = Readiness.quiesceSec
+        if maxWait == -1:
+            maxWait = Readiness.maxWaitSec
+        if path == None:
+            return True
+        name = Readiness.getBlockName(path)
+        if Readiness.getSyncAction(name) not in [None,'idle']:
+            if Readiness.waitRaidSync(path) == False:
+                return False
+        start = time.time()
+        stat = Readiness.readStat(name)
+        if stat == None:
+            #without statistics only the quiesce time can be waited
+            logging.info("# No block statistics for " + path + ", sleeping for " + str(quiesce) + " seconds")
+            time.sleep(quiesce)
+            return True
+        idleSince = start if stat[1] == 0 else None
+        while True:
+            now = time.time()
+            if idleSince != None and now - idleSince >= quiesce:
+                logging.info("# Device " + path + " is idle after " + str(round(now - start,1)) + " seconds")
+                return True
+            if maxWait != None and now - start >= maxWait:
+                logging.warning("# Device " + path + " is not idle after " + str(int(now - start)) + " seconds")
+                return False
+            time.sleep(Readiness.pollSec)
+            cur = Readiness.readStat(name)
+            if cur == None:
+                return True
+            if cur[1] != 0 or cur[0] != stat[0]:
+                idleSince = None
+            elif idleSince == None:
+                idleSince = time.time()
+            stat = cur